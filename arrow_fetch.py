@@ -0,0 +1,150 @@
+# Arrow fetch path for the wide checkpoint results.
+#
+# pd.read_sql builds every value as a Python object before the DataFrame exists: NUMERIC
+# columns (ROUND(...), rates) arrive as Decimal object columns and every text value is a
+# separate str, so on wide EOM / layer-3 results the conversion costs more than the query.
+# Here the query runs as COPY (...) TO STDOUT (FORMAT csv) on the same pooled connection
+# and pyarrow's multithreaded CSV reader parses the stream straight into typed columns.
+# The Arrow type of each column comes from the server's row description (the same query
+# under LIMIT 0, which plans but does not run it):
+#
+#   int2/int4/int8      -> nullable Int16/Int32/Int64 (Int8/Int16 for stream_fetch.SMALL_INT_COLUMNS)
+#   float4/float8/NUMERIC -> float64
+#   bool                -> nullable boolean
+#   date/timestamp(tz)  -> datetime64
+#   stream_fetch.CATEGORY_COLUMNS -> categorical, any other type -> string
+#
+# The CSV stream is buffered in a spooled temporary file (on disk past SPOOL_BYTES), so a
+# national market never holds raw rows and the typed frame at once in Python objects.
+# Callers pick the path per query (heavy_lifts._read_sql / _spill_sql(..., arrow=True));
+# spilled results go to Parquet batch by batch.  Without pyarrow, on a driver other than
+# psycopg2/psycopg, or with RSR_ARROW_FETCH=0 they get pd.read_sql as before.
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+import stream_fetch
+from stream_fetch import CATEGORY_COLUMNS, SMALL_INT_COLUMNS
+
+SPOOL_BYTES = 64 * 1024 * 1024     # CSV kept in memory up to this, then on disk
+BLOCK_BYTES = 16 * 1024 * 1024     # CSV parsed per record batch (one spill row group each)
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    ENABLED = os.getenv("RSR_ARROW_FETCH", "1") != "0"
+except ImportError:
+    ENABLED = False
+
+# Postgres type OID -> Arrow type (anything else is read as text)
+if ENABLED:
+    OID_TYPES = {
+        16: pa.bool_(),
+        20: pa.int64(), 21: pa.int16(), 23: pa.int32(), 26: pa.int64(),
+        700: pa.float64(), 701: pa.float64(), 1700: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp('us'), 1184: pa.timestamp('us', tz='UTC'),
+    }
+    SMALL_INT_TYPES = {'Int8': pa.int8(), 'Int16': pa.int16()}
+    PANDAS_TYPES = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+
+
+def available(connection):
+    return ENABLED and connection.dialect.driver in ('psycopg2', 'psycopg')
+
+
+def arrow_type(name, oid):
+    if name in SMALL_INT_COLUMNS and oid in (20, 21, 23):
+        return SMALL_INT_TYPES[SMALL_INT_COLUMNS[name]]
+    if name in CATEGORY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return OID_TYPES.get(oid, pa.string())
+
+
+# [(column name, type OID)] of the statement's result, from a LIMIT 0 run of it
+def describe(connection, sql, wrap_statement):
+    result = connection.execute(wrap_statement(sql, "SELECT * FROM ({}) AS q LIMIT 0"))
+    try:
+        return [(column[0], column[1]) for column in result.cursor.description]
+    finally:
+        result.close()
+
+
+# the COPY statement with its bind values rendered by the driver (COPY takes no parameters)
+def _copy_sql(connection, sql, wrap_statement):
+    compiled = wrap_statement(sql, "COPY ({}) TO STDOUT WITH (FORMAT csv)").compile(dialect=connection.dialect)
+    raw = connection.connection.driver_connection
+    if connection.dialect.driver == 'psycopg2':
+        with raw.cursor() as cursor:
+            return cursor.mogrify(compiled.string, compiled.params).decode()
+    import psycopg
+    return psycopg.ClientCursor(raw).mogrify(compiled.string, compiled.params)
+
+
+def _copy_to(connection, copy_sql, file):
+    raw = connection.connection.driver_connection
+    with raw.cursor() as cursor:
+        if connection.dialect.driver == 'psycopg2':
+            cursor.copy_expert(copy_sql, file)
+        else:
+            with cursor.copy(copy_sql) as copy:
+                for block in copy:
+                    file.write(block)
+
+
+def _convert_options(description, columns):
+    names = [name for name, _ in description]
+    return pa_csv.ConvertOptions(
+        column_types={name: arrow_type(name, oid) for name, oid in description},
+        include_columns=[c for c in columns if c in names] if columns is not None else None,
+        strings_can_be_null=True,           # unquoted empty field is NULL,
+        quoted_strings_can_be_null=False,   # "" is an empty string
+        true_values=['t'], false_values=['f'])
+
+
+def _read_options(description):
+    return pa_csv.ReadOptions(column_names=[name for name, _ in description], block_size=BLOCK_BYTES)
+
+
+# COPY csv stream -> typed frame; `description` is describe()'s [(name, oid)]
+def read_csv(file, description, columns=None):
+    table = pa_csv.read_csv(file, read_options=_read_options(description),
+                            convert_options=_convert_options(description, columns))
+    return table.to_pandas(types_mapper=PANDAS_TYPES.get)
+
+
+# the same stream as record batches of about BLOCK_BYTES of CSV each
+def iter_batches(file, description, columns=None):
+    yield from pa_csv.open_csv(file, read_options=_read_options(description),
+                               convert_options=_convert_options(description, columns))
+
+
+# COPY the statement's rows into a spooled file; yields (file at offset 0, description)
+@contextmanager
+def _copied(connection, sql, wrap_statement):
+    description = describe(connection, sql, wrap_statement)
+    # COPY writes dates in the session DateStyle; ISO is what the CSV reader parses
+    connection.exec_driver_sql("SELECT set_config('datestyle', 'ISO, MDY', true)")
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as file:
+        _copy_to(connection, _copy_sql(connection, sql, wrap_statement), file)
+        file.seek(0)
+        yield file, description
+
+
+# run `sql` (a bound text() statement) through COPY and return it as a typed DataFrame
+def read(connection, sql, wrap_statement, columns=None):
+    with _copied(connection, sql, wrap_statement) as (file, description):
+        return read_csv(file, description, columns)
+
+
+# run `sql` through COPY into a Parquet spill file, batch by batch (stream_fetch.PagedResult)
+def spill(connection, sql, wrap_statement, name, columns=None):
+    with _copied(connection, sql, wrap_statement) as (file, description):
+        return stream_fetch.spill_batches(iter_batches(file, description, columns), name)
@@ -0,0 +1,158 @@
+# Blocklist-rate check: full partition scan (dq_bl_test) vs the bl_counts counters.
+#
+#   python benchmarks/bench_bl_test.py [--sizes 100000,1000000,10000000] [--append 1000] [--repeat 3]
+#
+# On synthetic markets in a local Postgres (pg_fixture / synthetic_market, as in
+# bench_review) it times, best of --repeat:
+#
+#   full_scan    dq_bl_test, the count(*) / SUM(CASE ...) over the whole partition
+#   counters     first bl_counts refresh (a full scan that also stores the counts)
+#   unchanged    refresh with no change to the partition (catalog row only)
+#   appended     refresh after --append new tests (rows past the test_id watermark only)
+#
+# and checks every counter result against the full scan.  The appended rows are deleted
+# again afterwards.  A test_id index stands in for the production partitions' key, so the
+# appended step is a range scan.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import pg_fixture  # noqa: E402
+import synthetic_market  # noqa: E402
+
+DEFAULT_SIZES = '100000,1000000,10000000'
+STATS_FLUSH_S = 1.5     # pg_stat counters are flushed about once a second
+
+
+def best_of(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def same_rates(df, expected):
+    columns = ['test_type_id', 'reportable', 'valid_tests', 'blocklists', 'bl_rate']
+    a = df[columns].astype(float).reset_index(drop=True)
+    b = expected[columns].astype(float).reset_index(drop=True)
+    return a.shape == b.shape and bool(((a - b).abs().fillna(0) < 1e-9).all().all())
+
+
+# copies of the first n_rows tests with test_ids past the current maximum; returns that maximum
+def append_tests(engine, csid, n_rows):
+    table = synthetic_market.partition_name(csid)
+    with engine.begin() as connection:
+        columns = connection.execute(text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'bench' AND table_name = 'tests' ORDER BY ordinal_position
+        """)).scalars().all()
+        top = connection.execute(text(f"SELECT max(test_id) FROM {table}")).scalar_one()
+        select = ", ".join("test_id + :top" if c == 'test_id' else c for c in columns)
+        connection.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select} FROM {table} WHERE test_id <= :n"),
+                           {'top': top, 'n': n_rows})
+    return top
+
+
+def bench_market(heavy_lifts, bl_counts, engine, n_rows, csid, append, repeat, progress=print):
+    table = synthetic_market.partition_name(csid)
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {table.split('.')[1]}_test_id ON {table} (test_id)"))
+    time.sleep(STATS_FLUSH_S)
+
+    def full_scan():
+        return heavy_lifts._read_sql(heavy_lifts.dq_bl_test(csid))
+
+    def counters():
+        counts, how = bl_counts.refresh(csid, heavy_lifts.partition_stats(csid), heavy_lifts.get_bl_counts)
+        return heavy_lifts.bl_rates(counts, csid), how
+
+    def fresh_counters():
+        bl_counts.invalidate(csid)
+        return counters()
+
+    results = []
+
+    def record(step, wall, df, how, expected):
+        results.append({'size': n_rows, 'step': step, 'how': how, 'wall_s': round(wall, 4),
+                        'same_as_scan': True if expected is None else same_rates(df, expected)})
+        progress(f"{n_rows:>10} {step:<10} {how:<12} {round(wall, 4)}")
+
+    wall, expected = best_of(full_scan, repeat)
+    record('full_scan', wall, expected, 'scan', None)
+    wall, (df, how) = best_of(fresh_counters, repeat)
+    record('counters', wall, df, how, expected)
+    wall, (df, how) = best_of(counters, repeat)
+    record('unchanged', wall, df, how, expected)
+
+    top = append_tests(engine, csid, append)
+    try:
+        time.sleep(STATS_FLUSH_S)
+        _, expected = best_of(full_scan, 1)
+        # every repeat has to see the same append, so the counters are rewound first
+        walls = []
+        for _ in range(repeat):
+            bl_counts.invalidate(csid)
+            with engine.begin() as connection:
+                connection.execute(text(f"DELETE FROM {table} WHERE test_id > :top"), {'top': top})
+            time.sleep(STATS_FLUSH_S)
+            counters()
+            append_tests(engine, csid, append)
+            time.sleep(STATS_FLUSH_S)
+            start = time.perf_counter()
+            df, how = counters()
+            walls.append(time.perf_counter() - start)
+        record('appended', min(walls), df, how, expected)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM {table} WHERE test_id > :top"), {'top': top})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Blocklist rate: full partition scan vs incremental counters')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'test rows per market (default {DEFAULT_SIZES})')
+    parser.add_argument('--append', type=int, default=1000, help='tests appended for the incremental step (default 1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per step (best kept)')
+    args = parser.parse_args(argv)
+
+    with pg_fixture.local_postgres() as url, tempfile.TemporaryDirectory(prefix='rdaq_bench_') as scratch:
+        os.environ['RSR_CONN'] = url
+        os.environ['RSR_BL_COUNTS_DB'] = os.path.join(scratch, 'bl_counts.sqlite')
+        os.environ.setdefault('RSR_PERF_LOG', os.devnull)
+        import heavy_lifts
+        import bl_counts
+
+        engine = create_engine(url)
+        results = []
+        for n_rows in [int(s) for s in args.sizes.split(',') if s.strip()]:
+            csid, _ = synthetic_market.ensure_market(engine, n_rows)
+            results.extend(bench_market(heavy_lifts, bl_counts, engine, n_rows, csid, args.append, args.repeat))
+        engine.dispose()
+        heavy_lifts.get_rsr_conn().dispose()
+
+    report = pd.DataFrame(results)
+    print()
+    print(report.pivot(index='step', columns='size', values='wall_s').to_string())
+    print()
+    print(report.to_string(index=False))
+    if not report['same_as_scan'].all():
+        print("MISMATCH: the counters disagree with the full scan")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
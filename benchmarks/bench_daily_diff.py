@@ -0,0 +1,100 @@
+# Daily-difference check (checkpoint 1b): old six-way UNION SQL vs the single-pass versions.
+#
+#   union     - daily_diff(): CTE over dq.fn_dq_kit_diff, four filtered SELECTs joined by UNION
+#   pushdown  - daily_diff_flagged(): one scan, rule set compiled into one WHERE predicate
+#   fetch_all - daily_diff_all(): one scan, every row fetched, rule set applied in pandas
+#
+# For each CSID and variant it reports server execution time (EXPLAIN (ANALYZE, FORMAT
+# JSON)), rows and bytes sent (sum of pg_column_size over the result rows), client wall
+# time, and checks that every variant flags the same set of rows as the UNION query.
+#
+#   python benchmarks/bench_daily_diff.py --csids 12610,12611 [--repeat 3] [--json out.json]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heavy_lifts  # noqa: E402
+from review_rules import get_ruleset, FLAG_COLUMN  # noqa: E402
+from rsr_conn import get_rsr_conn  # noqa: E402
+
+
+def _variants(csid):
+    ruleset = get_ruleset('daily_diff')
+    return {
+        'union': heavy_lifts.daily_diff(csid),
+        'pushdown': heavy_lifts.daily_diff_flagged(csid, ruleset),
+        'fetch_all': heavy_lifts.daily_diff_all(csid),
+    }
+
+
+def server_ms(connection, stmt):
+    plan = connection.execute(heavy_lifts.wrap_statement(stmt, "EXPLAIN (ANALYZE, FORMAT JSON) {}")).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Execution Time']
+
+
+def result_size(connection, stmt):
+    row = connection.execute(heavy_lifts.wrap_statement(
+        stmt, "SELECT count(*), COALESCE(sum(pg_column_size(q.*)), 0) FROM ({}) q")).one()
+    return int(row[0]), int(row[1])
+
+
+# multiset of rows, comparable across variants (NULL/NaN normalised)
+def row_key(df):
+    df = df.drop(columns=[FLAG_COLUMN], errors='ignore')
+    df = df[sorted(df.columns)].astype(object).where(df.notna(), None)
+    return sorted(map(repr, df.itertuples(index=False, name=None)))
+
+
+def bench_csid(csid, repeat):
+    ruleset = get_ruleset('daily_diff')
+    results, flagged = [], {}
+    with get_rsr_conn().connect() as connection:
+        for name, stmt in _variants(csid).items():
+            times = [server_ms(connection, stmt) for _ in range(repeat)]
+            rows, nbytes = result_size(connection, stmt)
+            start = time.perf_counter()
+            df = pd.read_sql(stmt, con=connection)
+            if name != 'union':
+                df = ruleset.apply(df)
+            wall = time.perf_counter() - start
+            flagged[name] = row_key(df)
+            results.append({'csid': csid, 'variant': name, 'server_ms': round(min(times), 1),
+                            'rows_sent': rows, 'bytes_sent': nbytes, 'client_s': round(wall, 3),
+                            'flagged_rows': len(df)})
+    for row in results:
+        row['same_as_union'] = flagged[row['variant']] == flagged['union']
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Daily-difference check: UNION SQL vs single-pass variants')
+    parser.add_argument('--csids', required=True, help='comma-separated CSIDs')
+    parser.add_argument('--repeat', type=int, default=3, help='EXPLAIN ANALYZE runs per variant (best kept)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for csid in [int(c) for c in args.csids.split(',') if c.strip()]:
+        results.extend(bench_csid(csid, args.repeat))
+    report = pd.DataFrame(results)
+    print(report.to_string(index=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if not report['same_as_union'].all():
+        print("MISMATCH: a single-pass variant flagged different rows than the UNION query")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Fetch paths on the largest checkpoints: pd.read_sql vs the chunked stream vs Arrow (COPY).
+#
+#   python benchmarks/bench_fetch.py [--sizes 100000,1000000] [--repeat 3] [--json out.json]
+#   python benchmarks/bench_fetch.py --csids 12610,12611          (against RSR_CONN)
+#
+# For each checkpoint it reports client wall time (best of --repeat), rows, frame memory
+# (deep) and how many columns are still Python objects, and checks that every path
+# returns the same values as read_sql (Decimal and float compared as floats).  Without
+# --csids the markets come from benchmarks/synthetic_market in a local Postgres
+# (pg_fixture), as in bench_review.
+
+import argparse
+import decimal
+import json
+import numbers
+import os
+import sys
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+DEFAULT_SIZES = '100000,1000000'
+
+# path -> _read_sql keyword arguments
+PATHS = {
+    'read_sql': {},
+    'stream': {'stream': True},
+    'arrow': {'arrow': True},
+}
+
+
+# (name, statement, columns) for the widest / longest checkpoint results
+def checkpoints(heavy_lifts, csid, comp_csid):
+    return [
+        ('eom_full', heavy_lifts.eom_full_query(csid, comp_csid), heavy_lifts.EOM_COLUMNS),
+        ('layer3_m2m', heavy_lifts.dq_layer3_m2m(csid), None),
+        ('dev_algo', heavy_lifts.dq_dev_algo(csid), None),
+        ('excluded_rows', heavy_lifts.dq_excluded_rows(csid), None),
+        ('bl_test', heavy_lifts.dq_bl_test(csid), None),
+    ]
+
+
+# ints, floats and Decimals as floats (read_sql turns Int columns with NULLs into float)
+def _plain(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (numbers.Number, decimal.Decimal)) and not isinstance(value, bool):
+        return None if value != value else round(float(value), 6)
+    return str(value)
+
+
+# multiset of rows with every value as float / str / None, comparable across dtypes
+def row_key(df):
+    df = df[sorted(df.columns)].astype(object)
+    return sorted(repr(tuple(_plain(v) for v in row)) for row in df.itertuples(index=False, name=None))
+
+
+def time_path(heavy_lifts, stmt, columns, kwargs, repeat):
+    best, df = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = heavy_lifts._read_sql(stmt, columns=columns, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, df
+
+
+def bench_csid(heavy_lifts, csid, comp_csid, repeat, label=None, progress=print):
+    results = []
+    for name, stmt, columns in checkpoints(heavy_lifts, csid, comp_csid):
+        expected = None
+        for path, kwargs in PATHS.items():
+            record = {'market': label or csid, 'checkpoint': name, 'path': path}
+            try:
+                wall, df = time_path(heavy_lifts, stmt, columns, kwargs, repeat)
+                # read_sql ignores `columns`; compare on the columns every path returns
+                df = df[[c for c in columns if c in df.columns]] if columns is not None else df
+                key = row_key(df)
+                expected = key if path == 'read_sql' else expected
+                record.update(wall_s=round(wall, 4), rows=len(df),
+                              frame_mb=round(df.memory_usage(deep=True).sum() / 2**20, 2),
+                              object_cols=int((df.dtypes == object).sum()),
+                              same_values=key == expected)
+            except Exception as e:
+                record.update(error=str(e)[:300], same_values=False)
+            results.append(record)
+            progress(f"{str(record['market']):>10} {name:<14} {path:<9} {record.get('wall_s', 'error')}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='read_sql vs stream vs Arrow fetch on the largest checkpoints')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'synthetic test rows per market (default {DEFAULT_SIZES})')
+    parser.add_argument('--csids', help='comma-separated CSIDs on RSR_CONN instead of synthetic markets')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per path (best kept)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    os.environ.setdefault('RSR_PERF_LOG', os.devnull)
+
+    results = []
+    if args.csids:
+        import heavy_lifts
+        for csid in [int(c) for c in args.csids.split(',') if c.strip()]:
+            results.extend(bench_csid(heavy_lifts, csid, heavy_lifts.lookup_comp_csid(csid), args.repeat))
+    else:
+        import pg_fixture
+        import synthetic_market
+        from sqlalchemy import create_engine
+        with pg_fixture.local_postgres() as url:
+            os.environ['RSR_CONN'] = url
+            import heavy_lifts
+            engine = create_engine(url)
+            for n_rows in [int(s) for s in args.sizes.split(',') if s.strip()]:
+                csid, comp_csid = synthetic_market.ensure_market(engine, n_rows)
+                results.extend(bench_csid(heavy_lifts, csid, comp_csid, args.repeat, label=n_rows))
+            engine.dispose()
+            heavy_lifts.get_rsr_conn().dispose()
+
+    report = pd.DataFrame(results)
+    print()
+    print(report.drop(columns=['error'], errors='ignore').to_string(index=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if not report['same_values'].all():
+        print("MISMATCH: a fetch path returned different values than read_sql (or failed)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# Review scaling benchmark: every heavy_lifts fetch and the full page pipeline, timed
+# against synthetic markets of increasing size in a local Postgres (no RSR access).
+#
+#   python benchmarks/bench_review.py [--sizes 10000,100000,1000000,10000000] [--repeat 3]
+#                                     [--out report.json] [--baseline earlier.json] [--factor 1.25]
+#
+# pg_fixture starts (or reuses) the local cluster and synthetic_market loads one market
+# pair per size (kept between runs).  Each get_* is timed with an empty result cache
+# (best of --repeat), then the whole page: every checkpoint through run_checkpoints
+# plus the derived eom view.  Snapshots, the incremental daily store and the
+# blocklist counters are off and spill files go to a scratch directory, so every call
+# reaches the database (bench_bl_test.py times the counters).
+#
+# The JSON report records the commit and server version with each timing.  With
+# --baseline the run is compared with an earlier report and exits 1 when any timing is
+# --factor times slower (and at least MIN_DELTA_S seconds slower) than its baseline.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import pg_fixture  # noqa: E402
+import synthetic_market  # noqa: E402
+
+DEFAULT_SIZES = '10000,100000,1000000,10000000'
+REPORT_DIR = os.path.join(".rdaq_data", "bench")
+MIN_DELTA_S = 0.05     # differences below this are noise at the small sizes
+
+
+# every database-backed heavy_lifts call of a review, as (name, function, args)
+def review_calls(heavy_lifts, csid, comp_csid):
+    return [
+        ('lookup_comp_csid', heavy_lifts.lookup_comp_csid, (csid,)),
+        ('get_eom_full', heavy_lifts.get_eom_full, (csid, comp_csid)),
+        ('get_eom', heavy_lifts.get_eom, (csid, comp_csid)),
+        ('get_callnet', heavy_lifts.get_callnet, (csid,)),
+        ('get_marketnet', heavy_lifts.get_marketnet, (csid,)),
+        ('get_datadiff', heavy_lifts.get_datadiff, (csid,)),
+        ('get_datadiff_all', heavy_lifts.get_datadiff_all, (csid,)),
+        ('get_auto_check', heavy_lifts.get_auto_check, (csid,)),
+        ('get_dqcheck', heavy_lifts.get_dqcheck, (csid,)),
+        ('get_MADish', heavy_lifts.get_MADish, (csid, comp_csid)),
+        ('get_excluded', heavy_lifts.get_excluded, (csid,)),
+        ('get_excluded_rows', heavy_lifts.get_excluded_rows, (csid,)),
+        ('get_algo', heavy_lifts.get_algo, (csid,)),
+        ('get_algo_pages', heavy_lifts.get_algo_pages, (csid,)),
+        ('get_filtered_algo', heavy_lifts.get_filtered_algo, (csid,)),
+        ('get_layer3_m2m', heavy_lifts.get_layer3_m2m, (csid,)),
+        ('get_layer3_m2m_pages', heavy_lifts.get_layer3_m2m_pages, (csid,)),
+        ('get_bl_test', heavy_lifts.get_bl_test, (csid,)),
+        ('dl_nr_percentages', heavy_lifts.dl_nr_percentages, ([csid, comp_csid],)),
+    ]
+
+
+# the whole page: all checkpoints at once on the scheduler pool, then the derived eom view
+def page_pipeline(heavy_lifts, csid, comp_csid):
+    results = list(heavy_lifts.run_checkpoints(heavy_lifts.checkpoint_jobs(csid, comp_csid)))
+    failed = [f"{r.name} ({r.status}: {r.error})" for r in results if r.status != 'ok']
+    if failed:
+        raise RuntimeError("checkpoints failed: " + ", ".join(failed))
+    frames = {r.name: r.df for r in results}
+    frames['eom'] = heavy_lifts.eom_flags(frames['eom_full'], csid)
+    return frames
+
+
+# best wall time over `repeat` cold-cache calls
+def time_call(func, args, repeat):
+    import query_cache
+    best, result = None, None
+    for _ in range(repeat):
+        query_cache.result_cache.clear()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_market(heavy_lifts, n_rows, csid, comp_csid, repeat, progress=print):
+    import query_perf
+    calls = review_calls(heavy_lifts, csid, comp_csid)
+    calls.append(('page_pipeline', page_pipeline, (heavy_lifts, csid, comp_csid)))
+    results = []
+    for name, func, args in calls:
+        record = {'size': n_rows, 'function': name, 'status': 'ok'}
+        try:
+            wall, result = time_call(func, args, repeat)
+            record['wall_s'] = round(wall, 4)
+            if isinstance(result, dict):
+                record['rows'] = sum(len(df) for df in result.values())
+            else:
+                record.update(query_perf.result_stats(result))
+        except Exception as e:
+            record.update(status='error', error=str(e)[:500])
+        results.append(record)
+        progress(f"{n_rows:>10} {name:<22} {record.get('wall_s', record['status'])}")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# timings side by side with a baseline report; 'regression' marks the ones to look at
+def compare(results, baseline, factor):
+    current = pd.DataFrame(results).reindex(columns=['size', 'function', 'wall_s'])
+    before = pd.DataFrame(baseline['results'])[['size', 'function', 'wall_s']].rename(columns={'wall_s': 'baseline_s'})
+    df = current.merge(before, on=['size', 'function'], how='inner')
+    df['ratio'] = (df['wall_s'] / df['baseline_s']).round(2)
+    df['regression'] = (df['ratio'] >= factor) & (df['wall_s'] - df['baseline_s'] >= MIN_DELTA_S)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Review scaling benchmark against synthetic markets in a local Postgres')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'test rows per market (default {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, default=3, help='cold-cache runs per call (best kept)')
+    parser.add_argument('--out', help='report file (default .rdaq_data/bench/review_<time>.json)')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    parser.add_argument('--factor', type=float, default=1.25, help='slowdown against the baseline that fails the run')
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    with pg_fixture.local_postgres() as url, tempfile.TemporaryDirectory(prefix='rdaq_bench_') as spill_dir:
+        # heavy_lifts builds its engine from the environment on first use
+        os.environ['RSR_CONN'] = url
+        os.environ['RSR_SNAPSHOTS'] = '0'
+        os.environ['RSR_DAILY_INCREMENTAL'] = '0'      # no stored days: every repeat is a database read
+        os.environ['RSR_BL_COUNTS'] = '0'              # get_bl_test scans the partition every time
+        os.environ['RSR_SPILL_DIR'] = spill_dir
+        os.environ.setdefault('RSR_PERF_LOG', os.devnull)
+        import heavy_lifts
+
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            server = connection.execute(text("SHOW server_version")).scalar_one()
+        results = []
+        for n_rows in sizes:
+            csid, comp_csid = synthetic_market.ensure_market(engine, n_rows)
+            results.extend(bench_market(heavy_lifts, n_rows, csid, comp_csid, args.repeat))
+        engine.dispose()
+        heavy_lifts.get_rsr_conn().dispose()
+
+    report = {'created': time.time(), 'commit': _git_commit(), 'server_version': server,
+              'sizes': sizes, 'repeat': args.repeat, 'results': results}
+    out = args.out or os.path.join(REPORT_DIR, time.strftime('review_%Y%m%d_%H%M%S.json'))
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    table = pd.DataFrame(results).reindex(columns=['size', 'function', 'wall_s']).pivot(index='function', columns='size', values='wall_s')
+    print()
+    print(table.to_string())
+    print(f"\nreport written to {out}")
+
+    errors = [r for r in results if r['status'] != 'ok']
+    for r in errors:
+        print(f"ERROR {r['size']} {r['function']}: {r['error']}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            diff = compare(results, json.load(f), args.factor)
+        print()
+        print(diff.to_string(index=False))
+        if diff['regression'].any():
+            print(f"REGRESSION: {int(diff['regression'].sum())} timing(s) at least {args.factor}x slower than the baseline")
+            return 1
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
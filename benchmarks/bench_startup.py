@@ -0,0 +1,132 @@
+# Startup benchmark: time to first paint and rerun cost of the Streamlit app.
+#
+#   python benchmarks/bench_startup.py [--repeat 5] [--out report.json] [--baseline earlier.json] [--factor 1.25]
+#
+# Each repeat starts a fresh interpreter that renders rdaq_prod_review_main.py with
+# streamlit's AppTest (no browser, no Submit) and records
+#
+#   import_s       importing streamlit (the floor every run pays)
+#   first_paint_s  process start to the end of the first script run
+#   rerun_s        a second script run in the same process (what every widget click costs)
+#
+# plus the heavy modules already loaded after the first paint -- none of them should be,
+# and none of the runs may reach the database (RSR_CONN points at a closed port, so any
+# query would fail the render).  One extra run under -X importtime lists the slowest
+# imports of the first paint.  With --baseline the report is compared with an earlier one
+# and the run exits 1 when a median time is --factor times slower.
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP = os.path.join(REPO_DIR, "rdaq_prod_review_main.py")
+REPORT_DIR = os.path.join(".rdaq_data", "bench")
+MIN_DELTA_S = 0.05
+
+# modules the first paint should not need (streamlit itself imports the bare plotly package)
+HEAVY_MODULES = ('pandas', 'sqlalchemy', 'pyarrow', 'plotly.express', 'plotly.subplots', 'heavy_lifts', 'mad_plots')
+NO_DATABASE = "postgresql://nobody@127.0.0.1:1/none"
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - first
+errors = [e.value for e in at.exception]
+print(json.dumps({'import_s': imported - start, 'first_paint_s': first - start, 'rerun_s': rerun,
+                  'heavy_loaded': [m for m in %r if m in sys.modules], 'errors': errors}))
+"""
+
+
+def _env():
+    env = dict(os.environ, RSR_CONN=NO_DATABASE, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    return env
+
+
+def run_child(extra_args=()):
+    proc = subprocess.run([sys.executable, *extra_args, "-c", CHILD % (HEAVY_MODULES,), APP],
+                          capture_output=True, text=True, cwd=REPO_DIR, env=_env())
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+# slowest top-level packages by cumulative import time (-X importtime), in seconds
+def import_profile(top=15):
+    _, stderr = run_child(["-X", "importtime"])
+    totals = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if match and len(match.group(3)) <= 1:       # top-level import (no nesting indent)
+            name = match.group(4).split(".")[0]
+            totals[name] = totals.get(name, 0) + int(match.group(2)) / 1e6
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1])[:top])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time to first paint and rerun cost of the review app')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh processes to time (median kept)')
+    parser.add_argument('--out', help='report file (default .rdaq_data/bench/startup_<time>.json)')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    parser.add_argument('--factor', type=float, default=1.25, help='slowdown against the baseline that fails the run')
+    args = parser.parse_args(argv)
+
+    runs = [run_child()[0] for _ in range(args.repeat)]
+    medians = {key: round(statistics.median(r[key] for r in runs), 4) for key in ('import_s', 'first_paint_s', 'rerun_s')}
+    report = {'created': time.time(), 'commit': _git_commit(), 'python': sys.version.split()[0],
+              'repeat': args.repeat, 'median': medians, 'runs': runs, 'imports': import_profile()}
+    out = args.out or os.path.join(REPORT_DIR, time.strftime('startup_%Y%m%d_%H%M%S.json'))
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    for key, value in medians.items():
+        print(f"{key:<14} {value:.3f} s")
+    print("\nslowest imports (cumulative s):")
+    for name, seconds in report['imports'].items():
+        print(f"  {name:<24} {seconds:.3f}")
+    print(f"\nreport written to {out}")
+
+    status = 0
+    heavy = sorted({m for r in runs for m in r['heavy_loaded']})
+    errors = [e for r in runs for e in r['errors']]
+    if heavy:
+        print(f"LOADED BEFORE SUBMIT: {', '.join(heavy)}")
+        status = 1
+    if errors:
+        print(f"APP ERRORS: {errors[0]}")
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            before = json.load(f)['median']
+        for key, value in medians.items():
+            ratio = value / before[key] if before.get(key) else None
+            flag = ratio is not None and ratio >= args.factor and value - before[key] >= MIN_DELTA_S
+            print(f"{key:<14} {before.get(key)} -> {value}" + (f"  REGRESSION x{ratio:.2f}" if flag else ""))
+            status = 1 if flag else status
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# Throwaway local Postgres for the offline benchmarks.
+#
+# Finds initdb/pg_ctl on PATH (or under `pg_config --bindir`), creates a cluster in
+# RSR_BENCH_PGDATA (default .rdaq_data/bench_pg) on first use and starts it on a free
+# localhost port for the length of the run.  The cluster (and the synthetic markets
+# loaded into it) is kept between runs, so the big markets are only generated once;
+# delete the directory to start over.
+#
+# Set RSR_BENCH_PG to a SQLAlchemy URL to use an already running server instead --
+# a disposable one: the benchmark creates schemas and functions named like production
+# (auto, dq, analytic, md2, prod_ms_partitions).
+
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+
+PGDATA = os.getenv("RSR_BENCH_PGDATA", os.path.join(".rdaq_data", "bench_pg"))
+EXTERNAL_URL = os.getenv("RSR_BENCH_PG")
+
+# a benchmark cluster holds nothing worth an fsync
+SERVER_OPTIONS = ("-c listen_addresses=localhost -c unix_socket_directories='' "
+                  "-c fsync=off -c synchronous_commit=off -c full_page_writes=off")
+
+
+def _bindir():
+    pg_ctl = shutil.which("pg_ctl")
+    if pg_ctl:
+        return os.path.dirname(pg_ctl)
+    if shutil.which("pg_config"):
+        return subprocess.run(["pg_config", "--bindir"], capture_output=True, text=True, check=True).stdout.strip()
+    raise RuntimeError("no local Postgres found (initdb/pg_ctl not on PATH); install it or set RSR_BENCH_PG")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# yields a SQLAlchemy URL; the server is stopped again when the block exits
+@contextlib.contextmanager
+def local_postgres(data_dir=PGDATA):
+    if EXTERNAL_URL:
+        yield EXTERNAL_URL
+        return
+    bindir = _bindir()
+    data_dir = os.path.abspath(data_dir)
+    if not os.path.exists(os.path.join(data_dir, "PG_VERSION")):
+        os.makedirs(data_dir, exist_ok=True)
+        subprocess.run([os.path.join(bindir, "initdb"), "-D", data_dir, "-U", "bench", "--auth=trust",
+                        "-E", "UTF8", "--no-sync"], check=True, stdout=subprocess.DEVNULL)
+    pg_ctl = os.path.join(bindir, "pg_ctl")
+    port = _free_port()
+    subprocess.run([pg_ctl, "-D", data_dir, "-o", f"-p {port} {SERVER_OPTIONS}",
+                    "-l", os.path.join(data_dir, "server.log"), "-w", "start"], check=True, stdout=subprocess.DEVNULL)
+    try:
+        yield f"postgresql://bench@localhost:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
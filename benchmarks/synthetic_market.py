@@ -0,0 +1,308 @@
+# Synthetic markets for the offline benchmarks.
+#
+# Stand-ins for every database object heavy_lifts reads, built over one generated
+# test table (bench.tests, list-partitioned by csid -- the partitions are the
+# prod_ms_partitions.test_summary_<csid> tables the blocklist check reads directly):
+#
+#   auto.fn_test_summary_reporting   md2.vi_collection_sets / md2.carriers
+#   dq.fn_eom_pl_comp_b              dq.fn_dq_kit_diff          dq.best_net_comp
+#   dq.fn_auto_check                 analytic.fn_dq_check       dq.fn_sort_of_mad
+#   dq.fn_exclusion_review           dq.fn_dev_algo_fails       dq.fn_natl_filter_algo
+#   dq.fn_m2m_fail_layer3_py         dq.fn_dq_tool              analytic.fn_get_previous_csid
+#
+# The functions return the columns heavy_lifts and the page use, with the same kind of
+# work behind them (per-day/kit aggregates, percentiles, row-level failure lists), so
+# timings scale with market size the way the production ones do.  The values are
+# random (seeded), not realistic.  A market is a (comparison, current) csid pair with
+# n test rows each; pairs are registered in bench.markets and reused between runs.
+
+from sqlalchemy import text
+
+FIRST_CSID = 900000
+
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS bench;
+CREATE SCHEMA IF NOT EXISTS auto;
+CREATE SCHEMA IF NOT EXISTS dq;
+CREATE SCHEMA IF NOT EXISTS analytic;
+CREATE SCHEMA IF NOT EXISTS md2;
+CREATE SCHEMA IF NOT EXISTS prod_ms_partitions;
+
+CREATE TABLE IF NOT EXISTS bench.markets (
+    csid integer PRIMARY KEY,
+    comp_csid integer,
+    n_rows bigint NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS md2.carriers (carrier_id integer PRIMARY KEY, name text);
+INSERT INTO md2.carriers VALUES (1, 'AT&T'), (2, 'T-Mobile'), (3, 'Verizon'), (4, 'Dish') ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS md2.vi_collection_sets (
+    collection_set_id integer PRIMARY KEY,
+    collection_set text,
+    time_zone text
+);
+
+CREATE TABLE IF NOT EXISTS bench.tests (
+    collection_set_id integer NOT NULL,
+    test_id bigint NOT NULL,
+    collection_type_id smallint,
+    carrier_id integer,
+    employee_letter text,
+    kit_type_id smallint,
+    device_time timestamptz,
+    test_type_id smallint,
+    flag_access_success boolean,
+    flag_task_success boolean,
+    call_network_type text,
+    best_network_type text,
+    is_reportable boolean,
+    period_name text,
+    product_period text,
+    flag_valid boolean,
+    blacklisted boolean,
+    friendly_name text,
+    device_id integer,
+    manual_blacklist_remark text,
+    auto_bl_reason text,
+    access_time numeric,
+    task_time numeric,
+    throughput numeric
+) PARTITION BY LIST (collection_set_id);
+
+CREATE OR REPLACE FUNCTION analytic.fn_get_previous_csid(integer) RETURNS integer
+LANGUAGE sql STABLE AS $$ SELECT comp_csid FROM bench.markets WHERE csid = $1 $$;
+
+CREATE OR REPLACE FUNCTION auto.fn_test_summary_reporting(integer) RETURNS SETOF bench.tests
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.tests WHERE collection_set_id = $1 $$;
+
+CREATE OR REPLACE FUNCTION dq.fn_dq_tool(integer)
+RETURNS TABLE(collection_set_id integer, test_id bigint, product_period text, period_name text, friendly_name text,
+              device_id integer, test_type_id smallint, best_network_type text, blocklisted boolean, flag_valid boolean)
+LANGUAGE sql STABLE AS $$
+SELECT t.collection_set_id, t.test_id, t.product_period, t.period_name, t.friendly_name, t.device_id,
+       t.test_type_id, t.best_network_type, t.blacklisted, t.flag_valid
+FROM bench.tests t WHERE t.collection_set_id = $1
+$$;
+
+-- kit 2 minus kit 1 access/task failure rates per carrier, employee, day and test type
+CREATE OR REPLACE VIEW bench.kit_diff AS
+SELECT t.collection_set_id AS csid, c.name AS carrier, t.employee_letter AS emp,
+       to_char(t.device_time, 'mmdd') AS loc_day, t.test_type_id, count(*) AS n_grp,
+       round(100.0 * avg((NOT t.flag_access_success)::int) FILTER (WHERE t.kit_type_id = 2)
+             - 100.0 * avg((NOT t.flag_access_success)::int) FILTER (WHERE t.kit_type_id = 1), 2) AS acc_delta,
+       round(100.0 * avg((t.flag_task_success IS FALSE)::int) FILTER (WHERE t.kit_type_id = 2)
+             - 100.0 * avg((t.flag_task_success IS FALSE)::int) FILTER (WHERE t.kit_type_id = 1), 2) AS tsk_delta
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.is_reportable
+GROUP BY 1, 2, 3, 4, 5;
+
+CREATE OR REPLACE FUNCTION dq.fn_dq_kit_diff(integer) RETURNS SETOF bench.kit_diff
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.kit_diff WHERE csid = $1 $$;
+
+-- market-level rate per carrier and metric (the eom comparison joins two of these)
+CREATE OR REPLACE VIEW bench.eom_rates AS
+SELECT t.collection_set_id AS csid, s.collection_set AS name, c.name AS carrier, m.metric, m.rank,
+       round(CASE m.kind WHEN 'access' THEN 100.0 * avg((NOT t.flag_access_success)::int)
+                         WHEN 'task' THEN 100.0 * avg((t.flag_task_success IS FALSE)::int)
+                         ELSE avg(t.throughput) END, 2) AS rate
+FROM bench.tests t
+JOIN (VALUES (23, 'm2m_block', '01m', 'access'), (23, 'm2m_drop', '02m', 'task'),
+             (20, 'dl_fail', '05d', 'task'), (19, 'ul_fail', '08u', 'task'),
+             (27, 'video_access', '12v', 'access'), (27, 'video_fail', '13v', 'task'),
+             (26, 'ldr_fail', '14v', 'task'), (27, 'video_stall', '16v', 'access'),
+             (20, 'dl_access', '20d', 'access'), (19, 'ul_access', '21u', 'access'),
+             (20, 'dl_throughput', '30t', 'throughput'), (19, 'ul_throughput', '31t', 'throughput'),
+             (14, 'sms_fail', '40s', 'task')) AS m(test_type_id, metric, rank, kind)
+  ON m.test_type_id = t.test_type_id
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+JOIN md2.vi_collection_sets s ON s.collection_set_id = t.collection_set_id
+WHERE t.is_reportable
+GROUP BY t.collection_set_id, s.collection_set, c.name, m.metric, m.rank, m.kind;
+
+CREATE OR REPLACE FUNCTION dq.fn_eom_pl_comp_b(integer, integer)
+RETURNS TABLE(rank text, csid integer, comp integer, name text, carrier text, metric text, current_rate numeric,
+              past_rate numeric, delta numeric, pct_change numeric, type smallint)
+LANGUAGE sql STABLE AS $$
+SELECT cur.rank, cur.csid, $2, cur.name, cur.carrier, cur.metric, cur.rate, past.rate,
+       round(cur.rate - past.rate, 2), round(100 * (cur.rate - past.rate) / NULLIF(past.rate, 0), 2), 1::smallint
+FROM bench.eom_rates cur
+LEFT JOIN bench.eom_rates past ON past.csid = $2 AND past.carrier = cur.carrier AND past.metric = cur.metric
+WHERE cur.csid = $1
+$$;
+
+CREATE OR REPLACE VIEW bench.best_net AS
+SELECT t.collection_set_id AS csid, c.name AS carrier, t.test_type_id, t.best_network_type, count(*) AS tests,
+       round(100.0 * count(*) / sum(count(*)) OVER (PARTITION BY t.collection_set_id, c.name, t.test_type_id), 2) AS pct
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.test_type_id IN (19, 20, 26) AND t.is_reportable
+GROUP BY 1, 2, 3, 4;
+
+CREATE OR REPLACE FUNCTION dq.best_net_comp(integer) RETURNS SETOF bench.best_net
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.best_net WHERE csid = $1 $$;
+
+CREATE OR REPLACE VIEW bench.auto_check AS
+SELECT t.collection_set_id AS csid, c.name AS carrier, t.employee_letter AS emp,
+       to_char(t.device_time, 'mmdd') AS loc_day, t.kit_type_id, count(*) AS tests,
+       count(*) FILTER (WHERE NOT t.flag_valid) AS invalid,
+       count(*) FILTER (WHERE t.period_name IS NULL) AS no_period
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+GROUP BY 1, 2, 3, 4, 5;
+
+CREATE OR REPLACE FUNCTION dq.fn_auto_check(integer) RETURNS SETOF bench.auto_check
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.auto_check WHERE csid = $1 $$;
+
+CREATE OR REPLACE VIEW bench.dq_check AS
+SELECT t.collection_set_id AS csid, t.test_type_id, t.kit_type_id, count(*) AS tests,
+       count(*) FILTER (WHERE t.is_reportable) AS reportable,
+       count(*) FILTER (WHERE t.flag_valid) AS valid,
+       count(*) FILTER (WHERE t.blacklisted) AS blacklisted
+FROM bench.tests t
+GROUP BY 1, 2, 3;
+
+CREATE OR REPLACE FUNCTION analytic.fn_dq_check(integer) RETURNS SETOF bench.dq_check
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.dq_check WHERE csid = $1 $$;
+
+CREATE OR REPLACE VIEW bench.sort_of_mad AS
+SELECT t.collection_set_id AS csid, s.collection_set, c.name AS carrier, t.test_type_id,
+       to_char(t.device_time, 'mmdd') AS loc_day, count(*) AS n_grp,
+       round(avg(t.access_time), 3) AS acc, round(avg(t.task_time), 3) AS task,
+       CASE WHEN t.test_type_id = 19 THEN percentile_cont(0.5) WITHIN GROUP (ORDER BY t.throughput::float8) END AS ul_speed_50p,
+       CASE WHEN t.test_type_id = 20 THEN percentile_cont(0.5) WITHIN GROUP (ORDER BY t.throughput::float8) END AS dl_speed_50p,
+       CASE WHEN t.test_type_id = 26 THEN percentile_cont(0.95) WITHIN GROUP (ORDER BY t.access_time::float8) END AS ldrs_access_sp_95p,
+       CASE WHEN t.test_type_id = 26 THEN percentile_cont(0.95) WITHIN GROUP (ORDER BY t.task_time::float8) END AS ldrs_task_sp_95p
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+JOIN md2.vi_collection_sets s ON s.collection_set_id = t.collection_set_id
+WHERE t.is_reportable AND t.flag_valid
+GROUP BY 1, 2, 3, 4, 5;
+
+CREATE OR REPLACE FUNCTION dq.fn_sort_of_mad(integer) RETURNS SETOF bench.sort_of_mad
+LANGUAGE sql STABLE AS $$ SELECT * FROM bench.sort_of_mad WHERE csid = $1 $$;
+
+CREATE OR REPLACE FUNCTION dq.fn_exclusion_review(integer)
+RETURNS TABLE(csid integer, test_id bigint, carrier text, emp text, test_type_id smallint, device_time timestamptz,
+              manual_blacklist_remark text, auto_bl_reason text)
+LANGUAGE sql STABLE AS $$
+SELECT t.collection_set_id, t.test_id, c.name, t.employee_letter, t.test_type_id, t.device_time,
+       t.manual_blacklist_remark, t.auto_bl_reason
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.collection_set_id = $1 AND (t.blacklisted OR NOT t.flag_valid)
+$$;
+
+-- row-level failure lists: the large results (about a fifth of the market)
+CREATE OR REPLACE FUNCTION dq.fn_dev_algo_fails(integer)
+RETURNS TABLE(csid integer, test_id bigint, carrier text, emp text, kit_type_id smallint, test_type_id smallint,
+              loc_day text, device_time timestamptz, best_network_type text, call_network_type text,
+              access_time numeric, task_time numeric, throughput numeric, algo_reason text)
+LANGUAGE sql STABLE AS $$
+SELECT t.collection_set_id, t.test_id, c.name, t.employee_letter, t.kit_type_id, t.test_type_id,
+       to_char(t.device_time, 'mmdd'), t.device_time, t.best_network_type, t.call_network_type,
+       t.access_time, t.task_time, t.throughput,
+       CASE WHEN NOT t.flag_access_success THEN 'access_fail'
+            WHEN t.flag_task_success IS FALSE THEN 'task_fail' ELSE 'slow_task' END
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.collection_set_id = $1 AND t.is_reportable
+  AND (NOT t.flag_access_success OR t.flag_task_success IS FALSE OR t.task_time > 25)
+$$;
+
+CREATE OR REPLACE FUNCTION dq.fn_natl_filter_algo(integer)
+RETURNS TABLE(csid integer, test_id bigint, carrier text, test_type_id smallint, loc_day text,
+              throughput numeric, task_time numeric)
+LANGUAGE sql STABLE AS $$
+SELECT t.collection_set_id, t.test_id, c.name, t.test_type_id, to_char(t.device_time, 'mmdd'),
+       t.throughput, t.task_time
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.collection_set_id = $1 AND t.is_reportable AND t.test_type_id IN (19, 20, 26) AND t.throughput < 25
+$$;
+
+CREATE OR REPLACE FUNCTION dq.fn_m2m_fail_layer3_py(integer)
+RETURNS TABLE(csid integer, test_id bigint, report_set text, emp text, kit_type_id smallint, loc_day text,
+              call_network_type text, failure text, layer3_message text)
+LANGUAGE sql STABLE AS $$
+SELECT t.collection_set_id, t.test_id, c.name, t.employee_letter, t.kit_type_id, to_char(t.device_time, 'mmdd'),
+       t.call_network_type,
+       CASE WHEN NOT t.flag_access_success THEN 'block' ELSE 'drop' END,
+       'SIP/2.0 ' || (400 + mod(t.test_id, 100))::text || ' synthetic failure'
+FROM bench.tests t
+JOIN md2.carriers c ON c.carrier_id = t.carrier_id
+WHERE t.collection_set_id = $1 AND t.test_type_id = 23
+  AND (NOT t.flag_access_success OR t.flag_task_success IS FALSE)
+$$;
+"""
+
+# one row per test; bl decides blocklisting and its reason together
+GENERATE_SQL = """
+INSERT INTO bench.tests
+SELECT :csid, s.g, 1,
+       1 + floor(random() * 4)::int,
+       chr(65 + floor(random() * 4)::int),
+       1 + floor(random() * 2)::int,
+       (timestamp '2025-07-01 07:00' AT TIME ZONE 'America/Chicago')
+           + floor(random() * :days) * interval '1 day' + random() * interval '14 hours',
+       (ARRAY[14, 19, 20, 23, 26, 27])[1 + floor(random() * 6)::int],
+       random() > 0.02,
+       CASE WHEN random() < 0.03 THEN NULL ELSE random() > 0.03 END,
+       (ARRAY['VoLTE', 'VoNR', '3G'])[1 + floor(random() * 3)::int],
+       (ARRAY['NR SA', 'NR NSA, LTE', 'LTE', 'NR NSA'])[1 + floor(random() * 4)::int],
+       random() > 0.05,
+       CASE WHEN random() < 0.01 THEN NULL ELSE :period END,
+       :period,
+       random() > 0.02,
+       s.bl < 0.04,
+       (ARRAY['Galaxy S24', 'Pixel 8', 'iPhone 15'])[1 + floor(random() * 3)::int],
+       100 + floor(random() * 12)::int,
+       CASE WHEN s.bl >= 0.03 AND s.bl < 0.04 THEN 'kit swap' END,
+       CASE WHEN s.bl < 0.03 THEN (ARRAY['gps', 'duplicate', 'short test'])[1 + floor(random() * 3)::int] END,
+       round((random() * 5)::numeric, 3),
+       round((random() * 30)::numeric, 3),
+       round((random() * 500)::numeric, 1)
+FROM (SELECT g, random() AS bl FROM generate_series(1, :n_rows) g) s
+"""
+
+
+def install_schema(connection):
+    connection.exec_driver_sql(SCHEMA_SQL)
+
+
+def partition_name(csid):
+    return f"prod_ms_partitions.test_summary_{int(csid)}"
+
+
+# (re)generate one csid's tests; days grow with size so every kit/day group keeps enough M2M calls
+def load_market(connection, csid, n_rows, period, seed):
+    table = partition_name(csid)
+    days = max(1, min(28, n_rows // 20000))
+    connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    connection.execute(text(f"CREATE TABLE {table} PARTITION OF bench.tests FOR VALUES IN ({int(csid)})"))
+    connection.execute(text("""
+        INSERT INTO md2.vi_collection_sets VALUES (:csid, :name, 'America/Chicago')
+        ON CONFLICT (collection_set_id) DO UPDATE SET collection_set = EXCLUDED.collection_set
+    """), {'csid': csid, 'name': f"Bench {n_rows} {period}"})
+    connection.execute(text("SELECT setseed(:seed)"), {'seed': seed})
+    connection.execute(text(GENERATE_SQL), {'csid': csid, 'n_rows': n_rows, 'days': days, 'period': period})
+    connection.execute(text(f"ANALYZE {table}"))
+
+
+# (csid, comp_csid) of the market with n_rows tests, generated on first use
+def ensure_market(engine, n_rows):
+    with engine.begin() as connection:
+        install_schema(connection)
+        row = connection.execute(text("SELECT csid, comp_csid FROM bench.markets WHERE n_rows = :n AND comp_csid IS NOT NULL"),
+                                 {'n': n_rows}).first()
+        if row is not None:
+            return row.csid, row.comp_csid
+        last = connection.execute(text("SELECT max(csid) FROM bench.markets")).scalar_one()
+        comp_csid = (last or FIRST_CSID) + 1
+        csid = comp_csid + 1
+        load_market(connection, comp_csid, n_rows, '2025-1H', seed=0.25)
+        load_market(connection, csid, n_rows, '2025-2H', seed=0.5)
+        connection.execute(text("INSERT INTO bench.markets VALUES (:comp, NULL, :n), (:csid, :comp, :n)"),
+                           {'csid': csid, 'comp': comp_csid, 'n': n_rows})
+        return csid, comp_csid
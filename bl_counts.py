@@ -0,0 +1,155 @@
+# Blocklist-rate counters per (csid, test_type_id), kept locally (SQLite).
+#
+# The blocklist-rate check only needs a dozen numbers per market, but dq_bl_test gets
+# them from a full scan of prod_ms_partitions.test_summary_<csid>.  Here the counts are
+# stored in RSR_BL_COUNTS_DB together with a watermark (the highest test_id counted) and
+# the partition's catalog state at the time (pg_class relfilenode/relnatts and the
+# pg_stat_user_tables insert/update/delete counters).  A refresh reads that catalog row
+# and the partition's current max(test_id) (an index lookup) first and then:
+#
+#   nothing changed            -> the stored counts, no scan
+#   only inserts since         -> counts of the rows past the watermark, added on; a full scan
+#   (max(test_id) or the          instead if fewer rows turn up than the insert counter says
+#   insert counter moved)         (rows out of test_id order, rolled-back inserts)
+#   updates/deletes, rewrite,  -> full scan (re-blocklisting updates rows; TRUNCATE, VACUUM
+#   max(test_id) went down,       FULL and ALTER TABLE change relfilenode/relnatts)
+#   statistics reset
+#
+# The statistics counters are not proof on their own: they lag a commit by up to a
+# second, and on a hot standby they don't move at all.  max(test_id) is read from the
+# table itself, so new tests are always seen.  A standby can't see updates, so its
+# counts are rebuilt by a full scan once the last one is RSR_BL_COUNTS_MAX_AGE old.
+#
+#   RSR_BL_COUNTS          1/0, serve the blocklist rate from the counters (default 1)
+#   RSR_BL_COUNTS_DB       default .rdaq_data/bl_counts.sqlite
+#   RSR_BL_COUNTS_MAX_AGE  seconds a standby's counts are trusted (default 3600)
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+DB_PATH = os.getenv("RSR_BL_COUNTS_DB", os.path.join(".rdaq_data", "bl_counts.sqlite"))
+ENABLED = os.getenv("RSR_BL_COUNTS", "1") != "0"
+MAX_AGE = float(os.getenv("RSR_BL_COUNTS_MAX_AGE", 3600))
+
+COUNT_COLUMNS = ['test_type_id', 'total_count', 'bl']
+STATS_COLUMNS = ['relfilenode', 'relnatts', 'n_tup_ins', 'n_tup_upd', 'n_tup_del']
+# read with the stats on every refresh, not stored: the partition's max(test_id) and whether
+# the server is a standby (pg_is_in_recovery)
+PROBE_COLUMNS = ['max_test_id', 'in_recovery']
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(csid):
+    with _locks_lock:
+        return _locks.setdefault(int(csid), threading.Lock())
+
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    connection = sqlite3.connect(DB_PATH, timeout=10)
+    try:
+        with connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS bl_counts (
+                csid INTEGER NOT NULL, test_type_id INTEGER, total_count INTEGER NOT NULL, bl INTEGER NOT NULL)""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS bl_state (
+                csid INTEGER PRIMARY KEY, watermark INTEGER, relfilenode INTEGER, relnatts INTEGER,
+                n_tup_ins INTEGER, n_tup_upd INTEGER, n_tup_del INTEGER, refreshed REAL NOT NULL)""")
+            yield connection
+    finally:
+        connection.close()
+
+
+# (state dict or None, counts frame) as stored for a csid
+def load(csid):
+    with _connect() as connection:
+        row = connection.execute(f"SELECT watermark, {', '.join(STATS_COLUMNS)}, refreshed FROM bl_state WHERE csid = ?",
+                                 (int(csid),)).fetchone()
+        counts = pd.read_sql_query("SELECT test_type_id, total_count, bl FROM bl_counts WHERE csid = ?",
+                                   connection, params=(int(csid),))
+    if row is None:
+        return None, counts
+    return dict(zip(['watermark'] + STATS_COLUMNS + ['refreshed'], row)), counts
+
+
+# state['refreshed']: when the counts were last rebuilt by a full scan (default now)
+def save(csid, state, counts):
+    rows = [(int(csid), None if pd.isna(t) else int(t), int(n), int(b))
+            for t, n, b in counts[COUNT_COLUMNS].itertuples(index=False, name=None)]
+    with _connect() as connection:
+        connection.execute("DELETE FROM bl_counts WHERE csid = ?", (int(csid),))
+        connection.executemany("INSERT INTO bl_counts VALUES (?, ?, ?, ?)", rows)
+        connection.execute("INSERT OR REPLACE INTO bl_state VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (int(csid), state['watermark'], *[state[c] for c in STATS_COLUMNS],
+                            state.get('refreshed') or time.time()))
+
+
+def invalidate(csid):
+    with _connect() as connection:
+        connection.execute("DELETE FROM bl_counts WHERE csid = ?", (int(csid),))
+        connection.execute("DELETE FROM bl_state WHERE csid = ?", (int(csid),))
+
+
+# 'cached', 'incremental' or 'full' for the stored state against the partition's current
+# stats and probe (STATS_COLUMNS + PROBE_COLUMNS; a missing probe counts as unknown)
+def plan(state, stats, now=None):
+    if state is None or state['watermark'] is None:
+        return 'full'
+    if any(state[c] != stats[c] for c in ('relfilenode', 'relnatts')):
+        return 'full'
+    top = stats.get('max_test_id')
+    if 'max_test_id' in stats and (top is None or top < state['watermark']):
+        return 'full'       # counted rows are gone
+    newer = top is not None and top > state['watermark']
+    if stats.get('in_recovery'):
+        if (time.time() if now is None else now) - state['refreshed'] > MAX_AGE:
+            return 'full'
+        return 'incremental' if newer else 'cached'
+    if any(state[c] != stats[c] for c in ('n_tup_upd', 'n_tup_del')) or stats['n_tup_ins'] < state['n_tup_ins']:
+        return 'full'
+    return 'incremental' if newer or stats['n_tup_ins'] > state['n_tup_ins'] else 'cached'
+
+
+def _add(counts, fresh):
+    both = pd.concat([counts[COUNT_COLUMNS], fresh[COUNT_COLUMNS]], ignore_index=True)
+    return both.groupby('test_type_id', dropna=False, as_index=False)[['total_count', 'bl']].sum()
+
+
+def _watermark(fresh, previous=None):
+    marks = [m for m in [previous, fresh['max_test_id'].max() if len(fresh) else None] if m is not None and not pd.isna(m)]
+    return int(max(marks)) if marks else previous
+
+
+# counts per test_type_id, up to date with the partition; returns (counts, how).
+# stats: the partition's STATS_COLUMNS and PROBE_COLUMNS (None if unknown -- then always a full
+# scan, nothing stored).
+# fetch(csid, after_test_id) returns test_type_id, total_count, bl, scanned (every row read) and
+# max_test_id for the rows with test_id > after_test_id (every row when None)
+def refresh(csid, stats, fetch):
+    if stats is None:
+        return fetch(csid, None), 'full'
+    with _lock(csid):
+        state, counts = load(csid)
+        how = plan(state, stats)
+        if how == 'cached':
+            return counts, how
+        if how == 'incremental':
+            fresh = fetch(csid, state['watermark'])
+            # more rows than the counter says is only the counter lagging; fewer means rows
+            # arrived out of test_id order or inserts were rolled back (a standby's counter can't tell)
+            if stats.get('in_recovery') or int(fresh['scanned'].sum()) >= stats['n_tup_ins'] - state['n_tup_ins']:
+                counts, watermark, refreshed = _add(counts, fresh), _watermark(fresh, state['watermark']), state['refreshed']
+            else:
+                how = 'full'
+        if how == 'full':
+            fresh = fetch(csid, None)
+            counts, watermark, refreshed = fresh[COUNT_COLUMNS], _watermark(fresh), time.time()
+        save(csid, {'watermark': watermark, **stats, 'refreshed': refreshed}, counts)
+        return counts.reset_index(drop=True), how
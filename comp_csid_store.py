@@ -0,0 +1,169 @@
+# Local csid -> comp_csid mapping (SQLite).
+#
+# analytic.fn_get_previous_csid answers the same thing every time for a given csid, so
+# the answer is remembered across sessions and restarts in RSR_COMP_CSID_DB together
+# with where it came from: 'db' (the function) or 'manual' (entered in the form when
+# the function had no answer).  Lookups are a local read; a 'db' entry older than
+# RSR_COMP_CSID_REFRESH seconds is re-checked in the background, never in the form; an
+# unknown csid is looked up in the background too while the form goes on with a default.
+# Manual entries are only replaced by another manual entry.
+#
+#   python comp_csid_store.py preload --csids 12610,12611,12620-12625
+#   python comp_csid_store.py list
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DB_PATH = os.getenv("RSR_COMP_CSID_DB", os.path.join(".rdaq_data", "comp_csid.sqlite"))
+REFRESH_AFTER = float(os.getenv("RSR_COMP_CSID_REFRESH", 6 * 3600))
+
+_refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rdaq-comp-csid")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+_preloaded = False
+
+
+# one short-lived connection per call (callers run on several threads); commits on success
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    connection = sqlite3.connect(DB_PATH, timeout=10)
+    try:
+        with connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS comp_csid (
+                csid INTEGER PRIMARY KEY, comp_csid INTEGER, source TEXT NOT NULL, updated REAL NOT NULL)""")
+            yield connection
+    finally:
+        connection.close()
+
+
+# (comp_csid, source, updated) or None
+def get(csid):
+    with _connect() as connection:
+        return connection.execute("SELECT comp_csid, source, updated FROM comp_csid WHERE csid = ?",
+                                  (int(csid),)).fetchone()
+
+
+# source 'db' never replaces a manual entry
+_UPSERT = """
+    INSERT INTO comp_csid (csid, comp_csid, source, updated) VALUES (?, ?, ?, ?)
+    ON CONFLICT (csid) DO UPDATE SET comp_csid = excluded.comp_csid, source = excluded.source,
+                                     updated = excluded.updated
+    WHERE excluded.source = 'manual' OR comp_csid.source = 'db'
+"""
+
+
+def put_many(pairs, source='db'):
+    now = time.time()
+    with _connect() as connection:
+        connection.executemany(_UPSERT, [(int(csid), int(comp_csid), source, now) for csid, comp_csid in pairs])
+
+
+def put(csid, comp_csid, source):
+    put_many([(csid, comp_csid)], source)
+
+
+def all_entries():
+    with _connect() as connection:
+        return connection.execute("SELECT csid, comp_csid, source, updated FROM comp_csid ORDER BY csid").fetchall()
+
+
+def _refresh(csid, lookup):
+    try:
+        comp_csid = lookup(csid)
+        if comp_csid is not None:
+            put(csid, comp_csid, 'db')
+    except Exception:
+        pass    # keep the stored answer; the next stale read tries again
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(csid)
+
+
+# re-run lookup(csid) on the background thread (once at a time per csid)
+def refresh_async(csid, lookup):
+    with _in_flight_lock:
+        if csid in _in_flight:
+            return
+        _in_flight.add(csid)
+    _refresh_pool.submit(_refresh, csid, lookup)
+
+
+# stored comp_csid (stale 'db' answers are refreshed in the background); on a miss, lookup(csid)
+# is run here and stored -- or with wait=False started in the background, returning (None, 'pending').
+# Returns (comp_csid, source) -- (None, None) if nobody knows it
+def resolve(csid, lookup, wait=True):
+    entry = get(csid)
+    if entry is not None and entry[0] is not None:
+        comp_csid, source, updated = entry
+        if source == 'db' and time.time() - updated > REFRESH_AFTER:
+            refresh_async(csid, lookup)
+        return comp_csid, source
+    if not wait:
+        refresh_async(csid, lookup)
+        return None, 'pending'
+    comp_csid = lookup(csid)
+    if comp_csid is not None:
+        put(csid, comp_csid, 'db')
+        return comp_csid, 'db'
+    return None, None
+
+
+# csids worth keeping warm: everything already resolved from the database
+def known_csids():
+    return [row[0] for row in all_entries() if row[2] == 'db']
+
+
+# resolve many csids in one query (bulk_lookup: list of csids -> {csid: comp_csid}) and store them
+def preload(csids, bulk_lookup):
+    csids = sorted({int(c) for c in csids})
+    if not csids:
+        return {}
+    found = {csid: comp for csid, comp in bulk_lookup(csids).items() if comp is not None}
+    put_many(found.items())
+    return found
+
+
+def _preload_quietly(csids, bulk_lookup):
+    try:
+        return preload(csids, bulk_lookup)
+    except Exception:
+        return {}
+
+
+# once per process, in the background: the stored csids plus `csids` (e.g. the bundled ones)
+def preload_async(bulk_lookup, csids=()):
+    global _preloaded
+    with _in_flight_lock:
+        if _preloaded:
+            return None
+        _preloaded = True
+    return _refresh_pool.submit(_preload_quietly, known_csids() + list(csids), bulk_lookup)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="csid -> comp_csid mapping store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("preload", help="look up comp_csids in one query and store them")
+    load.add_argument("--csids", default="", help="comma-separated CSIDs or ranges (default: the stored ones)")
+    sub.add_parser("list", help="print the stored mapping")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for csid, comp_csid, source, updated in all_entries():
+            print(f"{csid}\t{comp_csid}\t{source}\t{time.strftime('%Y-%m-%d %H:%M', time.localtime(updated))}")
+        return
+    import heavy_lifts
+    from rdaq_review import parse_csids
+    csids = parse_csids(args.csids) or known_csids()
+    found = preload(csids, heavy_lifts.lookup_comp_csids)
+    print(f"stored {len(found)} of {len(csids)} csids")
+
+
+if __name__ == "__main__":
+    main()
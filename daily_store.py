@@ -0,0 +1,130 @@
+# Incremental daily refresh for an in-progress CSID.
+#
+# During a live collection only the latest days change, so per-loc_day partial results
+# (call/net counts per kit and day, kit-diff rows) are kept locally as
+# <RSR_DAILY_DIR>/<name>/<csid>.parquet.  A refresh queries only the days from the
+# stored high-water mark minus RSR_DAILY_LOOKBACK_DAYS (late uploads land in recent
+# days), replaces those days in the stored frame and writes it back.  The first
+# refresh of a CSID fetches every day.
+#
+#   RSR_DAILY_INCREMENTAL   1/0, use the incremental path in heavy_lifts (default 1)
+#   RSR_DAILY_DIR           default .rdaq_data/daily
+#   RSR_DAILY_LOOKBACK_DAYS days before the high-water mark fetched again (default 2)
+#   RSR_DAILY_MAX_MB        size bound of the store (default 1024); the CSIDs refreshed
+#                           longest ago are dropped first
+
+import datetime
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+DAILY_DIR = os.getenv("RSR_DAILY_DIR", os.path.join(".rdaq_data", "daily"))
+LOOKBACK_DAYS = int(os.getenv("RSR_DAILY_LOOKBACK_DAYS", 2))
+MAX_BYTES = int(float(os.getenv("RSR_DAILY_MAX_MB", 1024)) * 1024 * 1024)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine; without it every refresh fetches all days)
+    ENABLED = os.getenv("RSR_DAILY_INCREMENTAL", "1") != "0"
+except ImportError:
+    ENABLED = False
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(name, csid):
+    with _locks_lock:
+        return _locks.setdefault((name, int(csid)), threading.Lock())
+
+
+def path(name, csid):
+    return os.path.join(DAILY_DIR, name, f"{int(csid)}.parquet")
+
+
+def read(name, csid):
+    try:
+        return pd.read_parquet(path(name, csid))
+    except FileNotFoundError:
+        return None
+
+
+# drop the least recently written files until the store fits MAX_BYTES (`keep` stays)
+def _evict(keep=None):
+    files = []
+    for root, _, names in os.walk(DAILY_DIR):
+        for file_name in names:
+            if file_name.endswith(".parquet"):
+                file = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file))
+    total = sum(size for _, size, _ in files)
+    for _, size, file in sorted(files):
+        if total <= MAX_BYTES:
+            break
+        if file == keep:
+            continue
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+# written to a temp file of its own first, so concurrent refreshes never publish a partial file
+def write(name, csid, df):
+    file = path(name, csid)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file), suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _evict(keep=file)
+
+
+# first loc_day ('mmdd') to fetch again: the high-water mark minus the look-back, within the same year
+# (a collection set is one half-year, so loc_day never wraps)
+def since_day(loc_days, lookback=LOOKBACK_DAYS):
+    last = max(loc_days)
+    day = datetime.date(2000, int(last[:2]), int(last[2:])) - datetime.timedelta(days=lookback)
+    return "0101" if day.year < 2000 else day.strftime("%m%d")
+
+
+# stored days before the refresh point + fetch(csid, since) for the rest; fetch(csid, None) returns every day
+def refresh(name, csid, fetch, lookback=LOOKBACK_DAYS):
+    if not ENABLED:
+        return fetch(csid, None)
+    with _lock(name, csid):
+        stored = read(name, csid)
+        days = [] if stored is None else stored['loc_day'].dropna().astype(str)
+        if len(days) == 0:
+            df = fetch(csid, None)
+        else:
+            since = since_day(days, lookback)
+            fresh = fetch(csid, since)
+            kept = stored[stored['loc_day'].astype(str) < since]
+            df = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh
+        write(name, csid, df)
+        return df
+
+
+# forget the stored days of a csid (the next refresh fetches everything)
+def invalidate(csid):
+    removed = 0
+    if not os.path.isdir(DAILY_DIR):
+        return removed
+    for name in os.listdir(DAILY_DIR):
+        try:
+            os.remove(path(name, csid))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
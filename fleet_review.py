@@ -0,0 +1,110 @@
+# Fleet view: the headline numbers of many markets side by side.
+#
+#   python -m rdaq_review fleet --csids 12610-12650
+#
+# Every checkpoint is one statement for the whole list of CSIDs (the "Fleet view" queries
+# in heavy_lifts call the dq.fn_* function per csid inside the server, LATERAL over the
+# csid array), and the statements run together on the checkpoint scheduler -- so 40
+# markets cost a handful of round trips instead of 40 reviews.  The per-market summary
+# comes from the stacked frames with one groupby per checkpoint:
+#
+#   <checkpoint>          flagged rows, as counted for the review bundles
+#   max_bl_rate           highest blocklist rate over the test types
+#   nr_pct, nr_nsa_pct    share of the valid download tests on NR SA / NR NSA (best_network_type
+#                         'NR NSA' or 'NR NSA, LTE')
+#   worst_eom_pct_change  lowest pct_change against the comparison market
+#
+# One statement does the work of len(csids) single-market ones, so its timeout is
+# RSR_FLEET_TIMEOUT_PER_CSID seconds per market, never less than RSR_CHECKPOINT_TIMEOUT.
+
+import os
+
+import pandas as pd
+
+from review_rules import get_ruleset
+
+FLAG_CHECKPOINTS = ('eom', 'datadiff', 'dev_algo', 'filtered_algo', 'layer3', 'auto_check', 'dqcheck')
+SA_TYPES = ('NR SA',)
+NSA_TYPES = ('NR NSA', 'NR NSA, LTE')     # both spellings occur in best_network_type
+TIMEOUT_PER_CSID = float(os.getenv("RSR_FLEET_TIMEOUT_PER_CSID", 30))
+
+
+# timeout (s) of one fleet checkpoint over n_csids markets
+def fleet_timeout(n_csids, per_csid=None):
+    import heavy_lifts
+    return max(heavy_lifts.CHECKPOINT_TIMEOUT, (per_csid or TIMEOUT_PER_CSID) * n_csids)
+
+
+# {csid: comp_csid} from the comp_csid store; the ones it doesn't know are looked up in one query
+def fleet_comp_csids(csids):
+    import heavy_lifts
+    import comp_csid_store
+    found = {}
+    for csid in csids:
+        entry = comp_csid_store.get(csid)
+        if entry is not None and entry[0] is not None:
+            found[csid] = entry[0]
+    missing = [csid for csid in csids if csid not in found]
+    if missing:
+        found.update(comp_csid_store.preload(missing, heavy_lifts.lookup_comp_csids))
+    return found
+
+
+# one scheduler job per checkpoint, each covering every market (timeout: see fleet_timeout)
+def fleet_jobs(csids, comp_csids, timeout=None, per_csid=None):
+    import heavy_lifts
+    csids = tuple(csids)
+    timeout = timeout or fleet_timeout(len(csids), per_csid)
+    jobs = {name: (heavy_lifts.get_fleet_checkpoint, (csids, name), timeout) for name in heavy_lifts.FLEET_FUNCTIONS}
+    jobs['datadiff'] = (heavy_lifts.get_fleet_datadiff, (csids,), timeout)
+    jobs['bl_test'] = (heavy_lifts.get_fleet_bl_test, (csids,), timeout)
+    jobs['nr'] = (heavy_lifts.get_dl_nr_counts, (csids,), timeout)
+    paired = [csid for csid in csids if comp_csids.get(csid) is not None]
+    if paired:
+        jobs['eom_full'] = (heavy_lifts.get_fleet_eom, (tuple(paired), tuple(int(comp_csids[c]) for c in paired)),
+                            timeout)
+    return jobs
+
+
+# stacked checkpoint frames of the markets; returns ({name: frame}, {name: status entry}, {csid: comp_csid})
+def run_fleet(csids, timeout=None, per_csid=None):
+    import heavy_lifts
+    csids = list(dict.fromkeys(int(c) for c in csids))
+    comp_csids = fleet_comp_csids(csids)
+    frames, status = {}, {}
+    for result in heavy_lifts.run_checkpoints(fleet_jobs(csids, comp_csids, timeout, per_csid)):
+        status[result.name] = {'status': result.status, 'elapsed': round(result.elapsed, 2), 'error': result.error}
+        if result.status == 'ok':
+            frames[result.name] = result.df
+            status[result.name]['rows'] = len(result.df)
+    if 'eom_full' in frames:
+        frames['eom'] = get_ruleset('eom').apply(frames['eom_full'])    # flagged rows only, no header rows
+    return frames, status, comp_csids
+
+
+# share (%) of each market's download tests whose best network is one of network_types
+def _nr_share(counts, network_types):
+    tests = counts['dl_count'].groupby(counts['csid']).sum()
+    hits = counts['dl_count'].where(counts['best_network_type'].isin(network_types), 0).groupby(counts['csid']).sum()
+    return (100 * hits / tests).round(2)
+
+
+# one row per market, most flagged rows first; checkpoints that failed are left out (NaN)
+def fleet_summary(frames, csids, comp_csids=None):
+    summary = pd.DataFrame(index=pd.Index([int(c) for c in dict.fromkeys(csids)], name='csid'))
+    summary['comp_csid'] = pd.Series(comp_csids or {}, dtype='Int64')
+    counted = [name for name in FLAG_CHECKPOINTS if name in frames]
+    for name in counted:
+        summary[name] = frames[name].groupby('csid').size().reindex(summary.index, fill_value=0)
+    summary['flagged_total'] = summary[counted].sum(axis=1)
+    if 'bl_test' in frames:
+        bl = frames['bl_test']
+        summary['max_bl_rate'] = pd.to_numeric(bl['bl_rate']).groupby(bl['csid']).max()
+    if 'nr' in frames:
+        summary['nr_pct'] = _nr_share(frames['nr'], SA_TYPES)
+        summary['nr_nsa_pct'] = _nr_share(frames['nr'], NSA_TYPES)
+    if 'eom_full' in frames:
+        eom = frames['eom_full']
+        summary['worst_eom_pct_change'] = pd.to_numeric(eom['pct_change']).groupby(eom['csid']).min()
+    summary = summary.sort_values('flagged_total', ascending=False, kind='stable')
+    return summary.reset_index()
@@ -1,62 +1,161 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import hashlib
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError, OperationalError
 import streamlit as st
+from rsr_conn import get_rsr_conn   # one pooled engine shared by every query
+from query_cache import cached      # shared result cache (per-query TTL, LRU)
+from review_rules import get_ruleset, FLAG_COLUMN   # review thresholds (rule sets)
+import snapshot_store                # Parquet snapshots of closed (comparison) CSIDs
+import stream_fetch                  # chunked server-side-cursor fetch for large results
+import arrow_fetch                   # COPY -> typed Arrow columns for the wide results
+import query_perf                    # per-fetch timing log (Performance panel)
+import daily_store                   # per-loc_day partials for the incremental daily refresh
+import comp_csid_store               # remembered csid -> comp_csid answers (SQLite)
+import bl_counts                     # blocklist-rate counters per csid/test type (SQLite)
 
 # 2025-May-13: updated the daily diff SQL since call and sms were added.
 
+# per-thread query settings (statement timeout is set by the checkpoint scheduler)
+_query_local = threading.local()
+
+
+# pooled connection with the scheduler's per-query timeout applied
+@contextmanager
+def _connection():
+    timeout = getattr(_query_local, "timeout", None)
+    with get_rsr_conn().connect() as connection:
+        if timeout:
+            # SET LOCAL semantics: dropped when the connection goes back to the pool
+            connection.execute(text("SELECT set_config('statement_timeout', :ms, true)"),
+                               {'ms': str(int(timeout * 1000))})
+        yield connection
+
+
+# server-side timings (EXPLAIN ANALYZE, BUFFERS) for the Performance panel -- runs the query an
+# extra time, so only when asked for (set_explain / run_checkpoints(explain=True))
+def _explain_if_requested(connection, sql):
+    if getattr(_query_local, "explain", False) and hasattr(sql, "_bindparams"):
+        query_perf.explain(connection, sql, wrap_statement)
+
+
+def set_explain(enabled):
+    _query_local.explain = enabled
+
+
+# run a query on a pooled connection; stream=True fetches through a server-side cursor
+# in chunks, pruned to `columns` and downcast (see stream_fetch) -- for the large results.
+# arrow=True reads it through COPY into typed Arrow columns instead (see arrow_fetch) --
+# for the wide ones, where building Python objects costs more than the query
+def _read_sql(sql, stream=False, columns=None, arrow=False):
+    with _connection() as connection:
+        _explain_if_requested(connection, sql)
+        if arrow and arrow_fetch.available(connection):
+            return arrow_fetch.read(connection, sql, wrap_statement, columns)
+        if stream:
+            return stream_fetch.concat_chunks(stream_fetch.iter_chunks(connection, sql, columns))
+        return pd.read_sql(sql, con=connection)
+
+
+# stream a query into a Parquet spill file; the UI pages through it without loading it all
+def _spill_sql(sql, name, columns=None, arrow=False):
+    with _connection() as connection:
+        _explain_if_requested(connection, sql)
+        if arrow and arrow_fetch.available(connection):
+            return arrow_fetch.spill(connection, sql, wrap_statement, name, columns)
+        return stream_fetch.spill(stream_fetch.iter_chunks(connection, sql, columns), name)
+
+
+# the same statement (and bind values) embedded in a larger one, e.g. "EXPLAIN ANALYZE {}"
+def wrap_statement(stmt, template):
+    return text(template.format(stmt.text.strip().rstrip(';'))).bindparams(
+        **{name: bind.value for name, bind in stmt._bindparams.items()})
 
-load_dotenv()
 
-def get_rsr_conn():
-    host_str = os.getenv("RSR_CONN")
-    engine = create_engine(host_str)
-    return engine
+# bound-parameter statement: the SQL text no longer changes with the csid, so the
+# server can prepare it once per connection and reuse the plan (see rsr_conn)
+def _bound(sql, **params):
+    return text(sql).bindparams(**params)
+
+# comparison csid from analytic.fn_get_previous_csid (None if the function has no answer)
+def lookup_comp_csid(csid):
+    with get_rsr_conn().connect() as connection:
+        query = text("SELECT analytic.fn_get_previous_csid(:csid)")
+        return connection.execute(query, {'csid': csid}).scalar_one_or_none()
+
+# comparison csids of many csids in one query: {csid: comp_csid}
+def lookup_comp_csids(csids):
+    with get_rsr_conn().connect() as connection:
+        query = text("""SELECT c.csid, analytic.fn_get_previous_csid(c.csid) AS comp_csid
+                        FROM unnest(CAST(:csids AS integer[])) AS c(csid)""")
+        return dict(connection.execute(query, {'csids': [int(c) for c in csids]}).all())
 
 # Correctly call the PostgreSQL function and fetch the result
+# (remembered in comp_csid_store: the form never waits on the database -- an unknown csid is
+# looked up in the background and the default is used until the next Submit)
 def get_comp_csid(csid): # Renamed function to clarify its purpose: getting comp_csid
-    comp_csid = None
+    comp_csid, source, failed = None, None, False
     try:
-        with get_rsr_conn().connect() as connection:
-            query = text("SELECT analytic.fn_get_previous_csid(:csid)")
-            result = connection.execute(query, {'csid': csid}).scalar_one_or_none()
-            if result is not None:
-                comp_csid = result
-            else:
-                st.warning("The database function 'fn_get_previous_csid' returned no result for the given csid. Please enter manually.")
+        comp_csid, source = comp_csid_store.resolve(csid, lookup_comp_csid, wait=False)
+        if source == 'pending':
+            st.info("Looking up the comparison CSID in the background; Submit again to use the database answer.")
+        elif comp_csid is None:
+            st.warning("The database function 'fn_get_previous_csid' returned no result for the given csid. Please enter manually.")
     except (ProgrammingError, OperationalError) as e:
+        failed = True
         st.error(f"Database query error when fetching comp_csid: {e}")
     except Exception as e:
+        failed = True
         st.error(f"An unexpected error occurred while fetching comp_csid: {e}")
 
-    if comp_csid is None:
+    if comp_csid is None or source == 'manual':
+        shown = int(comp_csid or 12709) # Added a default value for manual input
         comp_csid = st.number_input(
             "Could not determine 'comp_csid' from the database. Please enter the comparison CSID manually:",
-            min_value=1, step=1, format="%d", value=12709 # Added a default value for manual input
+            min_value=1, step=1, format="%d", value=shown
         )
-        st.info(f"Using manually entered comp_csid: {comp_csid}")
+        # remembered only when the reviewer confirms it (default value included), never after a failed lookup
+        # (a 'manual' entry is not replaced by later database answers)
+        remember = st.checkbox(f"Remember this comparison CSID for CSID {csid}", value=False)
+        if remember and not failed:
+            comp_csid_store.put(csid, comp_csid, 'manual')
+        if source != 'pending':
+            st.info(f"Using manually entered comp_csid: {comp_csid}")
         
     st.write(f"csid: {csid}, comp_csid: {comp_csid}") # This line is for debugging, can be removed
 
     return comp_csid # This function now returns the comp_csid
 
-def market_comp_query(csid, comp_csid):
-    # This function should return the SQL query for market comparison
-    # Assuming there's a dq.fn_market_comp or similar function
-    return f"""SELECT * FROM dq.fn_eom_pl_comp_b({csid},{comp_csid})"""
+EOM_COLUMNS = ['rank', 'csid', 'comp', 'name', 'carrier', 'metric', 'current_rate', 'past_rate', 'delta', 'pct_change', 'type']
 
-def get_market_comp(csid, comp_csid):
-    # This function now takes comp_csid as an argument
-    df = pd.read_sql(market_comp_query(csid, comp_csid), con=get_rsr_conn())
+def eom_full_query(csid,comp_csid):
+    return _bound("""SELECT * FROM dq.fn_eom_pl_comp_b(:csid,:comp_csid)""", csid=csid, comp_csid=comp_csid)
+
+# execute query to pull full eom table
+# dq.fn_eom_pl_comp_b is the heaviest function in the schema: it is fetched once per
+# (csid, comp_csid) here and every EOM view (market comp, flagged eom) is derived from it
+@cached(ttl=1800)
+@query_perf.timed
+def get_eom_full(csid,comp_csid):
+    df = _read_sql(eom_full_query(csid,comp_csid), stream=True, columns=EOM_COLUMNS, arrow=True)
     return df
 
+def get_market_comp(csid, comp_csid):
+    # same rows as the full eom table -- served from the one cached fetch
+    return get_eom_full(csid, comp_csid)
+
+# SQL version of the flagged eom view; eom_flags() applies the same filters in pandas and
+# tests/test_eom_flags.py checks the two agree row for row
 def eom_query(csid,comp_csid):
-    return f"""
+    return _bound("""
         with eom_plus as (
-SELECT * FROM dq.fn_eom_pl_comp_b({csid},{comp_csid})
+SELECT * FROM dq.fn_eom_pl_comp_b(:csid,:comp_csid)
 )
 SELECT *
 from eom_plus
@@ -82,27 +181,30 @@ SELECT DISTINCT NULL AS rank, csid,comp, name, NULL as carrier,
 NULL AS metric, NULL::numeric as current_rate,NULL::numeric as past_rate,
 NULL::numeric AS delta, NULL::numeric AS pct_change, type::smallint
 FROM eom_plus
-WHERE csid = {csid}
+WHERE csid = :csid
 ORDER BY rank;
-        """
-
-# execute query to pull eom
+        """, csid=csid, comp_csid=comp_csid)
+
+# Flagged eom rows from the full dq.fn_eom_pl_comp_b frame -- row for row the same as eom_query:
+# the 'eom' rule set (see review_rules) plus one header row per market, ordered by rank (NULLs last)
+def eom_flags(df_full, csid):
+    df = get_ruleset('eom').apply(df_full)
+    header = df_full.loc[df_full['csid'] == csid, ['csid', 'comp', 'name', 'type']].drop_duplicates()
+    header = header.reindex(columns=df.columns)
+    header[FLAG_COLUMN] = ''
+    df = pd.concat([df, header], ignore_index=True).drop_duplicates(subset=list(df_full.columns))
+    return df.sort_values('rank', na_position='last', kind='stable').reset_index(drop=True)
+
+# flagged eom view, derived from the cached full eom fetch (no second call to dq.fn_eom_pl_comp_b)
 def get_eom(csid,comp_csid):
-    df = pd.read_sql(eom_query(csid,comp_csid), con=get_rsr_conn())
-    return df
-
-def eom_full_query(csid,comp_csid):
-    return f"""SELECT * FROM dq.fn_eom_pl_comp_b({csid},{comp_csid})"""
-
-# execute query to pull full eom table
-def get_eom_full(csid,comp_csid):
-    df = pd.read_sql(eom_full_query(csid,comp_csid), con=get_rsr_conn())
-    return df
+    return eom_flags(get_eom_full(csid, comp_csid), csid)
 
 
 #Begin Call and network pull
+# SQL version of the call net table, kept for reference; get_callnet builds the same rows from
+# callnet_counts_query + callnet_frame
 def daily_callnet(csid):
-    return f"""
+    return _bound("""
         with cte as (
 	SELECT
 	csid
@@ -139,7 +241,7 @@ def daily_callnet(csid):
 			,SUM(CASE WHEN test_type_id IN (19,20,26) THEN 1 ELSE 0 END) as data_test
 			,SUM(CASE WHEN test_type_id IN (19,20,26) AND best_network_type = 'NR NSA' THEN 1 ELSE 0 END) as nr_nsa
 			,SUM(CASE WHEN test_type_id IN (19,20,26) AND best_network_type = 'NR SA' THEN 1 ELSE 0 END) as nr_sa
-			FROM auto.fn_test_summary_reporting({csid}) ftsr
+			FROM auto.fn_test_summary_reporting(:csid) ftsr
 		LEFT JOIN md2.vi_collection_sets ca ON ftsr.collection_set_id = ca.collection_set_id
 		LEFT JOIN md2.carriers c ON ftsr.carrier_id = c.carrier_id
 		WHERE is_reportable IS TRUE
@@ -184,37 +286,130 @@ SELECT distinct cte.collection_set,cte.csid,cte.collection_type_id,cte.carrier,
 LEFT JOIN cte2 using (csid,carrier,loc_day,emp) 
 LEFT JOIN cte3 using (csid,carrier,loc_day,emp) 
 ORDER BY cte.loc_day;
-        """
-def get_rsr_conn():
-    host_str = os.getenv("RSR_CONN")
-    engine = create_engine(host_str)
-    return engine
-
-# execute query to pull call net
+        """, csid=csid)
+
+# local day of a test, as daily_callnet derives it
+LOC_DAY_SQL = "to_char(timezone(ca.time_zone::text, timezone('UTC'::text, ftsr.device_time)), 'mmdd')"
+
+# raw call/net counts per kit and day (the inner grouping of daily_callnet); since_day limits
+# it to loc_day >= since_day for the incremental refresh
+def callnet_counts_query(csid, since_day=None):
+    params = {'csid': csid}
+    since = ""
+    if since_day is not None:
+        since = f"AND {LOC_DAY_SQL} >= :since_day"
+        params['since_day'] = since_day
+    return _bound(f"""
+			SELECT
+			ftsr.collection_set_id AS csid
+			,ca.collection_set
+	    	,ftsr.collection_type_id
+			,c.name AS carrier
+			,employee_letter as emp
+			,kit_type_id
+			,{LOC_DAY_SQL} AS loc_day
+			,SUM (CASE WHEN test_type_id = 23 THEN 1  ELSE 0 END) AS total_m2m
+			,SUM (CASE WHEN test_type_id = 23 AND  flag_access_success = 'f'  THEN 1  ELSE 0 END) AS m2m_bloc
+			,SUM (CASE WHEN test_type_id = 23 AND  flag_task_success = 'f' THEN 1 ELSE 0 END) AS m2m_dr
+			,SUM (CASE WHEN test_type_id = 23 AND flag_access_success = 't' AND flag_task_success IS NULL THEN 1
+					ELSE 0 END) AS m2m_tsk_nul
+            ,SUM (CASE WHEN test_type_id = 23 AND call_network_type ='VoNR' AND flag_access_success IS TRUE THEN 1 ELSE 0 END) AS m2m_vonr
+			,SUM (CASE WHEN test_type_id = 23 AND call_network_type ='VoLTE' AND flag_access_success IS TRUE THEN 1 ELSE 0 END) AS m2m_volte
+			,SUM(CASE WHEN test_type_id IN (19,20,26) THEN 1 ELSE 0 END) as data_test
+			,SUM(CASE WHEN test_type_id IN (19,20,26) AND best_network_type = 'NR NSA' THEN 1 ELSE 0 END) as nr_nsa
+			,SUM(CASE WHEN test_type_id IN (19,20,26) AND best_network_type = 'NR SA' THEN 1 ELSE 0 END) as nr_sa
+			FROM auto.fn_test_summary_reporting(:csid) ftsr
+		LEFT JOIN md2.vi_collection_sets ca ON ftsr.collection_set_id = ca.collection_set_id
+		LEFT JOIN md2.carriers c ON ftsr.carrier_id = c.carrier_id
+		WHERE is_reportable IS TRUE {since}
+		GROUP BY 1,2,3,4,5,6,7
+    """, **params)
+
+
+@query_perf.timed
+def get_callnet_counts(csid, since_day=None):
+    return _read_sql(callnet_counts_query(csid, since_day))
+
+
+CALLNET_KEYS = ['collection_set', 'csid', 'collection_type_id', 'carrier', 'emp', 'loc_day']
+
+# rate name -> (numerator, denominator, 0 when the numerator is 0) as in daily_callnet
+CALLNET_RATES = {
+    'block': ('m2m_bloc', 'total_m2m', True),
+    'drop': ('m2m_dr', 'm2m_answered', False),      # total_m2m - m2m_tsk_nul
+    'volte': ('m2m_volte', 'total_m2m', True),
+    'vonr': ('m2m_vonr', 'total_m2m', True),
+    'nsa': ('nr_nsa', 'data_test', True),
+    'sa': ('nr_sa', 'data_test', True),
+}
+
+
+# ROUND(num / den * 100, 2) with Postgres numeric rounding (half away from zero); NaN for 0/0
+def _pct(num, den):
+    num = pd.to_numeric(num).astype(float)
+    den = pd.to_numeric(den).astype(float).where(lambda d: d != 0)
+    return (20000 * num + den).floordiv(2 * den) / 100
+
+
+# ROUND(a - b, 1) for two 2-decimal rates
+def _delta(a, b):
+    hundredths = (a * 100).round() - (b * 100).round()
+    tenths = hundredths.abs().add(5).floordiv(10)
+    return tenths.where(hundredths >= 0, -tenths) / 10
+
+
+# daily_callnet's kit 1 vs kit 2 table from the per-kit/day counts: rates per kit, pivoted
+# on kit_type_id to one row per carrier/emp/day with k1_/k2_ rates, k2 - k1 deltas and kit 1's
+# test totals (replaces the SQL's two DISTINCT kit CTEs and the three-way self-join)
+def callnet_frame(counts):
+    counts = counts.assign(m2m_answered=counts['total_m2m'] - counts['m2m_tsk_nul'])
+    for name, (num, den, zero_if_none) in CALLNET_RATES.items():
+        rate = _pct(counts[num], counts[den])
+        counts[name] = rate.mask(counts[num] == 0, 0.0) if zero_if_none else rate
+    values = list(CALLNET_RATES) + ['total_m2m', 'data_test']
+    wide = (counts.drop_duplicates(CALLNET_KEYS + ['kit_type_id'])
+                  .set_index(CALLNET_KEYS + ['kit_type_id'])[values]
+                  .unstack('kit_type_id')
+                  .reindex(columns=pd.MultiIndex.from_product([values, [1, 2]])))
+    df = wide.index.to_frame(index=False)
+    for name in CALLNET_RATES:
+        df[f'k1_{name}'] = wide[(name, 1)].to_numpy()
+        df[f'k2_{name}'] = wide[(name, 2)].to_numpy()
+        df[f'{name}_delta'] = _delta(df[f'k2_{name}'], df[f'k1_{name}'])
+    df['total_m2m'] = wide[('total_m2m', 1)].to_numpy()
+    df['data_test'] = wide[('data_test', 1)].to_numpy()
+    return df.sort_values('loc_day', kind='stable').reset_index(drop=True)
+
+
+# execute query to pull call net: one grouped pass of per-kit/day counts, pivoted by callnet_frame.
+# Incremental by default: only the days since the last refresh are counted on the server (daily_store)
+@cached(ttl=600)
 def get_callnet(csid):
-    df = pd.read_sql(daily_callnet(csid), con=get_rsr_conn())
-
-    return df
+    if daily_store.ENABLED:
+        return callnet_frame(daily_store.refresh('callnet_counts', csid, get_callnet_counts))
+    return callnet_frame(get_callnet_counts(csid))
 
 #Begin Market Network comparison
 def market_net(csid):
-    return f"""
-        SELECT * FROM dq.best_net_comp({csid})
-        """
+    return _bound("""
+        SELECT * FROM dq.best_net_comp(:csid)
+        """, csid=csid)
 
 
 # execute query for market level network comparisons
+@cached(ttl=600)
+@query_perf.timed
 def get_marketnet(csid):
-    df = pd.read_sql(market_net(csid), con=get_rsr_conn())
+    df = _read_sql(market_net(csid))
 
     return df
 
 
-#setup function for daily differences table
+#setup function for daily differences table (SQL version of the 'daily_diff' rule set)
 def daily_diff(csid):
-    return f"""
+    return _bound("""
  with diff_day as (
-    SELECT ABS (acc_delta) AS acc_dif_ab, ABS(tsk_delta) AS tsk_dif_ab,* FROM dq.fn_dq_kit_diff({csid})
+    SELECT ABS (acc_delta) AS acc_dif_ab, ABS(tsk_delta) AS tsk_dif_ab,* FROM dq.fn_dq_kit_diff(:csid)
     --WHERE carrier <> 'Dish'      -- include Dish in the results for 2025-2H
     )	
 SELECT *
@@ -232,136 +427,284 @@ SELECT *
 	SELECT *
     from diff_day
     WHERE (test_type_id =14 AND tsk_dif_ab > 10000 AND n_grp > 19) OR (test_type_id =14 AND acc_dif_ab > 25 AND n_grp > 19)
-    """
+    """, csid=csid)
 
 
-# Pull Data from Postgres for daily differences
-def get_datadiff(csid):
-    df = pd.read_sql(daily_diff(csid), con=get_rsr_conn())
+# daily differences, unfiltered -- the review filters are applied by the 'daily_diff' rule set
+def daily_diff_all(csid):
+    return _bound("""
+    SELECT ABS (acc_delta) AS acc_dif_ab, ABS(tsk_delta) AS tsk_dif_ab,* FROM dq.fn_dq_kit_diff(:csid)
+    --WHERE carrier <> 'Dish'      -- include Dish in the results for 2025-2H
+    """, csid=csid)
+
+
+@cached(ttl=600)
+@query_perf.timed
+def get_datadiff_all(csid):
+    df = _read_sql(daily_diff_all(csid))
+
+    return df
+
+
+# daily differences matching any rule of the set: one scan of dq.fn_dq_kit_diff with the rule set
+# compiled into a single WHERE predicate, so only candidate rows cross the wire (no UNION sort/dedupe);
+# with since_day only the days from since_day on
+def daily_diff_flagged(csid, ruleset, since_day=None):
+    where, params = ruleset.to_sql()
+    if since_day is not None:
+        where, params = f"({where})\n    AND loc_day >= :since_day", dict(params, since_day=since_day)
+    return _bound(f"""
+    SELECT * FROM (
+        SELECT ABS (acc_delta) AS acc_dif_ab, ABS(tsk_delta) AS tsk_dif_ab,* FROM dq.fn_dq_kit_diff(:csid)
+    ) diff_day
+    WHERE {where}
+    """, csid=csid, **params)
+
+
+# keyed on the rule set too, so a threshold change fetches with the new predicate
+@cached(ttl=600)
+@query_perf.timed
+def get_datadiff_candidates(csid, ruleset):
+    df = _read_sql(daily_diff_flagged(csid, ruleset))
 
     return df
 
 
+# kit-diff rows of the days from since_day on (incremental refresh; None = every day)
+@query_perf.timed
+def get_datadiff_since(csid, since_day=None):
+    if since_day is None:
+        return _read_sql(daily_diff_all(csid))
+    return _read_sql(_bound("""
+    SELECT ABS (acc_delta) AS acc_dif_ab, ABS(tsk_delta) AS tsk_dif_ab,* FROM dq.fn_dq_kit_diff(:csid)
+    WHERE loc_day >= :since_day
+    """, csid=csid, since_day=since_day))
+
+
+# candidate kit-diff rows of the days from since_day on (incremental refresh with the rule set pushed down)
+@query_perf.timed
+def get_datadiff_candidates_since(csid, since_day, ruleset):
+    return _read_sql(daily_diff_flagged(csid, ruleset, since_day))
+
+
+# kit-diff rows refreshed incrementally: earlier days come from the daily store.  With a rule set
+# only its candidate rows are fetched and stored, under a name tied to the compiled predicate
+# (a threshold change starts a new store instead of reusing rows filtered by the old rules)
+@cached(ttl=600)
+def get_datadiff_daily(csid, ruleset=None):
+    if ruleset is None:
+        return daily_store.refresh('kit_diff', csid, get_datadiff_since)
+    digest = hashlib.sha1(repr(ruleset.to_sql()).encode()).hexdigest()[:12]
+    return daily_store.refresh(f'kit_diff_{digest}', csid,
+                               lambda c, since: get_datadiff_candidates_since(c, since, ruleset))
+
+
+DATADIFF_PUSHDOWN = os.getenv("RSR_DATADIFF_PUSHDOWN", "1") != "0"
+
+# Pull Data from Postgres for daily differences -- single pass, filtered by the 'daily_diff' rule set
+# pushed down to the server (RSR_DATADIFF_PUSHDOWN=0: everything is fetched and masked in pandas),
+# incremental by default (see daily_store)
+def get_datadiff(csid):
+    ruleset = get_ruleset('daily_diff')
+    if daily_store.ENABLED:
+        return ruleset.apply(get_datadiff_daily(csid, ruleset if DATADIFF_PUSHDOWN else None))
+    if DATADIFF_PUSHDOWN:
+        return ruleset.apply(get_datadiff_candidates(csid, ruleset))
+    return ruleset.apply(get_datadiff_all(csid))
+
+
 def auto_check(csid):
-    return f"SELECT * FROM dq.fn_auto_check({csid});"
+    return _bound("SELECT * FROM dq.fn_auto_check(:csid);", csid=csid)
 
 
 
 
 # execute query for dq check info
+@cached(ttl=600)
+@query_perf.timed
 def get_auto_check(csid):
-    df = pd.read_sql(auto_check(csid), con=get_rsr_conn())
+    df = _read_sql(auto_check(csid))
 
     return df
 
 # BEGIN pull for dq check info 
 
 def dq_check(csid):
-    return f"SELECT * FROM analytic.fn_dq_check({csid});"
+    return _bound("SELECT * FROM analytic.fn_dq_check(:csid);", csid=csid)
     #return f"SELECT * FROM analytic.fn_dq_check({csid});"
 
 
 
 # execute query for dq check info
+@cached(ttl=600)
+@query_perf.timed
 def get_dqcheck(csid):
-    df = pd.read_sql(dq_check(csid), con=get_rsr_conn())
+    df = _read_sql(dq_check(csid))
 
     return df
 
 
 
-# Pull Sort of MAD data
-def dq_sort_of_mad(csid,comp_csid):
-    return f"SELECT * FROM dq.fn_sort_of_mad({csid}) UNION SELECT * FROM dq.fn_sort_of_mad(({comp_csid}));"
+# Sort of MAD data for a single csid
+def dq_sort_of_mad_one(csid):
+    return _bound("SELECT * FROM dq.fn_sort_of_mad(:csid);", csid=csid)
+
+
+@query_perf.timed
+def get_sort_of_mad(csid):
+    return _read_sql(dq_sort_of_mad_one(csid))
 
 
 # Pull Sort of MAD data
 #def dq_sort_of_mad(csid):
 #	return f"SELECT * FROM dq.fn_sort_of_mad((SELECT fn_get_previous_csid FROM analytic.fn_get_previous_csid({csid})));"
 
+# current csid live; the comparison csid is closed, so it comes from the Parquet snapshot store
+# (the UNION of the two halves is kept: duplicate rows collapse)
+@cached(ttl=1800)
 def get_MADish(csid,comp_csid):
-    df = pd.read_sql(dq_sort_of_mad(csid,comp_csid), con=get_rsr_conn())
+    df_curr = get_sort_of_mad(csid)
+    df_comp = snapshot_store.closed_csid_result('sort_of_mad', comp_csid, get_sort_of_mad)
+    df = pd.concat([df_curr, df_comp], ignore_index=True).drop_duplicates(ignore_index=True)
 
     return df
 
 
+# queries whose results are stored per closed csid (warmed by `python snapshot_store.py warm`)
+CLOSED_CSID_QUERIES = {
+    'sort_of_mad': get_sort_of_mad,
+}
+
+
 # Setup function to pull data
 #def dq_excluded(csid):
  #   return f"SELECT * FROM dq.fn_exclusion_review({csid});"
 
 # Alternate function for excluded data
+# dq.fn_exclusion_review is evaluated once: GROUPING SETS tallies both columns in the same pass
+# (the NULL group of each set is dropped, as the old per-column WHERE ... IS NOT NULL did)
 def dq_excluded(csid):
-    return f"""
+    return _bound("""
         SELECT
-    'manual_blacklist_remark' AS exclusion_category,
-    manual_blacklist_remark AS exclusion_detail,
+    CASE WHEN GROUPING(manual_blacklist_remark) = 0 THEN 'manual_blacklist_remark'
+         ELSE 'auto_bl_reason' END AS exclusion_category,
+    COALESCE(manual_blacklist_remark, auto_bl_reason) AS exclusion_detail,
     COUNT(*) AS row_count
 FROM
-     dq.fn_exclusion_review({csid})
-WHERE
-    manual_blacklist_remark IS NOT NULL
-GROUP BY
-    manual_blacklist_remark
-
-UNION ALL
-
-SELECT
-    'auto_bl_reason' AS exclusion_category,
-    auto_bl_reason AS exclusion_detail,
-    COUNT(*) AS row_count
-FROM
-     dq.fn_exclusion_review({csid})
-WHERE
-    auto_bl_reason IS NOT NULL
-GROUP BY
-    auto_bl_reason
+     dq.fn_exclusion_review(:csid)
+GROUP BY GROUPING SETS ((manual_blacklist_remark), (auto_bl_reason))
+HAVING
+    (GROUPING(manual_blacklist_remark) = 0 AND manual_blacklist_remark IS NOT NULL)
+    OR (GROUPING(auto_bl_reason) = 0 AND auto_bl_reason IS NOT NULL)
 ORDER BY exclusion_category, row_count DESC;
-    """
+    """, csid=csid)
 
 
 # execute Query to pull exclusion table from postgres
+@cached(ttl=600)
+@query_perf.timed
 def get_excluded(csid):
-    df = pd.read_sql(dq_excluded(csid), con=get_rsr_conn())
+    df = _read_sql(dq_excluded(csid))
 
     return df
 
 
+EXCLUSION_CATEGORIES = ['auto_bl_reason', 'manual_blacklist_remark']
+
+# excluded rows themselves, for the drill-down view
+def dq_excluded_rows(csid):
+    return _bound("""
+        SELECT * FROM dq.fn_exclusion_review(:csid)
+        WHERE manual_blacklist_remark IS NOT NULL OR auto_bl_reason IS NOT NULL;
+    """, csid=csid)
+
+
+# drill-down mode: the excluded rows are fetched once and kept in the result cache;
+# tallies and per-category rows are then computed from them without another query
+@cached(ttl=600)
+@query_perf.timed
+def get_excluded_rows(csid):
+    return _read_sql(dq_excluded_rows(csid), stream=True, arrow=True)
+
+
+# same tallies as dq_excluded, from the fetched rows
+def exclusion_tallies(rows):
+    parts = []
+    for category in EXCLUSION_CATEGORIES:
+        counts = rows[category].value_counts(sort=False)
+        counts = counts[counts > 0]    # unused categories of a categorical column
+        parts.append(pd.DataFrame({'exclusion_category': category,
+                                   'exclusion_detail': counts.index.astype(object),
+                                   'row_count': counts.values}))
+    df = pd.concat(parts, ignore_index=True)
+    return df.sort_values(['exclusion_category', 'row_count'], ascending=[True, False], kind='stable').reset_index(drop=True)
+
+
+def exclusion_rows(rows, category, detail):
+    return rows[rows[category] == detail]
+
+
 #setup function to pull agorithm data
 def dq_dev_algo(csid):
-    return f"SELECT * FROM dq.fn_dev_algo_fails({csid});"
+    return _bound("SELECT * FROM dq.fn_dev_algo_fails(:csid);", csid=csid)
 
 
 #2. execute query to pull dev_algo data from postgres
+@cached(ttl=600)
+@query_perf.timed
 def get_algo(csid):
-    df = pd.read_sql(dq_dev_algo(csid), con=get_rsr_conn())
+    df = _read_sql(dq_dev_algo(csid), stream=True, arrow=True)
 
     return df
 
 
+# dev_algo rows spilled to Parquet for the paged view (a new file per fetch, removed with its PagedResult)
+@cached(ttl=600)
+@query_perf.timed
+def get_algo_pages(csid):
+    return _spill_sql(dq_dev_algo(csid), f"dev_algo_{int(csid)}", arrow=True)
+
+
 #setup function to pull filtered agorithm data
 def dq_filtered_algo(csid):
-    return f"SELECT * FROM dq.fn_natl_filter_algo({csid});"
+    return _bound("SELECT * FROM dq.fn_natl_filter_algo(:csid);", csid=csid)
 
 
 #2. execute query to pull filtered algo data from postgres
+@cached(ttl=600)
+@query_perf.timed
 def get_filtered_algo(csid):
-    df = pd.read_sql(dq_filtered_algo(csid), con=get_rsr_conn())
+    df = _read_sql(dq_filtered_algo(csid))
     return df
 
 
 #setup function to pull layer3 review table
 def dq_layer3_m2m(csid):
-    return f"SELECT * FROM dq.fn_m2m_fail_layer3_py({csid});" # WHERE report_set <> 'Dish';"  -- 2025-2H: include Dish in the results
+    return _bound("SELECT * FROM dq.fn_m2m_fail_layer3_py(:csid);", csid=csid) # WHERE report_set <> 'Dish';"  -- 2025-2H: include Dish in the results
 
 # 2. Execute query to pull layer3 review table from postgres
+@cached(ttl=600)
+@query_perf.timed
 def get_layer3_m2m(csid):
-    df = pd.read_sql(dq_layer3_m2m(csid), con=get_rsr_conn())
+    df = _read_sql(dq_layer3_m2m(csid), stream=True, arrow=True)
 
     return df
 
+
+# layer3 rows spilled to Parquet for the paged view (a new file per fetch, as get_algo_pages)
+@cached(ttl=600)
+@query_perf.timed
+def get_layer3_m2m_pages(csid):
+    return _spill_sql(dq_layer3_m2m(csid), f"layer3_m2m_{int(csid)}", arrow=True)
+
+# csid partition of the test summary, as a quoted identifier (csid must be an integer)
+def partition_table(csid):
+    quote = get_rsr_conn().dialect.identifier_preparer.quote_identifier
+    return f"prod_ms_partitions.{quote(f'test_summary_{int(csid)}')}"
+
 # setup function to pull blocklisting rate
 def dq_bl_test(csid):
-    return f"""
+    return _bound(f"""
         SELECT
                 collection_set_id AS csid
 				,test_type_id
@@ -375,43 +718,318 @@ FROM (
 			 ,test_type_id
 			 , count(*) as total_count
              ,SUM (CASE WHEN blacklisted = 't' THEN 1 ELSE 0 END) AS bl
-        FROM prod_ms_partitions.test_summary_{csid} tsp1
+        FROM {partition_table(csid)} tsp1
         	WHERE period_name IS NOT NULL
 			AND flag_valid IS TRUE
                 GROUP BY collection_set_id,test_type_id
                 ) a
 		ORDER BY test_type_id;
+    """)
+
+# blocklist counts per test type for bl_counts: every row (or only test_id > after_test_id) in
+# one pass, with the rows read and the highest test_id for the watermark
+def bl_counts_query(csid, after_test_id=None):
+    since = "" if after_test_id is None else "WHERE test_id > :after_test_id"
+    sql = f"""
+        SELECT test_type_id
+             , count(*) FILTER (WHERE period_name IS NOT NULL AND flag_valid IS TRUE) AS total_count
+             , count(*) FILTER (WHERE period_name IS NOT NULL AND flag_valid IS TRUE AND blacklisted = 't') AS bl
+             , count(*) AS scanned
+             , max(test_id) AS max_test_id
+        FROM {partition_table(csid)} {since}
+        GROUP BY test_type_id
     """
-
-# execute query to pull blocklisting rate from postgres
+    return _bound(sql) if after_test_id is None else _bound(sql, after_test_id=int(after_test_id))
+
+
+@query_perf.timed
+def get_bl_counts(csid, after_test_id=None):
+    return _read_sql(bl_counts_query(csid, after_test_id))
+
+
+# catalog state of the csid's partition (bl_counts.STATS_COLUMNS); None if there is no such table
+def partition_stats(csid):
+    return partitions_stats([csid]).get(int(csid))
+
+
+# {csid: catalog state} of many partitions (csids without a partition are left out): the
+# catalog/statistics row of every partition in one query, then each one's max(test_id) (an
+# index lookup per partition, in one statement) -- bl_counts.STATS_COLUMNS + PROBE_COLUMNS
+def partitions_stats(csids):
+    csids = [int(c) for c in csids]
+    with _connection() as connection:
+        rows = connection.execute(text("""
+            SELECT p.csid, c.relfilenode, c.relnatts,
+                   COALESCE(s.n_tup_ins, 0), COALESCE(s.n_tup_upd, 0), COALESCE(s.n_tup_del, 0),
+                   pg_is_in_recovery()
+            FROM unnest(CAST(:csids AS integer[]), CAST(:tables AS text[])) AS p(csid, name)
+            JOIN pg_class c ON c.oid = to_regclass(p.name)
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        """), {'csids': csids, 'tables': [partition_table(c) for c in csids]}).all()
+        stats = {int(row[0]): {**dict(zip(bl_counts.STATS_COLUMNS, (int(v) for v in row[1:6]))), 'in_recovery': bool(row[6])}
+                 for row in rows}
+        if stats:
+            probe = "\nUNION ALL ".join(f"SELECT {csid}, (SELECT max(test_id) FROM {partition_table(csid)})" for csid in stats)
+            for csid, top in connection.execute(text(probe)).all():
+                stats[int(csid)]['max_test_id'] = None if top is None else int(top)
+    return stats
+
+
+# dq_bl_test's columns from the per-test-type counts (bl_rate rounded like Postgres ROUND(..., 2))
+def bl_rates(counts, csid):
+    counts = counts[counts['total_count'] > 0]
+    df = pd.DataFrame({'csid': int(csid),
+                       'test_type_id': counts['test_type_id'].astype('Int16'),
+                       'reportable': counts['total_count'] - counts['bl'],
+                       'valid_tests': counts['total_count'],
+                       'blocklists': counts['bl'],
+                       'bl_rate': _pct(counts['bl'], counts['total_count'])})
+    return df.sort_values('test_type_id', kind='stable').reset_index(drop=True)
+
+
+# execute query to pull blocklisting rate: from the local counters (bl_counts), which re-read the
+# partition only when its catalog stats moved -- so the cache TTL can be short
+@cached(ttl=60)
 def get_bl_test(csid):
-    df = pd.read_sql(dq_bl_test(csid), con=get_rsr_conn())
+    if not bl_counts.ENABLED:
+        return _read_sql(dq_bl_test(csid), arrow=True)     # bl_rate as float64, not Decimal
+    counts, _ = bl_counts.refresh(csid, partition_stats(csid), get_bl_counts)
+    return bl_rates(counts, csid)
+
+# NR download counts for several CSIDs in one round trip: one LATERAL call of dq.fn_dq_tool per csid,
+# filtered right at the function scan and grouped on the server, so only
+# (csid, product_period, device_f_name, best_network_type, count) rows come back
+def dl_nr_counts_query(csids):
+    return _bound("""
+    SELECT c.csid, t.product_period, concat_ws ('-',t.friendly_name::text,t.device_id::text) as device_f_name,
+           t.best_network_type, count(*) AS dl_count
+    FROM unnest(CAST(:csids AS integer[])) AS c(csid)
+    CROSS JOIN LATERAL dq.fn_dq_tool(c.csid) t
+    WHERE t.test_type_id = 20 AND t.period_name IS NOT NULL AND t.blocklisted IS FALSE AND t.flag_valid IS TRUE
+    GROUP BY 1, 2, 3, 4
+    """, csids=[int(c) for c in csids])
+
+
+@cached(ttl=600)
+@query_perf.timed
+def get_dl_nr_counts(csids):
+    df = _read_sql(dl_nr_counts_query(csids))
 
     return df
 
-# NR percentage by device
-def get_dl_nr_device(csid):
-    return f"""
-            with base AS (
-			SELECT product_period, concat_ws ('-',friendly_name::text,device_id::text) as device_f_name, best_network_type
-			FROM dq.fn_dq_tool({csid}) WHERE test_type_id =20 AND period_name IS NOT NULL AND blocklisted IS FALSE AND flag_valid IS TRUE
-),
-data_net_cat AS (
-    		select product_period, device_f_name,
-    		case when best_network_type in ('NR SA') then 'NR-5G' 
-    		when best_network_type in ('NR NSA, LTE') then 'Mixed-NR_5G' 
-    		else 'Non-NR' end as sa_status
-			FROM base
-)
-select product_period, device_f_name, sa_status, count(*) as dl_count, 
-round(100 * count(*) / sum(count(*)) over (partition by device_f_name),2) as dl_pct
-from data_net_cat
-group by product_period, device_f_name,sa_status
-order by device_f_name, case when sa_status = 'NR-5G' then 1 when sa_status = 'Mixed-NR_5G' 
-then 2 when sa_status = 'Non-NR' then 3 end
-"""
-
-def dl_nr_percentages(csid):
-    df = pd.read_sql(get_dl_nr_device(csid), con=get_rsr_conn())
-
-    return df
\ No newline at end of file
+
+NR_STATUS = {'NR SA': 'NR-5G', 'NR NSA, LTE': 'Mixed-NR_5G'}    # anything else is 'Non-NR'
+NR_STATUS_ORDER = {'NR-5G': 1, 'Mixed-NR_5G': 2, 'Non-NR': 3}
+
+# long-format NR percentages per csid and device (dl_pct: share of the device's download tests)
+def dl_nr_percentages(csids):
+    if not isinstance(csids, (list, tuple)):
+        csids = [csids]
+    counts = get_dl_nr_counts(tuple(dict.fromkeys(int(c) for c in csids)))
+    counts = counts.assign(sa_status=counts['best_network_type'].map(NR_STATUS).fillna('Non-NR'))
+    df = counts.groupby(['csid', 'product_period', 'device_f_name', 'sa_status'], as_index=False, observed=True)['dl_count'].sum()
+    device_total = df.groupby(['csid', 'device_f_name'], observed=True)['dl_count'].transform('sum')
+    df['dl_pct'] = (100 * df['dl_count'] / device_total).round(2)
+    df = df.assign(_order=df['sa_status'].map(NR_STATUS_ORDER))
+    return df.sort_values(['csid', 'device_f_name', '_order'], kind='stable').drop(columns='_order').reset_index(drop=True)
+
+
+# Fleet view
+# One statement per checkpoint for a whole list of markets: the dq.fn_* function is called once
+# per csid inside the server (LATERAL over the csid array) and the rows come back stacked, the
+# market they were computed for in `csid` (replacing any csid column the function returns).
+FLEET_FUNCTIONS = {
+    'dev_algo': 'dq.fn_dev_algo_fails',
+    'filtered_algo': 'dq.fn_natl_filter_algo',
+    'layer3': 'dq.fn_m2m_fail_layer3_py',
+    'auto_check': 'dq.fn_auto_check',
+    'dqcheck': 'analytic.fn_dq_check',
+}
+FLEET_ARROW = ('dev_algo', 'layer3')     # the wide ones, fetched through COPY like get_algo / get_layer3_m2m
+
+
+def _fleet_frame(df):
+    csid = df.pop('fleet_csid')
+    df = df.drop(columns='csid', errors='ignore')
+    df.insert(0, 'csid', csid)
+    return df
+
+
+def fleet_query(function, csids):
+    return _bound(f"""
+    SELECT c.csid AS fleet_csid, f.*
+    FROM unnest(CAST(:csids AS integer[])) AS c(csid)
+    CROSS JOIN LATERAL {function}(c.csid) f
+    """, csids=[int(c) for c in csids])
+
+
+# csids: a tuple, first so the perf log and query_cache.invalidate_csid see the markets
+@cached(ttl=600)
+@query_perf.timed
+def get_fleet_checkpoint(csids, name):
+    df = _read_sql(fleet_query(FLEET_FUNCTIONS[name], csids), stream=name in FLEET_ARROW, arrow=name in FLEET_ARROW)
+    return _fleet_frame(df)
+
+
+# dq.fn_eom_pl_comp_b per market and its comparison market (csids[i] against comp_csids[i])
+def fleet_eom_query(csids, comp_csids):
+    return _bound("""
+    SELECT c.csid AS fleet_csid, f.*
+    FROM unnest(CAST(:csids AS integer[]), CAST(:comp_csids AS integer[])) AS c(csid, comp_csid)
+    CROSS JOIN LATERAL dq.fn_eom_pl_comp_b(c.csid, c.comp_csid) f
+    """, csids=[int(c) for c in csids], comp_csids=[int(c) for c in comp_csids])
+
+
+@cached(ttl=1800)
+@query_perf.timed
+def get_fleet_eom(csids, comp_csids):
+    df = _read_sql(fleet_eom_query(csids, comp_csids), stream=True, columns=['fleet_csid'] + EOM_COLUMNS, arrow=True)
+    return _fleet_frame(df)
+
+
+# kit-diff rows of every market matching the rule set (as daily_diff_flagged, pushed down)
+def fleet_datadiff_query(csids, ruleset):
+    where, params = ruleset.to_sql()
+    return _bound(f"""
+    SELECT * FROM (
+        SELECT c.csid AS fleet_csid, ABS (d.acc_delta) AS acc_dif_ab, ABS(d.tsk_delta) AS tsk_dif_ab, d.*
+        FROM unnest(CAST(:csids AS integer[])) AS c(csid)
+        CROSS JOIN LATERAL dq.fn_dq_kit_diff(c.csid) d
+    ) diff_day
+    WHERE {where}
+    """, csids=[int(c) for c in csids], **params)
+
+
+@cached(ttl=600)
+@query_perf.timed
+def get_fleet_datadiff(csids):
+    ruleset = get_ruleset('daily_diff')
+    return ruleset.apply(_fleet_frame(_read_sql(fleet_datadiff_query(csids, ruleset))))
+
+
+# dq_bl_test rows of every market: the catalog state of all partitions in one query, then the
+# bl_counts counters per market (no scan for partitions unchanged since their last refresh)
+@cached(ttl=60)
+def get_fleet_bl_test(csids):
+    if not bl_counts.ENABLED:
+        return pd.concat([get_bl_test(csid) for csid in csids], ignore_index=True)
+    stats = partitions_stats(csids)
+    frames = [bl_rates(bl_counts.refresh(csid, stats[csid], get_bl_counts)[0], csid) for csid in csids if csid in stats]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['csid', 'bl_rate'])
+
+
+# Checkpoint scheduler
+# The review checkpoints don't depend on each other, so they are started together
+# on the shared pool and handed back as each one finishes.  Every job gets its own
+# timeout: the server cancels the statement (statement_timeout) and the scheduler
+# stops waiting on it, so one slow dq.fn_* call can't hold up the rest of the page.
+# The timeout runs from when a pool thread picks the job up, not while it is queued.
+CHECKPOINT_TIMEOUT = float(os.getenv("RSR_CHECKPOINT_TIMEOUT", 300))
+CHECKPOINT_WORKERS = int(os.getenv("RSR_CHECKPOINT_WORKERS", 10))
+
+_checkpoint_pool = ThreadPoolExecutor(max_workers=CHECKPOINT_WORKERS, thread_name_prefix="rdaq-checkpoint")
+
+
+@dataclass
+class CheckpointResult:
+    name: str
+    status: str          # 'ok', 'error' or 'timeout'
+    df: pd.DataFrame = None
+    error: str = None
+    elapsed: float = 0.0
+
+
+def _run_job(func, args, timeout, explain, clock):
+    clock['started'] = time.monotonic()
+    _query_local.timeout = timeout
+    _query_local.explain = explain
+    try:
+        return func(*args)
+    finally:
+        _query_local.timeout = None
+        _query_local.explain = False
+
+
+# start one checkpoint on the pool without waiting for it (prefetch); hand the future
+# to run_checkpoints(running=...) later instead of querying again.  future.clock gets the
+# time the job left the pool queue ('started'), which its timeout is counted from.
+def submit_checkpoint(func, args, timeout=CHECKPOINT_TIMEOUT, explain=False):
+    clock = {}
+    future = _checkpoint_pool.submit(_run_job, func, args, timeout, explain, clock)
+    future.clock = clock
+    return future
+
+
+QUEUE_POLL_S = 0.5     # how often jobs still waiting for a pool thread are checked for having started
+
+
+# when the job times out: `timeout` after it started running (None while it waits for a thread)
+def _deadline(future, timeout):
+    started = future.clock.get('started')
+    return None if started is None else started + timeout
+
+
+# jobs: {name: (func, args)} or {name: (func, args, timeout_seconds)}
+# running: {name: future} of jobs already started by submit_checkpoint
+# yields a CheckpointResult per job in completion order; explain=True adds server timings to the perf log
+def run_checkpoints(jobs, timeout=CHECKPOINT_TIMEOUT, explain=False, running=None):
+    started = time.monotonic()
+    futures = {}
+    timeouts = {}
+    for name, job in jobs.items():
+        func, args = job[0], job[1]
+        job_timeout = job[2] if len(job) > 2 else timeout
+        future = (running or {}).get(name)
+        if future is None:
+            future = submit_checkpoint(func, args, job_timeout, explain)
+        futures[future] = name
+        timeouts[name] = job_timeout
+
+    # time waiting for a pool thread doesn't count against a job's timeout
+    def deadline(future):
+        return _deadline(future, timeouts[futures[future]])
+
+    pending = set(futures)
+    while pending:
+        deadlines = [deadline(f) for f in pending]
+        next_deadline = min([d for d in deadlines if d is not None], default=None)
+        wait_s = QUEUE_POLL_S if next_deadline is None else max(0, next_deadline - time.monotonic())
+        if None in deadlines:
+            wait_s = min(wait_s, QUEUE_POLL_S)
+        done, pending = wait(pending, timeout=wait_s, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for future in done:
+            name = futures[future]
+            try:
+                yield CheckpointResult(name, 'ok', df=future.result(), elapsed=now - started)
+            except Exception as e:
+                yield CheckpointResult(name, 'error', error=str(e), elapsed=now - started)
+        for future in [f for f in pending if deadline(f) is not None and deadline(f) <= now]:
+            pending.discard(future)
+            name = futures[future]
+            ran = now - future.clock['started']
+            yield CheckpointResult(name, 'timeout', error=f"no result after {ran:.1f}s", elapsed=now - started)
+
+
+# Every checkpoint of a full review as scheduler jobs (complete frames; used by the headless
+# batch run).  Checkpoints that need the comparison market are skipped without a comp_csid.
+def checkpoint_jobs(csid, comp_csid=None):
+    jobs = {
+        'market_net': (get_marketnet, (csid,)),
+        'callnet': (get_callnet, (csid,)),
+        'datadiff': (get_datadiff, (csid,)),
+        'dev_algo': (get_algo, (csid,)),
+        'filtered_algo': (get_filtered_algo, (csid,)),
+        'layer3': (get_layer3_m2m, (csid,)),
+        'auto_check': (get_auto_check, (csid,)),
+        'dqcheck': (get_dqcheck, (csid,)),
+        'bl_test': (get_bl_test, (csid,)),
+        'excluded': (get_excluded, (csid,)),
+    }
+    if comp_csid is not None:
+        jobs['eom_full'] = (get_eom_full, (csid, comp_csid))
+        jobs['madish'] = (get_MADish, (csid, comp_csid))
+        jobs['nr'] = (dl_nr_percentages, ([csid, comp_csid],))
+    else:
+        jobs['nr'] = (dl_nr_percentages, ([csid],))
+    return jobs
@@ -0,0 +1,92 @@
+# Figures for the MAD-type section (checkpoint 1c).
+#
+# The half-year period comes straight from the collection_set suffix (any "YYYY-1H" /
+# "YYYY-2H", vectorized) and every figure is built from the one frame: the speed panels
+# take their slices from a single groupby over (test_type_id, period) instead of
+# re-filtering the frame per test type and period.  Past WEBGL_ROWS points the traces
+# are WebGL (Scattergl) -- SVG scatter gets slow to build and draw on national markets.
+
+import plotly.express as px
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+
+WEBGL_ROWS = 1000      # same switch-over point plotly express uses for render_mode='auto'
+
+PERIOD_PATTERN = r'(\d{4}-[12]H)\s*$'
+
+# (test_type_id, value column, subplot row, subplot col, trace suffix)
+SPEED_PANELS = [
+    (19, 'ul_speed_50p', 1, 1, 'Test 19'),
+    (20, 'dl_speed_50p', 1, 2, 'Test 20'),
+    (26, 'ldrs_access_sp_95p', 2, 1, 'Test 26 Access'),
+    (26, 'ldrs_task_sp_95p', 2, 2, 'Test 26 Task'),
+]
+SPEED_TITLES = ('Upload Speed (Test 19)', 'Download Speed (Test 20)',
+                'LDRs Access Speed 95p (Test 26)', 'LDRs Task Speed 95p (Test 26)')
+
+
+# '2025-2H' etc. from the end of collection_set; 'Other' when there is no half-year suffix
+def add_period(df):
+    period = df['collection_set'].astype(str).str.extract(PERIOD_PATTERN, expand=False)
+    return df.assign(period=period.fillna('Other'))
+
+
+# newest half-year as circles, the one before it as triangles (the current and comparison markets)
+def period_markers(periods):
+    halves = sorted((p for p in set(periods) if p != 'Other'), reverse=True)[:2]
+    shapes = [dict(symbol='circle', size=12), dict(symbol='triangle-up', size=8)]
+    return dict(zip(halves, shapes))
+
+
+def _scatter_class(n_rows):
+    return go.Scattergl if n_rows > WEBGL_ROWS else go.Scatter
+
+
+def metric_figure(df, column, title, label):
+    fig = px.scatter(df,
+                     x='carrier',
+                     y=column,
+                     color='period',
+                     facet_col='test_type_id',
+                     symbol='period',
+                     title=title,
+                     labels={column: label, 'carrier': 'Carrier'},
+                     height=600,
+                     hover_data=['loc_day', 'n_grp'],
+                     category_orders={'period': sorted(df['period'].unique(), reverse=True)},
+                     render_mode='webgl' if len(df) > WEBGL_ROWS else 'svg')
+    fig.update_layout(showlegend=True)
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def speed_figure(df):
+    markers = period_markers(df['period'])
+    fig = make_subplots(rows=2, cols=2, subplot_titles=SPEED_TITLES)
+    scatter = _scatter_class(len(df))
+    panels = {}
+    for test_type_id, column, row, col, suffix in SPEED_PANELS:
+        panels.setdefault(test_type_id, []).append((column, row, col, suffix))
+
+    subset = df[df['period'].isin(list(markers)) & df['test_type_id'].isin(list(panels))]
+    for (test_type_id, period), part in subset.groupby(['test_type_id', 'period'], sort=True, observed=True):
+        for column, row, col, suffix in panels[int(test_type_id)]:
+            fig.add_trace(
+                scatter(x=part['carrier'], y=part[column], mode='markers',
+                        name=f'Period {period} - {suffix}', marker=markers[period],
+                        showlegend=True, hovertext=part['loc_day']),
+                row=row, col=col)
+
+    fig.update_layout(height=800, width=1000, title_text="Speed Metrics by Test Type")
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+# the three checkpoint 1c figures, in page order
+def madish_figures(df):
+    df = add_period(df)
+    return [
+        metric_figure(df, 'acc', 'Access Values by Test Type and Carrier', 'access Value'),
+        metric_figure(df, 'task', 'Task Values by Test Type and Carrier', 'Task Value'),
+        speed_figure(df),
+    ]
@@ -0,0 +1,151 @@
+# Background precompute worker: keeps the review bundles of the active CSIDs fresh.
+#
+#   python precompute_worker.py [--at 05:00,12:00] [--csids 12610,12620-12625] [--poll 30]
+#   python precompute_worker.py --once                   (one pass, e.g. from cron)
+#
+# Runs as its own process next to the Streamlit app.  At each --at time it runs every
+# heavy_lifts checkpoint for the active CSIDs -- --csids / --csids-file, or by default
+# every CSID that already has a bundle -- and writes a new bundle run (see
+# review_bundle), so the first reviewer of the day opens results instead of waiting on
+# dq.fn_dev_algo_fails, dq.fn_m2m_fail_layer3_py and friends.  Between runs it polls
+# the queue every --poll seconds: the app's "Recompute now" drops a request file in
+# <RSR_BUNDLE_DIR>/queue and returns at once.  worker.json in the bundle directory is
+# the heartbeat the app shows (last seen, CSIDs being computed, next scheduled run).
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import review_bundle
+
+
+def _queue_dir(base_dir=None):
+    return os.path.join(base_dir or review_bundle.BUNDLE_DIR, "queue")
+
+
+def _heartbeat_file(base_dir=None):
+    return os.path.join(base_dir or review_bundle.BUNDLE_DIR, "worker.json")
+
+
+# ask the worker to recompute a CSID; returns immediately (a repeated request is one job)
+def request_recompute(csid, base_dir=None):
+    queue = _queue_dir(base_dir)
+    os.makedirs(queue, exist_ok=True)
+    tmp = os.path.join(queue, f"{int(csid)}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({'csid': int(csid), 'requested': time.time()}, f)
+    os.replace(tmp, os.path.join(queue, f"{int(csid)}.json"))
+
+
+def queued(base_dir=None):
+    queue = _queue_dir(base_dir)
+    if not os.path.isdir(queue):
+        return []
+    return sorted(int(name[:-5]) for name in os.listdir(queue) if name.endswith(".json") and name[:-5].isdigit())
+
+
+# the queued CSIDs, removed from the queue (requests arriving meanwhile stay for the next poll)
+def take_requests(base_dir=None):
+    taken = []
+    for csid in queued(base_dir):
+        try:
+            os.remove(os.path.join(_queue_dir(base_dir), f"{csid}.json"))
+            taken.append(csid)
+        except FileNotFoundError:
+            pass
+    return taken
+
+
+def write_heartbeat(running=(), next_run=None, base_dir=None):
+    file = _heartbeat_file(base_dir)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file + ".tmp", "w") as f:
+        json.dump({'pid': os.getpid(), 'seen': time.time(), 'running': sorted(running), 'next_run': next_run}, f)
+    os.replace(file + ".tmp", file)
+
+
+def read_heartbeat(base_dir=None):
+    try:
+        with open(_heartbeat_file(base_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# next time (epoch seconds) one of the daily 'HH:MM' times comes round after `now`
+def next_run_at(times, now=None):
+    now = datetime.datetime.fromtimestamp(time.time() if now is None else now)
+    candidates = []
+    for value in times:
+        hour, minute = (int(p) for p in value.split(":"))
+        at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        candidates.append(at if at > now else at + datetime.timedelta(days=1))
+    return min(candidates).timestamp()
+
+
+def active_csids(csids=None, base_dir=None):
+    if csids:
+        return list(csids)
+    return sorted(s['csid'] for s in review_bundle.list_summaries(base_dir))
+
+
+def run_pass(csids, args, next_run=None):
+    if not csids:
+        return []
+    write_heartbeat(csids, next_run, args.out)
+    try:
+        return review_bundle.run_batch(csids, workers=args.workers, base_dir=args.out, timeout=args.timeout)
+    finally:
+        write_heartbeat((), next_run, args.out)
+
+
+def build_parser():
+    from rdaq_review import parse_csids
+    parser = argparse.ArgumentParser(description="Precompute review bundles on a schedule and on request")
+    parser.add_argument("--csids", type=parse_csids, default=None, help="active CSIDs or ranges (default: every bundled CSID)")
+    parser.add_argument("--csids-file", help="file with the active CSIDs (comma- or newline-separated)")
+    parser.add_argument("--at", default="05:00", help="comma-separated daily run times, HH:MM local (default 05:00)")
+    parser.add_argument("--poll", type=float, default=30, help="seconds between queue checks (default 30)")
+    parser.add_argument("--once", action="store_true", help="run the active CSIDs and the queue once, then exit")
+    parser.add_argument("--workers", type=int, default=4, help="CSIDs computed at once (default 4)")
+    parser.add_argument("--timeout", type=float, default=None, help="per-checkpoint timeout in seconds")
+    parser.add_argument("--out", default=None, help="bundle directory (default RSR_BUNDLE_DIR)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    csids = list(args.csids or [])
+    if args.csids_file:
+        from rdaq_review import parse_csids
+        with open(args.csids_file) as f:
+            csids += parse_csids(f.read())
+    times = [t.strip() for t in args.at.split(",") if t.strip()]
+
+    if args.once:
+        todo = list(dict.fromkeys(take_requests(args.out) + active_csids(csids, args.out)))
+        summaries = run_pass(todo, args)
+        return 0 if len(summaries) == len(todo) else 1
+
+    next_run = next_run_at(times)
+    print(f"precompute worker {os.getpid()}: next run {time.strftime('%Y-%m-%d %H:%M', time.localtime(next_run))}")
+    while True:
+        requested = take_requests(args.out)
+        if requested:
+            print(f"recompute requested: {', '.join(map(str, requested))}")
+            run_pass(requested, args, next_run)
+        if time.time() >= next_run:
+            next_run = next_run_at(times)
+            run_pass(active_csids(csids, args.out), args, next_run)
+        write_heartbeat((), next_run, args.out)
+        time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
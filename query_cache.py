@@ -0,0 +1,134 @@
+# In-process result cache for the heavy_lifts queries.
+#
+# Results are keyed by (function name, csid, comp_csid, ...) and shared by every
+# Streamlit session in the worker, so reopening a CSID or clicking a widget does
+# not re-run the query.  Entries expire after a per-query TTL and the cache is
+# LRU-bounded by the memory of the cached frames.
+#
+#   RSR_CACHE_TTL       default TTL in seconds (default 900)
+#   RSR_CACHE_MAX_MB    memory bound for cached frames (default 512)
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_TTL = float(os.getenv("RSR_CACHE_TTL", 900))
+MAX_BYTES = int(float(os.getenv("RSR_CACHE_MAX_MB", 512)) * 1024 * 1024)
+
+
+def _frame_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class ResultCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()    # key -> (expires_at, nbytes, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.by_function = {}            # function name -> {'hits': n, 'misses': n}
+
+    def _count(self, func_name, field):
+        counts = self.by_function.setdefault(func_name, {'hits': 0, 'misses': 0})
+        counts[field] += 1
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self._count(key[0], 'misses')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count(key[0], 'hits')
+            return entry[2]
+
+    def put(self, key, value, ttl=DEFAULT_TTL):
+        nbytes = _frame_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + ttl, nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    # remove every entry whose csid (first key argument, or one of a batch of csids) matches; returns the count
+    def invalidate_csid(self, csid):
+        with self._lock:
+            keys = [k for k in self._entries
+                    if len(k) > 1 and (k[1] == csid or (isinstance(k[1], tuple) and csid in k[1]))]
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'mb': round(self._bytes / 1024 / 1024, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'by_function': {k: dict(v) for k, v in self.by_function.items()},
+            }
+
+
+# process-wide cache shared by all sessions
+result_cache = ResultCache()
+
+
+# memoize a heavy_lifts query by (function, csid, comp_csid, ...) with its own TTL
+def cached(ttl=DEFAULT_TTL):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (func.__name__,) + tuple(args)
+            value = result_cache.get(key)
+            if value is None:
+                value = func(*args)
+                result_cache.put(key, value, ttl)
+            # shallow copy so callers adding columns don't alter the cached frame
+            if isinstance(value, pd.DataFrame):
+                return value.copy(deep=False)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate_csid(csid):
+    return result_cache.invalidate_csid(csid)
+
+
+def cache_stats():
+    return result_cache.stats()
@@ -0,0 +1,165 @@
+# Query timing instrumentation.
+#
+# @timed wraps every heavy_lifts function that goes to the database and records one
+# entry per fetch: wall time, row count, estimated bytes fetched and DataFrame memory.
+# When EXPLAIN is requested for a run (sidebar toggle / run_checkpoints(explain=True))
+# the statement is also run under EXPLAIN (ANALYZE, BUFFERS) first, adding the server
+# execution/planning time and shared-buffer hits/reads.
+#
+# Entries are kept in memory for the sidebar "Performance" panel and appended to a
+# JSONL log (RSR_PERF_LOG) so slow dq.fn_* functions can be compared across days:
+#   python query_perf.py report [--days 14]
+
+import argparse
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+PERF_LOG = os.getenv("RSR_PERF_LOG", os.path.join(".rdaq_data", "perf_log.jsonl"))
+
+_local = threading.local()
+_recent = collections.deque(maxlen=500)
+_log_lock = threading.Lock()
+
+
+# rows / memory / estimated wire size of a result (a DataFrame or a spilled PagedResult)
+def result_stats(result):
+    if isinstance(result, pd.DataFrame):
+        n_bytes = 0
+        for col in result.columns:
+            values = result[col]
+            if values.dtype.kind in 'biufcmM':
+                n_bytes += values.dtype.itemsize * int(values.notna().sum())
+            else:
+                n_bytes += int(values.dropna().astype(str).str.len().sum())
+        return {'rows': len(result), 'bytes_est': n_bytes,
+                'df_mb': round(result.memory_usage(deep=True).sum() / 1024 / 1024, 2)}
+    if hasattr(result, 'path') and hasattr(result, 'n_rows'):
+        size = os.path.getsize(result.path) if os.path.exists(result.path) else 0
+        return {'rows': result.n_rows, 'bytes_est': size, 'df_mb': 0.0}
+    return {}
+
+
+def _write(record):
+    _recent.append(record)
+    try:
+        os.makedirs(os.path.dirname(PERF_LOG) or ".", exist_ok=True)
+        with _log_lock, open(PERF_LOG, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+        pass    # instrumentation must never break a review
+
+
+# first argument is the csid, or a batch of csids
+def _csid_of(args):
+    if not args:
+        return None
+    return list(args[0]) if isinstance(args[0], (tuple, list)) else args[0]
+
+
+def timed(func):
+    @functools.wraps(func)
+    def wrapper(*args):
+        record = {'ts': time.time(), 'query': func.__name__, 'csid': _csid_of(args),
+                  'args': [a for a in args[1:] if isinstance(a, (int, float, str))], 'status': 'ok'}
+        previous, _local.record = getattr(_local, 'record', None), record
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+            record.update(result_stats(result))
+            return result
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)[:500]
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - start, 3)
+            _local.record = previous
+            _write(record)
+    return wrapper
+
+
+# EXPLAIN (ANALYZE, BUFFERS) of the statement about to run, attached to the current record
+def explain(connection, stmt, wrap_statement):
+    record = getattr(_local, 'record', None)
+    try:
+        plan = connection.execute(wrap_statement(stmt, "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {}")).scalar_one()
+    except Exception as e:
+        if record is not None:
+            record['explain_error'] = str(e)[:200]
+        return
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]
+    stats = {'server_ms': top.get('Execution Time'), 'planning_ms': top.get('Planning Time'),
+             'shared_hit': top['Plan'].get('Shared Hit Blocks'), 'shared_read': top['Plan'].get('Shared Read Blocks')}
+    if record is not None:
+        record.update(stats)
+    return stats
+
+
+def recent(csid=None):
+    rows = [r for r in _recent if csid is None or r.get('csid') == csid or (isinstance(r.get('csid'), list) and csid in r['csid'])]
+    return pd.DataFrame(rows)
+
+
+def load_log(days=None):
+    if not os.path.exists(PERF_LOG):
+        return pd.DataFrame()
+    df = pd.read_json(PERF_LOG, lines=True)
+    if days is not None and len(df):
+        df = df[df['ts'] >= time.time() - days * 86400]
+    return df
+
+
+# per query and day: runs, median/p95 wall time, median server time and rows
+def daily_report(df):
+    if df.empty:
+        return df
+    df = df[df['status'] == 'ok'].assign(day=pd.to_datetime(df['ts'], unit='s').dt.strftime('%Y-%m-%d'))
+    agg = {'runs': ('wall_s', 'size'), 'wall_median': ('wall_s', 'median'),
+           'wall_p95': ('wall_s', lambda s: s.quantile(0.95)), 'rows_median': ('rows', 'median')}
+    if 'server_ms' in df.columns:
+        agg['server_ms_median'] = ('server_ms', 'median')
+    return df.groupby(['query', 'day']).agg(**agg).round(3).reset_index()
+
+
+# latest day against the median of the days before it, slowest ratio first
+def regressions(report, factor=1.5):
+    if report.empty:
+        return report
+    latest = report['day'].max()
+    today = report[report['day'] == latest].set_index('query')
+    before = report[report['day'] < latest].groupby('query')['wall_median'].median()
+    out = today[['wall_median']].join(before.rename('baseline'), how='inner')
+    out['ratio'] = (out['wall_median'] / out['baseline']).round(2)
+    return out[out['ratio'] >= factor].sort_values('ratio', ascending=False).reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query timing log report")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="per-query daily timings and regressions")
+    report.add_argument("--days", type=int, default=14)
+    report.add_argument("--factor", type=float, default=1.5, help="flag queries this much slower than their baseline")
+    args = parser.parse_args(argv)
+
+    table = daily_report(load_log(args.days))
+    if table.empty:
+        print(f"no entries in {PERF_LOG}")
+        return
+    print(table.to_string(index=False))
+    slow = regressions(table, args.factor)
+    print()
+    print("regressions:" if not slow.empty else "no regressions")
+    if not slow.empty:
+        print(slow.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
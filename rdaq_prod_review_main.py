@@ -14,31 +14,17 @@
 #           2. Added a filtered alogorithm pull to test along with the original algorithm version. 
 #                      This verison should remove most of the consecutive failures that are valid and due to rural areas in nationals.
 
-import pandas as pd
 import os
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
 import streamlit as st
 from dotenv import load_dotenv
-import plotly.express as px
-import plotly.graph_objs as go
 #from root_metadata import carrier_color_dict
-from plotly.subplots import make_subplots
 import time
-import plotly.io as pio
-import heavy_lifts   #offshore bulky queries
-pio.templates.default = 'plotly'
+# Everything heavier (pandas, sqlalchemy, pyarrow via heavy_lifts; plotly for the charts) is
+# imported where it is first needed, after Submit -- the first paint only needs streamlit.
+# (benchmarks/bench_startup.py times the cold start and a rerun.)
 
 load_dotenv()
 
-# credentials and string for db connection
-def get_rsr_conn():
-    host_str = os.getenv("RSR_CONN")
-    if not host_str:
-        raise ValueError("RSR_CONN environment variable is not set or is empty. Please check your .env file or environment variables.")
-    engine = create_engine(host_str)
-    return engine
-
 st.set_page_config(page_title='Market Review Tool',
    page_icon='🧷',
    layout='wide')
@@ -55,6 +41,7 @@ with st.form("my_form"):
         st.session_state['last_csid'] = csid
 
     if submitted:
+        import heavy_lifts   #offshore bulky queries
         if st.session_state['last_csid'] != csid:
             st.session_state['last_csid'] = csid
             # Retrieve comp_csid here when CSID changes
@@ -70,27 +57,152 @@ with st.form("my_form"):
 current_csid = st.session_state.get('last_csid', csid)
 current_comp_csid = st.session_state.get('comp_csid') # Retrieve comp_csid from session state
 
-# Ensure comp_csid is determined before proceeding with data loading
-if current_comp_csid is None:
-    current_comp_csid = heavy_lifts.get_comp_csid(current_csid)
-    st.session_state['comp_csid'] = current_comp_csid
-
-
-if current_csid is not None and current_comp_csid is not None:
-    df_market_comp = heavy_lifts.get_market_comp(current_csid, current_comp_csid)
+# Keep the review sections open after Submit, so widget reruns (e.g. paging a table)
+# re-render them from the result cache instead of clearing the page.  Nothing below
+# touches the database (or imports the data stack) until the first Submit.
+if submitted:
+    st.session_state['review_open'] = True
+review_open = st.session_state.get('review_open', False)
+
+# Sidebar controls; what they act on is loaded once a review is open
+refresh_clicked = st.sidebar.button(f"Refresh CSID {current_csid}")
+# Refresh re-queries only the latest days of the daily tables (see daily_store); a full refresh
+# drops the stored days too, e.g. after re-blocklisting or other corrections to older days
+full_refresh_clicked = st.sidebar.button(f"Full refresh CSID {current_csid}")
+refresh_clicked = refresh_clicked or full_refresh_clicked
+# Drill-down keeps the excluded rows cached so a category's rows show without another query
+exclusion_drilldown = st.sidebar.checkbox("Exclusion review drill-down", value=False)
+# Precomputed bundle from the headless batch run (only if it was built against the same comp_csid)
+use_bundles = st.sidebar.checkbox("Open precomputed bundle when available", value=True)
+recompute_clicked = st.sidebar.button(f"Recompute CSID {current_csid} now")
+# Server-side timings for the Performance panel; runs each uncached query a second time under EXPLAIN ANALYZE
+explain_queries = st.sidebar.checkbox("EXPLAIN ANALYZE queries (slower)", value=False)
+
+# Recompute by the precompute worker process: the request is queued and the page keeps working;
+# the new bundle opens on the first rerun after the worker has written it
+if recompute_clicked:
+    import precompute_worker
+    precompute_worker.request_recompute(current_csid)
+
+bundle = {}
+if review_open:
+    import heavy_lifts      #offshore bulky queries
+    import rsr_conn         #shared pooled engine
+    import query_cache      #shared query result cache
+    import snapshot_store   #parquet snapshots of closed csids
+    import stream_fetch     #paged (spilled) large results
+    import review_bundle    #precomputed review bundles (python -m rdaq_review batch)
+    import query_perf       #per-query timing log (Performance panel)
+    import comp_csid_store  #remembered csid -> comp_csid (sqlite)
+    import precompute_worker  #queued "recompute now" requests and the worker heartbeat
+    import review_diff      #snapshots per review run, "new since last review"
+    import daily_store      #stored per-day partials of the daily tables
+
+    # Fill the comp_csid store in the background (one query, once per process) so later Submits find comp_csids locally
+    comp_csid_store.preload_async(heavy_lifts.lookup_comp_csids, [s['csid'] for s in review_bundle.list_summaries()])
+
+    # Ensure comp_csid is determined before proceeding with data loading
+    if current_comp_csid is None:
+        current_comp_csid = heavy_lifts.get_comp_csid(current_csid)
+        st.session_state['comp_csid'] = current_comp_csid
+
+    # Drop this CSID's cached results so the next load goes back to the database
+    if refresh_clicked:
+        cleared = query_cache.invalidate_csid(current_csid)
+        st.session_state.setdefault('refreshed_at', {})[current_csid] = time.time()
+        st.session_state.pop('section_futures', None)
+        st.sidebar.caption(f"Cleared {cleared} cached result(s) for CSID {current_csid}")
+    if full_refresh_clicked:
+        dropped = daily_store.invalidate(current_csid)
+        st.sidebar.caption(f"Dropped {dropped} stored daily table(s); every day is fetched again")
+
+    # Each Submit (or refresh) is a new review run: results are snapshotted under it and
+    # diffed against the previous run (see review_diff)
+    if submitted or refresh_clicked or 'review_run' not in st.session_state:
+        st.session_state['review_run'] = review_diff.new_run()
+
+    bundle, bundle_summary = review_bundle.load_bundle(current_csid) if use_bundles else (None, None)
+    if bundle_summary is not None and bundle_summary['comp_csid'] not in (None, current_comp_csid):
+        bundle, bundle_summary = None, None
+    # a Refresh asks for live results: bundles built before it are not opened again
+    refreshed_at = st.session_state.get('refreshed_at', {}).get(current_csid)
+    if bundle_summary is not None and refreshed_at is not None and bundle_summary['created'] < refreshed_at:
+        bundle, bundle_summary = None, None
+        st.caption(f"Querying live since the refresh of CSID {current_csid}; the precomputed bundle is older.")
+    if bundle_summary is not None:
+        age_hours = (time.time() - bundle_summary['created']) / 3600
+        st.info(f"Showing the precomputed bundle for CSID {current_csid} ({age_hours:.1f} h old). "
+                "Untick 'Open precomputed bundle' in the sidebar to query live.")
+    bundle = bundle or {}
+
+    worker = precompute_worker.read_heartbeat()
+    if worker is not None and current_csid in worker['running']:
+        st.sidebar.caption(f"CSID {current_csid} is being recomputed")
+    elif current_csid in precompute_worker.queued():
+        st.sidebar.caption(f"CSID {current_csid} is queued for recompute")
+    if worker is None:
+        st.sidebar.caption("No precompute worker has run yet (python precompute_worker.py)")
+    else:
+        st.sidebar.caption(f"Precompute worker last seen {(time.time() - worker['seen']) / 60:.0f} min ago")
+
+    heavy_lifts.set_explain(explain_queries)
+
+
+# "New since last review" (the default) or every row, for the checkpoints review_diff can key;
+# False when there is no earlier run to compare with (the caller shows every row).  The diff is
+# computed once per run and checkpoint and kept in session state for reruns.
+def changes_view(name, df):
+    state = st.session_state.get('review_changes')
+    if state is None or state['run'] != (current_csid, st.session_state['review_run']):
+        state = {'run': (current_csid, st.session_state['review_run']), 'diffs': {}}
+        st.session_state['review_changes'] = state
+    if name not in state['diffs']:
+        try:
+            state['diffs'][name] = review_diff.review_changes(current_csid, st.session_state['review_run'], name, df)
+        except Exception as e:
+            state['diffs'][name] = None
+            st.caption(f"No comparison with the last review ({e})")
+    changes = state['diffs'][name]
+    if changes is None:
+        return False
+    view = st.radio("Show", ["New since last review", "All rows"], horizontal=True, key=f"{name}_changes",
+                    label_visibility="collapsed")
+    if view == "All rows":
+        return False
+    reviewed = review_diff.run_time(changes.previous_run).strftime('%b %d %H:%M')
+    st.caption(f"Since the review of {reviewed}: {len(changes.added)} added, {len(changes.changed)} changed, "
+               f"{len(changes.removed)} removed")
+    st.dataframe(changes.new_rows(), hide_index=True)
+    if len(changes.removed):
+        with st.expander(f"{len(changes.removed)} row(s) gone since the last review"):
+            st.dataframe(changes.removed, hide_index=True)
+    return True
+
+
+if review_open and current_csid is not None and current_comp_csid is not None:
+    df_market_comp = bundle['eom_full'] if 'eom_full' in bundle else heavy_lifts.get_market_comp(current_csid, current_comp_csid)
     st.write("Check comparison market")
     st.write(df_market_comp)
 
-    df_eom = heavy_lifts.get_eom(current_csid, current_comp_csid)
+    df_eom = bundle['eom'] if 'eom' in bundle else heavy_lifts.get_eom(current_csid, current_comp_csid)
     st.write("Flagged Market level comparisons [Market checkpoint 1a]")
-    st.write(df_eom)
+    if not changes_view('eom', df_eom):
+        st.write(df_eom)
 
     #df_eom_full = heavy_lifts.get_eom_full(current_csid, current_comp_csid)
     #st.write("Full Market level comparisons")
     #st.write(df_eom_full)
 
-if submitted:
-    st.write("Stand-alone 5G *NR* percentages by device")
+# plotly is only needed once a chart is drawn
+def plotly_express():
+    import plotly.express as px
+    import plotly.io as pio
+    pio.templates.default = 'plotly'
+    return px
+
+# Begin code for the NR percentage chart (current and comparison csid from one query)
+def plot_nr(concat_nr):
+    px = plotly_express()
     color_map = {
   '5G' : '#009697', 
   'Mixed-5G' : '#3CB371', 
@@ -98,12 +210,6 @@ if submitted:
   'Non-LTE' : '#f4a460'
     }
 
-    curr_nr = heavy_lifts.dl_nr_percentages(csid)
-    comp_nr = heavy_lifts.dl_nr_percentages(csid) # This should ideally use comp_csid if you want comparison data
-
-    concat_nr = pd.concat([curr_nr,comp_nr], ignore_index=True)
-    #print("Concatenated Rows:\n", concat_nr)
-
     fig = px.bar(concat_nr, x="product_period", y="dl_pct", color="sa_status", barmode="relative",facet_col="device_f_name",
              color_discrete_map=color_map) # text_auto=True
 
@@ -116,168 +222,212 @@ if submitted:
 
     st.plotly_chart(fig, use_container_width=True)    
 
-    
-# Turn off call net comparison for now...
-#if submitted:
-#    df_callnet = heavy_lifts.get_callnet(csid)
-#    st.write("Call Net - NOT filtered")
-#    st.write(df_callnet)
-
-
-
-if submitted:
-    df_market_net = heavy_lifts.get_marketnet(csid)
-    st.write("Market-level network comparisons - NOT filtered (source auto-schema)")
-    st.write(df_market_net)
-
-if submitted:
-    df_datadiff = heavy_lifts.get_datadiff(csid)
-    st.write("Filtered daily differences in data/call tests [Market checkpoint 1b]")
-    st.write(df_datadiff) 
- 
-if submitted:
-    get_madish = heavy_lifts.get_MADish(csid,comp_csid)
-    st.write("MAD-type tables plots [Market checkpoint 1c]")
-    #st.write(get_madish)               #commented out for now
-
-# Begin code for plotting MAD-type data
-    if submitted and get_madish is not None:
-        # Create new column for collection set grouping
-        get_madish['period'] = get_madish['collection_set'].apply(lambda x: '2025-1H' if x.endswith('2025-1H') else '2025-2H' if x.endswith('2025-2H') else 'Other')
-        
-        # Create subplots using fixed 'acc' metric
-        fig = px.scatter(get_madish, 
-                        x='carrier', 
-                        y='acc',
-                        color='period',
-                        facet_col='test_type_id',
-                        symbol='period',
-                        title='Access Values by Test Type and Carrier',
-                        labels={'acc': 'access Value', 'carrier': 'Carrier'},
-                        height=600,
-                        hover_data=['loc_day', 'n_grp'])
-                # Update layout for better readability
-        fig.update_layout(showlegend=True)
-        fig.update_xaxes(tickangle=45)
-        
-        # Display the plot
-        st.plotly_chart(fig, use_container_width=True)
-        
-        fig = px.scatter(get_madish, 
-                        x='carrier', 
-                        y='task',
-                        color='period',
-                        facet_col='test_type_id',
-                        symbol='period',
-                        title='Task Values by Test Type and Carrier',
-                        labels={'task': 'Task Value', 'carrier': 'Carrier'},
-                        height=600,
-                        hover_data=['loc_day', 'n_grp'])        
-        
-        # Update layout for better readability
-        fig.update_layout(showlegend=True)
-        fig.update_xaxes(tickangle=45)
-        
-        # Display the plot
-        st.plotly_chart(fig, use_container_width=True)
 
-# Create filtered dataframes for each test type
-        df_19 = get_madish[get_madish['test_type_id'] == 19]
-        df_20 = get_madish[get_madish['test_type_id'] == 20]
-        df_26 = get_madish[get_madish['test_type_id'] == 26]
-
-        # Create a figure with 4 subplots
-        fig = make_subplots(rows=2, cols=2, 
-               subplot_titles=('Upload Speed (Test 19)', 
-                 'Download Speed (Test 20)',
-                 'LDRs Access Speed 95p (Test 26)',
-                 'LDRs Task Speed 95p (Test 26)'))
-
-        # Define marker properties for each period
-        marker_props = {
-            '2025-2H': dict(symbol='circle', size=12),
-            '2025-1H': dict(symbol='triangle-up', size=8)
-        }
-
-        # Add traces for each subplot
-        for period in df_19['period'].unique():
-            if period in marker_props:  # Only plot 2024-2H and 2025-1H
-                df_temp = df_19[df_19['period'] == period]
-                fig.add_trace(
-                    go.Scatter(x=df_temp['carrier'], y=df_temp['ul_speed_50p'],
-                          mode='markers', name=f'Period {period} - Test 19',
-                          marker=marker_props[period],
-                          showlegend=True,hovertext=df_temp['loc_day']),
-                    row=1, col=1
-                )
-
-        for period in df_20['period'].unique():
-            if period in marker_props:
-                df_temp = df_20[df_20['period'] == period]
-                fig.add_trace(
-                    go.Scatter(x=df_temp['carrier'], y=df_temp['dl_speed_50p'],
-                          mode='markers', name=f'Period {period} - Test 20',
-                          marker=marker_props[period],
-                          showlegend=True,hovertext=df_temp['loc_day']),
-                    row=1, col=2
-                )
-
-        for period in df_26['period'].unique():
-            if period in marker_props:
-                df_temp = df_26[df_26['period'] == period]
-                fig.add_trace(
-                    go.Scatter(x=df_temp['carrier'], y=df_temp['ldrs_access_sp_95p'],
-                          mode='markers', name=f'Period {period} - Test 26 Access',
-                          marker=marker_props[period],
-                          showlegend=True,hovertext=df_temp['loc_day']),
-                    row=2, col=1
-                )
-                fig.add_trace(
-                    go.Scatter(x=df_temp['carrier'], y=df_temp['ldrs_task_sp_95p'],
-                          mode='markers', name=f'Period {period} - Test 26 Task',
-                          marker=marker_props[period],
-                          showlegend=True,hovertext=df_temp['loc_day']),
-                    row=2, col=2
-                )
-
-        # Update layout
-        fig.update_layout(height=800, width=1000, title_text="Speed Metrics by Test Type")
-        fig.update_xaxes(tickangle=45)
-
-        # Display the plot
+# Begin code for plotting MAD-type data (figures built in mad_plots)
+def plot_madish(get_madish):
+    plotly_express()
+    import mad_plots        #checkpoint 1c figures
+    for fig in mad_plots.madish_figures(get_madish):
         st.plotly_chart(fig, use_container_width=True)
 
-if submitted:
-    df_dev_algo = heavy_lifts.get_algo(csid)
-    st.write("Device algorithm: 4+ consecutive failures [Market checkpoint 2]")
-    st.write(df_dev_algo)
-
-if submitted:
-    df_filtered_algo = heavy_lifts.get_filtered_algo(csid)
-    st.write("Filtered Device algorithm :  4+ consecutive failures only one device")
-    st.write(df_filtered_algo)
-
-if submitted:
-    df_layer3_reveiw = heavy_lifts.get_layer3_m2m(csid)
-    st.write("M2M call failures flagged for layer 3 review [Market checkpoint 3]")
-    st.write(df_layer3_reveiw)
-
-if submitted:
-    df_auto_check = heavy_lifts.get_auto_check(csid)
-    st.write("DQ auto check [Market checkpoint 4b]")
-    st.write(df_auto_check)
 
-if submitted:
-    df_dqcheck = heavy_lifts.get_dqcheck(csid)
-    st.write("DQ check items [Market checkpoint 4]")
-    st.write(df_dqcheck)
+# Independent checkpoint sections, in page order: name -> (title, query function, args)
+def checkpoint_sections(csid, comp_csid):
+    return {
+        'nr': ("Stand-alone 5G *NR* percentages by device", heavy_lifts.dl_nr_percentages, ([csid, comp_csid],)),
+        'callnet': ("Call Net - NOT filtered", heavy_lifts.get_callnet, (csid,)),
+        'market_net': ("Market-level network comparisons - NOT filtered (source auto-schema)", heavy_lifts.get_marketnet, (csid,)),
+        'datadiff': ("Filtered daily differences in data/call tests [Market checkpoint 1b]", heavy_lifts.get_datadiff, (csid,)),
+        'madish': ("MAD-type tables plots [Market checkpoint 1c]", heavy_lifts.get_MADish, (csid, comp_csid)),
+        'dev_algo': ("Device algorithm: 4+ consecutive failures [Market checkpoint 2]", heavy_lifts.get_algo_pages, (csid,)),
+        'filtered_algo': ("Filtered Device algorithm :  4+ consecutive failures only one device", heavy_lifts.get_filtered_algo, (csid,)),
+        'layer3': ("M2M call failures flagged for layer 3 review [Market checkpoint 3]", heavy_lifts.get_layer3_m2m_pages, (csid,)),
+        'auto_check': ("DQ auto check [Market checkpoint 4b]", heavy_lifts.get_auto_check, (csid,)),
+        'dqcheck': ("DQ check items [Market checkpoint 4]", heavy_lifts.get_dqcheck, (csid,)),
+        'bl_test': ("Review the rate of blocklisting by test type", heavy_lifts.get_bl_test, (csid,)),
+        'excluded': ("Data Exclusion Review", heavy_lifts.get_excluded_rows if exclusion_drilldown else heavy_lifts.get_excluded, (csid,)),
+    }
 
-if submitted:
-    df_bl_by_test = heavy_lifts.get_bl_test(csid)
-    st.write("Review the rate of blocklisting by test type")
-    st.write(df_bl_by_test)
 
-if submitted:
-    df_bl = heavy_lifts.get_excluded(csid)
-    st.write("Data Exclusion Review")
-    st.write(df_bl)
\ No newline at end of file
+# short names for the section picker, same order as checkpoint_sections
+SECTION_LABELS = {
+    'nr': "NR %",
+    'callnet': "Call net",
+    'market_net': "Market net",
+    'datadiff': "1b Daily diff",
+    'madish': "1c MAD",
+    'dev_algo': "2 Device algo",
+    'filtered_algo': "2 Filtered algo",
+    'layer3': "3 Layer 3",
+    'auto_check': "4b Auto check",
+    'dqcheck': "4 DQ check",
+    'bl_test': "Blocklist rate",
+    'excluded': "Exclusions",
+}
+
+# sections after the open ones (page order) queried in the background, ready when opened
+PREFETCH_SECTIONS = int(os.getenv("RSR_PREFETCH_SECTIONS", 2))
+
+
+# this session's checkpoint queries (running or finished) for the current review: name -> future
+def section_futures(csid, comp_csid):
+    state = st.session_state.get('section_futures')
+    if state is None or state['review'] != (csid, comp_csid):
+        state = {'review': (csid, comp_csid), 'futures': {}}
+        st.session_state['section_futures'] = state
+    return state['futures']
+
+
+# the excluded section switches query with the drill-down toggle, so the query is part of the key
+def job_key(name, sections):
+    return f"{name}:{sections[name][1].__name__}"
+
+
+# sections the open bundle already holds (drill-down needs the excluded rows, which bundles don't carry)
+def in_bundle(name):
+    return name in bundle and not (name == 'excluded' and exclusion_drilldown)
+
+
+def likely_next(sections, opened, skip):
+    names = list(sections)
+    start = max((names.index(n) + 1 for n in opened), default=0)
+    return [n for n in names[start:] if n not in opened and n not in skip][:PREFETCH_SECTIONS]
+
+
+PAGE_ROWS = 500
+
+# one page of a spilled result at a time -- only that page is read from disk and sent to the browser
+def paged_view(result, key):
+    n_pages = result.n_pages(PAGE_ROWS)
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages}; {len(result)} rows)", min_value=1, max_value=n_pages,
+                               value=1, step=1, key=f"{key}_page")
+    st.dataframe(result.page(page - 1, PAGE_ROWS))
+
+
+# tallies from the cached exclusion rows; picking a category shows its rows (no database call)
+def exclusion_drilldown_view(rows):
+    tallies = heavy_lifts.exclusion_tallies(rows)
+    st.write(tallies)
+    if len(tallies):
+        choice = st.selectbox("Show rows for", range(len(tallies)), key="excluded_drilldown",
+                              format_func=lambda i: f"{tallies.at[i, 'exclusion_category']}: {tallies.at[i, 'exclusion_detail']} ({tallies.at[i, 'row_count']})")
+        st.dataframe(heavy_lifts.exclusion_rows(rows, tallies.at[choice, 'exclusion_category'], tallies.at[choice, 'exclusion_detail']))
+
+
+def render_section(name, df):
+    if name in review_diff.ROW_KEYS and df is not None and changes_view(name, df):
+        return
+    if name == 'nr':
+        plot_nr(df)
+    elif name == 'madish':
+        #st.write(df)               #commented out for now
+        if df is not None:
+            plot_madish(df)
+    elif name == 'excluded' and exclusion_drilldown:
+        exclusion_drilldown_view(df)
+    elif isinstance(df, stream_fetch.PagedResult):
+        paged_view(df, name)
+    else:
+        st.write(df)
+
+
+# Checkpoint sections load on demand: only the ones picked here are queried (together, on the
+# shared pool), so the first render costs no more than the EOM comparison above.  The sections
+# after them are prefetched in the background; every query is kept in session state, so an open
+# or prefetched section is never queried twice and reruns (paging, widgets) render straight away.
+if review_open:
+    sections = checkpoint_sections(current_csid, current_comp_csid)
+    picked = st.pills("Open checkpoints", options=list(sections), format_func=SECTION_LABELS.get,
+                      selection_mode="multi", key="open_sections") or []
+    opened = [name for name in sections if name in picked]
+    futures = section_futures(current_csid, current_comp_csid)
+
+    slots, status = {}, {}
+    for name in opened:
+        slots[name] = st.container()
+        with slots[name]:
+            st.write(sections[name][0])
+            status[name] = st.empty()
+        status[name].caption("running...")
+
+    for name in opened:
+        if in_bundle(name):
+            status[name].empty()
+            with slots[name]:
+                render_section(name, bundle[name])
+    jobs = {name: sections[name][1:] for name in opened if not in_bundle(name)}
+    for name, (func, args) in jobs.items():
+        if job_key(name, sections) not in futures:
+            futures[job_key(name, sections)] = heavy_lifts.submit_checkpoint(func, args, explain=explain_queries)
+    running = {name: futures[job_key(name, sections)] for name in jobs}
+    for result in heavy_lifts.run_checkpoints(jobs, explain=explain_queries, running=running):
+        status[result.name].empty()
+        with slots[result.name]:
+            if result.status == 'ok':
+                render_section(result.name, result.df)
+            else:
+                futures.pop(job_key(result.name, sections), None)    # failed: query again next time it is opened
+                if result.status == 'timeout':
+                    st.warning(f"Query timed out ({result.error})")
+                else:
+                    st.error(f"Query failed: {result.error}")
+
+    for name in likely_next(sections, opened, [n for n in sections if in_bundle(n)]):
+        if job_key(name, sections) not in futures:
+            _, func, args = sections[name]
+            futures[job_key(name, sections)] = heavy_lifts.submit_checkpoint(func, args, explain=explain_queries)
+
+
+# Fleet view: headline numbers of many markets from one query per checkpoint (see fleet_review);
+# the last table is kept in session state so reruns don't query again
+with st.expander("Fleet view (many CSIDs)"):
+    with st.form("fleet_form"):
+        fleet_csids = st.text_input("CSIDs or ranges", value="", placeholder="12610-12650, 12700")
+        fleet_per_csid = st.number_input("Seconds per market", min_value=1, value=None, step=10,
+                                         placeholder="RSR_FLEET_TIMEOUT_PER_CSID",
+                                         help="query timeout per checkpoint = this times the number of markets")
+        fleet_submitted = st.form_submit_button("Compare")
+    if fleet_submitted:
+        import fleet_review
+        from rdaq_review import parse_csids
+        try:
+            csids = parse_csids(fleet_csids)
+        except ValueError:
+            csids = []
+            st.error("CSIDs must be numbers or ranges like 12610-12650")
+        if csids:
+            with st.spinner(f"Querying {len(csids)} markets..."):
+                frames, fleet_status, comp_csids = fleet_review.run_fleet(csids, per_csid=fleet_per_csid)
+            st.session_state['fleet'] = (fleet_review.fleet_summary(frames, csids, comp_csids), fleet_status)
+    if 'fleet' in st.session_state:
+        fleet_table, fleet_status = st.session_state['fleet']
+        for name, entry in fleet_status.items():
+            if entry['status'] != 'ok':
+                st.warning(f"{name}: {entry['status']} ({entry['error']})")
+        st.dataframe(fleet_table, hide_index=True)
+
+
+# Diagnostics for the open review (shared by every session on this worker)
+if review_open:
+    # Connection pool health (one engine is shared by all sessions on this worker)
+    with st.sidebar.expander("DB connection pool"):
+        st.json(rsr_conn.pool_stats())
+
+    # Result cache hit/miss counters
+    with st.sidebar.expander("Query result cache"):
+        st.json(query_cache.cache_stats())
+        st.caption("Closed-CSID snapshot store")
+        st.json(snapshot_store.store_stats())
+
+    # Per-query timings of this CSID's fetches (cache hits don't appear -- they never reach the database)
+    with st.sidebar.expander("Performance"):
+        perf = query_perf.recent(current_csid)
+        if perf.empty:
+            st.caption("No queries timed yet for this CSID")
+        else:
+            columns = [c for c in ['query', 'status', 'wall_s', 'server_ms', 'planning_ms', 'rows', 'bytes_est', 'df_mb',
+                                   'shared_hit', 'shared_read'] if c in perf.columns]
+            st.dataframe(perf[columns].iloc[::-1], hide_index=True)
+        st.caption(f"Logged to {query_perf.PERF_LOG}; compare days with `python query_perf.py report`")
@@ -0,0 +1,115 @@
+# Headless entry point for the morning review queue.
+#
+#   python -m rdaq_review batch --csids 12610,12611,12612 [--workers 4]
+#   python -m rdaq_review batch --csids-file queue.txt
+#   python -m rdaq_review triage
+#   python -m rdaq_review fleet --csids 12610-12650 [--csv fleet.csv]
+#
+# `batch` runs every heavy_lifts checkpoint for each CSID (a few CSIDs at a time),
+# writes one bundle per CSID (see review_bundle) and prints a ranked triage list.
+# The Streamlit app opens these bundles instead of querying the database live.
+# `fleet` prints the headline numbers of many markets from one query per checkpoint
+# (see fleet_review); nothing is written to the bundles.
+
+import argparse
+import sys
+
+import review_bundle
+
+
+def parse_csids(value):
+    csids = []
+    for part in value.replace("\n", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = (int(p) for p in part.split("-", 1))
+            csids.extend(range(first, last + 1))
+        else:
+            csids.append(int(part))
+    return list(dict.fromkeys(csids))
+
+
+def _csids_from_args(args):
+    csids = parse_csids(args.csids or "")
+    if args.csids_file:
+        with open(args.csids_file) as f:
+            csids += parse_csids(f.read())
+    return list(dict.fromkeys(csids))
+
+
+def print_triage(summaries):
+    table = review_bundle.triage(summaries)
+    if table.empty:
+        print("no bundles")
+    else:
+        print(table.to_string(index=False))
+
+
+def cmd_batch(args):
+    csids = _csids_from_args(args)
+    if not csids:
+        print("no CSIDs given (--csids or --csids-file)")
+        return 2
+    summaries = review_bundle.run_batch(csids, workers=args.workers, base_dir=args.out, timeout=args.timeout)
+    print()
+    print_triage(summaries)
+    return 0 if len(summaries) == len(csids) else 1
+
+
+def cmd_triage(args):
+    print_triage(review_bundle.list_summaries(args.out))
+    return 0
+
+
+def cmd_fleet(args):
+    import fleet_review
+    csids = _csids_from_args(args)
+    if not csids:
+        print("no CSIDs given (--csids or --csids-file)")
+        return 2
+    frames, status, comp_csids = fleet_review.run_fleet(csids, timeout=args.timeout)
+    for name, entry in status.items():
+        if entry['status'] != 'ok':
+            print(f"{name}: {entry['status']} ({entry['error']})")
+    table = fleet_review.fleet_summary(frames, csids, comp_csids)
+    print(table.to_string(index=False))
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    return 0 if all(entry['status'] == 'ok' for entry in status.values()) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="rdaq_review", description="Headless production market review")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="review many CSIDs and write one bundle per CSID")
+    batch.add_argument("--csids", help="comma-separated CSIDs or ranges, e.g. 12610,12611,12620-12625")
+    batch.add_argument("--csids-file", help="file with CSIDs (comma- or newline-separated)")
+    batch.add_argument("--workers", type=int, default=4, help="CSIDs reviewed at once (default 4)")
+    batch.add_argument("--timeout", type=float, default=None, help="per-checkpoint timeout in seconds")
+    batch.add_argument("--out", default=None, help="bundle directory (default RSR_BUNDLE_DIR)")
+    batch.set_defaults(func=cmd_batch)
+
+    triage = sub.add_parser("triage", help="rank the existing bundles")
+    triage.add_argument("--out", default=None, help="bundle directory (default RSR_BUNDLE_DIR)")
+    triage.set_defaults(func=cmd_triage)
+
+    fleet = sub.add_parser("fleet", help="headline numbers of many CSIDs, one query per checkpoint")
+    fleet.add_argument("--csids", help="comma-separated CSIDs or ranges, e.g. 12610-12650")
+    fleet.add_argument("--csids-file", help="file with CSIDs (comma- or newline-separated)")
+    fleet.add_argument("--timeout", type=float, default=None,
+                       help="per-checkpoint timeout in seconds (default RSR_FLEET_TIMEOUT_PER_CSID per CSID)")
+    fleet.add_argument("--csv", help="also write the summary to this CSV file")
+    fleet.set_defaults(func=cmd_fleet)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
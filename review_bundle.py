@@ -0,0 +1,208 @@
+# Precomputed review bundles.
+#
+# A bundle is one directory per CSID under RSR_BUNDLE_DIR holding every checkpoint
+# result as Parquet plus summary.json (comp_csid, per-checkpoint status/rows/time and
+# the flagged-row counts used for triage).  The headless batch run and the precompute
+# worker write them (python -m rdaq_review batch ..., python precompute_worker.py) and
+# the Streamlit app opens them instead of querying the database live.
+#
+# Each run is kept in its own subdirectory named by the run timestamp
+# (<csid>/20250512T053000/); the CURRENT file names the one readers open, so a new run
+# never replaces files under a reader.  The newest RSR_BUNDLE_KEEP_RUNS runs are kept.
+
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import stream_fetch
+
+BUNDLE_DIR = os.getenv("RSR_BUNDLE_DIR", os.path.join(".rdaq_data", "bundles"))
+KEEP_RUNS = int(os.getenv("RSR_BUNDLE_KEEP_RUNS", 3))
+
+RUN_ID = re.compile(r"\d{8}T\d{6}")
+
+# checkpoints shown through the paged view; read back as PagedResult instead of a full frame
+PAGED_CHECKPOINTS = ('dev_algo', 'layer3')
+
+# rows that need a reviewer's attention, per checkpoint
+FLAG_COUNTS = {
+    'eom': lambda df: int(df['rank'].notna().sum()),          # flagged rows, not the header row
+    'datadiff': len,
+    'dev_algo': len,
+    'filtered_algo': len,
+    'layer3': len,
+    'auto_check': len,
+    'dqcheck': len,
+}
+
+
+def bundle_path(csid, base_dir=None):
+    return os.path.join(base_dir or BUNDLE_DIR, str(int(csid)))
+
+
+def runs(csid, base_dir=None):
+    path = bundle_path(csid, base_dir)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if RUN_ID.fullmatch(name))
+
+
+# directory of the current run (bundles written before runs were versioned sit directly in the CSID's directory)
+def current_path(csid, base_dir=None):
+    path = bundle_path(csid, base_dir)
+    try:
+        with open(os.path.join(path, "CURRENT")) as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def _new_run(path):
+    run = time.strftime("%Y%m%dT%H%M%S")
+    while os.path.exists(os.path.join(path, run)):
+        time.sleep(1)
+        run = time.strftime("%Y%m%dT%H%M%S")
+    return run
+
+
+# drop all but the newest `keep` runs and any files of the unversioned layout
+def _prune(csid, base_dir=None, keep=KEEP_RUNS):
+    path = bundle_path(csid, base_dir)
+    for run in runs(csid, base_dir)[:-max(1, keep)]:
+        shutil.rmtree(os.path.join(path, run), ignore_errors=True)
+    for name in os.listdir(path):
+        if name.endswith(".parquet") or name == "summary.json":
+            os.remove(os.path.join(path, name))
+
+
+# headline numbers of one review, for the summary and the triage ranking
+def summarize(frames):
+    flagged = {name: count(frames[name]) for name, count in FLAG_COUNTS.items() if name in frames}
+    summary = {'flagged': flagged, 'flagged_total': sum(flagged.values())}
+    if 'bl_test' in frames and len(frames['bl_test']):
+        summary['max_bl_rate'] = float(pd.to_numeric(frames['bl_test']['bl_rate']).max())
+    if 'eom_full' in frames and len(frames['eom_full']):
+        summary['worst_eom_pct_change'] = float(pd.to_numeric(frames['eom_full']['pct_change']).min())
+    return summary
+
+
+# run every checkpoint for one CSID; returns ({name: frame}, {name: status entry})
+def run_review(csid, comp_csid=None, timeout=None):
+    import heavy_lifts   # deferred: reading bundles needs no database access
+    frames, status = {}, {}
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    for result in heavy_lifts.run_checkpoints(heavy_lifts.checkpoint_jobs(csid, comp_csid), **kwargs):
+        status[result.name] = {'status': result.status, 'elapsed': round(result.elapsed, 2), 'error': result.error}
+        if result.status == 'ok':
+            frames[result.name] = result.df
+            status[result.name]['rows'] = len(result.df)
+    if 'eom_full' in frames:
+        frames['eom'] = heavy_lifts.eom_flags(frames['eom_full'], csid)
+        status['eom'] = {'status': 'ok', 'elapsed': 0.0, 'error': None, 'rows': len(frames['eom'])}
+    return frames, status
+
+
+def write_bundle(csid, comp_csid, frames, status, base_dir=None):
+    path = bundle_path(csid, base_dir)
+    os.makedirs(path, exist_ok=True)
+    run = _new_run(path)
+    tmp = os.path.join(path, f"{run}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, df in frames.items():
+        df.to_parquet(os.path.join(tmp, f"{name}.parquet"), index=False)
+    summary = {'csid': int(csid), 'comp_csid': None if comp_csid is None else int(comp_csid),
+               'run': run, 'created': time.time(), 'checkpoints': status, **summarize(frames)}
+    summary['errors'] = sorted(name for name, entry in status.items() if entry['status'] != 'ok')
+    with open(os.path.join(tmp, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+    os.replace(tmp, os.path.join(path, run))
+    with open(os.path.join(path, "CURRENT.tmp"), "w") as f:
+        f.write(run)
+    os.replace(os.path.join(path, "CURRENT.tmp"), os.path.join(path, "CURRENT"))
+    _prune(csid, base_dir)
+    return summary
+
+
+def read_summary(csid, base_dir=None):
+    try:
+        with open(os.path.join(current_path(csid, base_dir), "summary.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# checkpoint frames of a bundle (memory-mapped Parquet; paged checkpoints as PagedResult)
+def load_bundle(csid, base_dir=None):
+    summary = read_summary(csid, base_dir)
+    if summary is None:
+        return None, None
+    path = current_path(csid, base_dir)
+    frames = {}
+    for name, entry in summary['checkpoints'].items():
+        file = os.path.join(path, f"{name}.parquet")
+        if entry['status'] != 'ok' or not os.path.exists(file):
+            continue
+        if name in PAGED_CHECKPOINTS:
+            frames[name] = stream_fetch.PagedResult(file, entry.get('rows', 0), None)
+        else:
+            frames[name] = pd.read_parquet(file, memory_map=True)
+    return frames, summary
+
+
+def list_summaries(base_dir=None):
+    base_dir = base_dir or BUNDLE_DIR
+    if not os.path.isdir(base_dir):
+        return []
+    summaries = [read_summary(name, base_dir) for name in os.listdir(base_dir) if name.isdigit()]
+    return [s for s in summaries if s is not None]
+
+
+# most urgent first: failed checkpoints, then the most flagged rows
+def triage(summaries):
+    rows = [{'csid': s['csid'], 'comp_csid': s['comp_csid'], 'errors': len(s['errors']),
+             'flagged_total': s['flagged_total'], **s['flagged'],
+             'max_bl_rate': s.get('max_bl_rate'), 'worst_eom_pct_change': s.get('worst_eom_pct_change')}
+            for s in summaries]
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    return df.sort_values(['errors', 'flagged_total'], ascending=[False, False], kind='stable').reset_index(drop=True)
+
+
+# review one CSID end to end and write its bundle
+def review_csid(csid, base_dir=None, timeout=None):
+    import heavy_lifts
+    import comp_csid_store
+    comp_csid, _ = comp_csid_store.resolve(csid, heavy_lifts.lookup_comp_csid)
+    frames, status = run_review(csid, comp_csid, timeout)
+    return write_bundle(csid, comp_csid, frames, status, base_dir)
+
+
+# bounded parallelism across CSIDs; the checkpoint queries themselves share the scheduler pool
+def run_batch(csids, workers=4, base_dir=None, timeout=None, progress=print):
+    import heavy_lifts
+    import comp_csid_store
+    try:
+        comp_csid_store.preload(csids, heavy_lifts.lookup_comp_csids)    # every comp_csid in one query
+    except Exception as e:
+        progress(f"comp_csid preload failed ({e}); looking them up one by one")
+    summaries = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rdaq-batch") as pool:
+        futures = {pool.submit(review_csid, csid, base_dir, timeout): csid for csid in csids}
+        for future in as_completed(futures):
+            csid = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                progress(f"csid {csid}: failed ({e})")
+                continue
+            summaries.append(summary)
+            progress(f"csid {csid}: {summary['flagged_total']} flagged rows"
+                     + (f", failed: {', '.join(summary['errors'])}" if summary['errors'] else ""))
+    return summaries
@@ -0,0 +1,240 @@
+# What changed in a checkpoint since the last review of the CSID.
+#
+# Every checkpoint result a reviewer opens is snapshotted per review run (a Submit or a
+# refresh) under RSR_REVIEW_RUNS_DIR/<csid>/<run>/<checkpoint>.parquet, with two hashes
+# per row: its key (the ROW_KEYS columns, e.g. test_id for the failure lists) and the
+# whole row.  Against the newest earlier run that has the same checkpoint:
+#
+#   added     key not in the previous snapshot
+#   removed   key only in the previous snapshot
+#   changed   same key, different values (changed_columns names them)
+#
+# Repeated keys are numbered in order, so they still pair up one to one; checkpoints
+# without key columns are keyed on the whole row (added/removed only).  Values are
+# compared normalized -- numbers as rounded floats, timestamps in UTC, the rest as text --
+# so the same rows fetched through Arrow, read_sql or a bundle hash the same.  Runs are
+# shared by every session: "last review" is the last look by anyone.
+#
+# The diff works on the snapshot files: only the key and row hash columns are read whole,
+# plus the added/changed/removed rows themselves.  A paged (spilled) result is hashed and
+# snapshotted batch by batch from its Parquet file, so a large layer3 or dev_algo list is
+# never loaded in full.
+#
+#   RSR_REVIEW_RUNS_DIR    default .rdaq_data/review_runs
+#   RSR_REVIEW_RUNS_KEEP   runs kept per CSID (default 5)
+
+import datetime
+import decimal
+import numbers
+import os
+import re
+import shutil
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from review_rules import flag_labels
+from stream_fetch import PagedResult
+
+RUNS_DIR = os.getenv("RSR_REVIEW_RUNS_DIR", os.path.join(".rdaq_data", "review_runs"))
+KEEP_RUNS = int(os.getenv("RSR_REVIEW_RUNS_KEEP", 5))
+
+RUN_ID = re.compile(r"\d{8}T\d{6}(-\d{6}-[0-9a-f]{6})?")     # time, microseconds, random suffix
+KEY_COLUMN, HASH_COLUMN = '_row_key', '_row_hash'
+
+# columns identifying a row of each checkpoint (the ones present in the result are used)
+ROW_KEYS = {
+    'eom': ['rank', 'carrier', 'metric'],
+    'datadiff': ['carrier', 'emp', 'loc_day', 'test_type_id'],
+    'dev_algo': ['test_id'],
+    'filtered_algo': ['test_id'],
+    'layer3': ['test_id'],
+    'auto_check': ['carrier', 'emp', 'loc_day', 'kit_type_id'],
+    'dqcheck': ['test_type_id', 'kit_type_id'],
+    'bl_test': ['test_type_id'],
+}
+
+
+@dataclass
+class RunDiff:
+    previous_run: str
+    added: pd.DataFrame
+    removed: pd.DataFrame
+    changed: pd.DataFrame
+
+    # added and changed rows, marked in a leading `change` column
+    def new_rows(self):
+        parts = [self.added.assign(change='added', changed_columns=''), self.changed.assign(change='changed')]
+        df = pd.concat([p for p in parts if len(p)] or parts[:1], ignore_index=True)
+        return df[['change'] + [c for c in df.columns if c != 'change']]
+
+
+# unique across sessions and processes, and sorted by time
+def new_run():
+    return f"{datetime.datetime.now():%Y%m%dT%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+
+
+# when the run started, as a datetime
+def run_time(run):
+    return datetime.datetime.strptime(run[:15], "%Y%m%dT%H%M%S")
+
+
+def _run_dir(csid, run, base_dir=None):
+    return os.path.join(base_dir or RUNS_DIR, str(int(csid)), run)
+
+
+def runs(csid, base_dir=None):
+    path = os.path.join(base_dir or RUNS_DIR, str(int(csid)))
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if RUN_ID.fullmatch(name))
+
+
+def _prune(csid, base_dir=None, keep=KEEP_RUNS):
+    for run in runs(csid, base_dir)[:-max(2, keep)]:
+        shutil.rmtree(_run_dir(csid, run, base_dir), ignore_errors=True)
+
+
+def _is_number(value):
+    return isinstance(value, (numbers.Number, decimal.Decimal)) and not isinstance(value, bool)
+
+
+# comparable version of each column: floats rounded to 6 places, UTC timestamps, otherwise text
+def _normalized(df):
+    out = {}
+    for column in df.columns:
+        values = df[column]
+        first = values.dropna().iloc[0] if values.notna().any() else None
+        if pd.api.types.is_bool_dtype(values) or isinstance(first, bool):
+            out[column] = values.astype('string')
+        elif pd.api.types.is_numeric_dtype(values) or _is_number(first):
+            out[column] = pd.to_numeric(values).astype('float64').round(6)
+        elif isinstance(values.dtype, pd.DatetimeTZDtype):
+            out[column] = values.dt.tz_convert('UTC').astype('string')
+        else:
+            out[column] = values.astype('string')
+    norm = pd.DataFrame(out, index=df.index)
+    for column in norm.columns:
+        if norm[column].dtype == 'string':
+            norm[column] = norm[column].fillna('\x00').astype(object)
+    return norm
+
+
+def row_keys(name, df):
+    return [c for c in ROW_KEYS.get(name, ()) if c in df.columns] or list(df.columns)
+
+
+# (key hash, row hash, seen) per row, as uint64 Series on df's index; `seen` counts the key
+# values of the earlier chunks of the same result, so repeats are numbered across chunks
+def _chunk_hashes(df, keys, seen):
+    norm = _normalized(df)
+    base = pd.util.hash_pandas_object(norm[keys], index=False)
+    occurrence = base.groupby(base, sort=False).cumcount() if len(base) else pd.Series(dtype='int64')
+    occurrence = occurrence + base.map(seen).fillna(0).astype('int64')
+    key = pd.util.hash_pandas_object(pd.DataFrame({'key': base, 'occurrence': occurrence}), index=False)
+    row = pd.util.hash_pandas_object(norm, index=False)
+    return key, row, seen.add(base.value_counts(), fill_value=0)
+
+
+def row_hashes(df, keys):
+    key, row, _ = _chunk_hashes(df, keys, pd.Series(dtype='int64'))
+    return key, row
+
+
+# snapshot of a paged result, hashed and written one batch at a time
+def _write_paged(result, keys, file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(result.path, memory_map=True)
+    schema = parquet.schema_arrow.append(pa.field(KEY_COLUMN, pa.uint64())).append(pa.field(HASH_COLUMN, pa.uint64()))
+    seen = pd.Series(dtype='int64')
+    with pq.ParquetWriter(file, schema) as writer:
+        for batch in parquet.iter_batches():
+            key, row, seen = _chunk_hashes(batch.to_pandas(), keys, seen)
+            columns = batch.columns + [pa.array(key.to_numpy(), pa.uint64()), pa.array(row.to_numpy(), pa.uint64())]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+
+
+# store this run's result of a checkpoint (once per run; a second call keeps the first)
+def snapshot(csid, run, name, df, base_dir=None):
+    path = _run_dir(csid, run, base_dir)
+    file = os.path.join(path, f"{name}.parquet")
+    if os.path.exists(file):
+        return file
+    os.makedirs(path, exist_ok=True)
+    if isinstance(df, PagedResult) and len(df) == 0:
+        df = pd.DataFrame(columns=df.columns)
+    tmp = f"{file}.{uuid.uuid4().hex}.tmp"
+    try:
+        if isinstance(df, PagedResult):
+            _write_paged(df, row_keys(name, df), tmp)
+        else:
+            key, row = row_hashes(df, row_keys(name, df))
+            df.assign(**{KEY_COLUMN: key.to_numpy(), HASH_COLUMN: row.to_numpy()}).to_parquet(tmp, index=False)
+        os.replace(tmp, file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _prune(csid, base_dir)
+    return file
+
+
+# newest run before `run` with a snapshot of the checkpoint, or None
+def previous_run(csid, run, name, base_dir=None):
+    earlier = [r for r in runs(csid, base_dir) if r < run
+               and os.path.exists(os.path.join(_run_dir(csid, r, base_dir), f"{name}.parquet"))]
+    return earlier[-1] if earlier else None
+
+
+# names of the columns that differ, per changed row (current and previous rows in the same order)
+def _changed_columns(current, previous):
+    columns = [c for c in current.columns if c in previous.columns]
+    a = _normalized(current[columns]).reset_index(drop=True)
+    b = _normalized(previous[columns]).reset_index(drop=True)
+    differs = (a != b) & ~(a.isna() & b.isna())
+    return flag_labels(differs).to_numpy()
+
+
+# rows of a snapshot file whose key is in `keys`, indexed by key (read batch by batch)
+def _rows(file, keys):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(file, memory_map=True)
+    wanted = pa.array(np.asarray(keys, dtype='uint64'))
+    batches = [batch.filter(pc.is_in(batch.column(KEY_COLUMN), value_set=wanted))
+               for batch in (parquet.iter_batches() if len(wanted) else ())]
+    table = pa.Table.from_batches(batches, schema=parquet.schema_arrow)
+    return table.to_pandas().set_index(KEY_COLUMN).drop(columns=HASH_COLUMN)
+
+
+# diff of two snapshot files of a checkpoint (see snapshot)
+def diff(previous_file, current_file, previous_run=None):
+    previous = pd.read_parquet(previous_file, columns=[KEY_COLUMN, HASH_COLUMN])
+    current = pd.read_parquet(current_file, columns=[KEY_COLUMN, HASH_COLUMN])
+    key, row = current[KEY_COLUMN], current[HASH_COLUMN]
+    before = pd.Series(previous[HASH_COLUMN].to_numpy(), index=previous[KEY_COLUMN].to_numpy())
+    known = key.isin(before.index).to_numpy()
+    changed = known.copy()
+    changed[known] = before.reindex(key[known].to_numpy()).to_numpy() != row[known].to_numpy()
+    gone = ~previous[KEY_COLUMN].isin(key).to_numpy()
+
+    new_rows = _rows(current_file, key[~known | changed])
+    old_rows = _rows(previous_file, key[changed]).loc[key[changed].to_numpy()]
+    changed_rows = new_rows.loc[key[changed].to_numpy()].reset_index(drop=True)
+    changed_rows['changed_columns'] = _changed_columns(changed_rows, old_rows) if len(changed_rows) else []
+    return RunDiff(previous_run,
+                   added=new_rows.loc[key[~known].to_numpy()].reset_index(drop=True),
+                   removed=_rows(previous_file, previous[KEY_COLUMN][gone]).reset_index(drop=True),
+                   changed=changed_rows)
+
+
+# snapshot the run's result and diff it against the previous run; None on a first review
+def review_changes(csid, run, name, df, base_dir=None):
+    file = snapshot(csid, run, name, df, base_dir)
+    before = previous_run(csid, run, name, base_dir)
+    if before is None:
+        return None
+    return diff(os.path.join(_run_dir(csid, before, base_dir), f"{name}.parquet"), file, before)
@@ -0,0 +1,184 @@
+# Declarative review rules.
+#
+# The flag thresholds used to live as literals inside the SQL (one UNION pass per
+# filter).  Here each filter is a Rule made of AND-ed Conditions, and a RuleSet is
+# applied to an already fetched frame in one vectorized pass.  Every returned row
+# carries a 'flagged_by' column naming the rule(s) that matched it.
+#
+# Thresholds can be tuned without touching code: point RSR_RULES_FILE at a YAML or
+# JSON file and any rule set named there replaces the built-in one, e.g.
+#
+#   eom:
+#     - name: throughput
+#       when: [[pct_change, "<", -24]]
+#     - name: video
+#       when: [[rank, in, ["12v", "13v", "14v", "16v"]], [delta, ">", 2]]
+
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+FLAG_COLUMN = 'flagged_by'
+
+_SQL_OPS = {'<': '<', '<=': '<=', '>': '>', '>=': '>=', '==': '=', '!=': '<>'}
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+@dataclass(frozen=True)
+class Condition:
+    column: str
+    op: str              # '<', '<=', '>', '>=', '==', '!=', 'in', 'not_in'
+    value: object
+
+    # boolean mask with SQL NULL semantics: a NULL cell never satisfies a condition
+    def mask(self, df):
+        col = df[self.column]
+        if self.op == 'in':
+            return col.isin(list(self.value))
+        if self.op == 'not_in':
+            return col.notna() & ~col.isin(list(self.value))
+        if self.op == '<':
+            return col < self.value
+        if self.op == '<=':
+            return col <= self.value
+        if self.op == '>':
+            return col > self.value
+        if self.op == '>=':
+            return col >= self.value
+        if self.op == '==':
+            return col == self.value
+        if self.op == '!=':
+            return col.notna() & (col != self.value)
+        raise ValueError(f"Unknown rule operator '{self.op}' on column '{self.column}'")
+
+    # SQL predicate with a bind parameter named `param` (same NULL semantics as mask())
+    def to_sql(self, param):
+        if not _IDENTIFIER.match(self.column):
+            raise ValueError(f"Rule column '{self.column}' is not a plain identifier")
+        if self.op == 'in':
+            return f"{self.column} = ANY(:{param})", list(self.value)
+        if self.op == 'not_in':
+            return f"({self.column} IS NOT NULL AND NOT ({self.column} = ANY(:{param})))", list(self.value)
+        if self.op in _SQL_OPS:
+            return f"{self.column} {_SQL_OPS[self.op]} :{param}", self.value
+        raise ValueError(f"Unknown rule operator '{self.op}' on column '{self.column}'")
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    conditions: tuple
+
+    def mask(self, df):
+        result = pd.Series(True, index=df.index)
+        for condition in self.conditions:
+            result &= condition.mask(df).fillna(False).astype(bool)
+        return result
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    name: str
+    rules: tuple
+
+    # one boolean column per rule
+    def masks(self, df):
+        return pd.DataFrame({rule.name: rule.mask(df) for rule in self.rules}, index=df.index)
+
+    # rows matching any rule (UNION semantics: duplicate rows collapse), labelled with flagged_by
+    def apply(self, df):
+        masks = self.masks(df)
+        hit = masks.any(axis=1)
+        flagged = df[hit].copy()
+        flagged[FLAG_COLUMN] = flag_labels(masks[hit])
+        return flagged.drop_duplicates(subset=list(df.columns))
+
+    # the whole rule set as one WHERE predicate (OR of the rules) plus its bind parameters,
+    # so the server can return only candidate rows from a single scan
+    def to_sql(self, prefix='r'):
+        clauses, params = [], {}
+        for i, rule in enumerate(self.rules):
+            parts = []
+            for j, condition in enumerate(rule.conditions):
+                sql, value = condition.to_sql(f"{prefix}{i}_{j}")
+                parts.append(sql)
+                params[f"{prefix}{i}_{j}"] = value
+            clauses.append("(" + " AND ".join(parts) + ")")
+        return "\n    OR ".join(clauses), params
+
+
+# comma-joined names of the matching rules, built one rule column at a time
+def flag_labels(masks):
+    labels = pd.Series('', index=masks.index, dtype=object)
+    for name in masks.columns:
+        hit = masks[name]
+        labels = labels.where(~hit, labels + ',' + name)
+    return labels.str.lstrip(',')
+
+
+def rule(name, *conditions):
+    return Rule(name, tuple(Condition(*c) for c in conditions))
+
+
+# Market checkpoint 1a -- flagged EOM comparisons (was eom_query)
+EOM_RULES = RuleSet('eom', (
+    rule('throughput', ('pct_change', '<', -24)),
+    rule('m2m', ('metric', 'in', ('m2m_block', 'm2m_drop')), ('delta', '>', 2)),
+    rule('acc_task', ('rank', 'not_in', ('12v', '13v', '14v', '16v', '05d', '08u', '01m', '02m')), ('delta', '<', -2)),   # acc/task 1 or 2??
+    rule('video', ('rank', 'in', ('12v', '13v', '14v', '16v')), ('delta', '>', 2)),    # video updates 4/22
+    rule('video_16v', ('rank', '==', '16v'), ('delta', '>', 20)),
+))
+
+# Market checkpoint 1b -- daily kit differences (was daily_diff); n_grp > 19 on every rule
+DAILY_DIFF_RULES = RuleSet('daily_diff', (
+    rule('t27_task', ('test_type_id', '==', 27), ('tsk_dif_ab', '>', 10), ('n_grp', '>', 19)),
+    rule('t27_access', ('test_type_id', '==', 27), ('acc_dif_ab', '>', 10), ('n_grp', '>', 19)),
+    rule('data_task', ('test_type_id', 'in', (19, 20, 26)), ('tsk_dif_ab', '>', 3), ('n_grp', '>', 19)),
+    rule('data_access', ('test_type_id', 'in', (19, 20, 26)), ('acc_dif_ab', '>', 5), ('n_grp', '>', 19)),
+    rule('m2m_task', ('test_type_id', '==', 23), ('tsk_dif_ab', '>', 1), ('n_grp', '>', 19)),
+    rule('m2m_access', ('test_type_id', '==', 23), ('acc_dif_ab', '>', 1), ('n_grp', '>', 19)),
+    rule('t14_task', ('test_type_id', '==', 14), ('tsk_dif_ab', '>', 10000), ('n_grp', '>', 19)),
+    rule('t14_access', ('test_type_id', '==', 14), ('acc_dif_ab', '>', 25), ('n_grp', '>', 19)),
+))
+
+BUILTIN_RULESETS = {r.name: r for r in (EOM_RULES, DAILY_DIFF_RULES)}
+
+
+# {ruleset name: [{'name': ..., 'when': [[column, op, value], ...]}, ...]} from YAML or JSON
+def load_rulesets(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml   # optional, only needed for YAML rule files
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    return {
+        set_name: RuleSet(set_name, tuple(rule(r['name'], *[_condition_spec(c) for c in r['when']]) for r in rules))
+        for set_name, rules in spec.items()
+    }
+
+
+# [column, op, value] from a rule file; list values become tuples so rule sets stay hashable
+def _condition_spec(spec):
+    column, op, value = spec
+    return column, op, tuple(value) if isinstance(value, list) else value
+
+
+_file_rulesets = {}
+
+
+# the active rule set: RSR_RULES_FILE overrides the built-in one of the same name
+def get_ruleset(name):
+    path = os.getenv("RSR_RULES_FILE")
+    if path:
+        mtime = os.path.getmtime(path)
+        if _file_rulesets.get('_source') != (path, mtime):
+            _file_rulesets.clear()
+            _file_rulesets.update(load_rulesets(path))
+            _file_rulesets['_source'] = (path, mtime)
+        if name in _file_rulesets:
+            return _file_rulesets[name]
+    return BUILTIN_RULESETS[name]
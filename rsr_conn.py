@@ -0,0 +1,98 @@
+# Shared RSR Postgres connection for the review tool.
+#
+# One pooled SQLAlchemy engine per process.  Every heavy_lifts query (and the
+# main script) borrows connections from this pool instead of building a new
+# engine, so a Submit pays the TCP/TLS/auth handshake once instead of ~15 times.
+# Streamlit keeps imported modules in sys.modules, so the engine survives reruns
+# and is shared by every session served by the same worker process.
+#
+# Pool settings come from the environment (.env is loaded here):
+#   RSR_CONN            SQLAlchemy URL (required)
+#   RSR_POOL_SIZE       persistent connections kept in the pool (default 5)
+#   RSR_MAX_OVERFLOW    extra connections allowed under load (default 10)
+#   RSR_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+#   RSR_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+#   RSR_POOL_PRE_PING   ping connections on checkout, 1/0 (default 1)
+#   RSR_PREPARE_THRESHOLD  executions before a statement is prepared server-side on
+#                       a connection (default 0 = on first use, "none" disables).
+#                       Needs the psycopg 3 driver (postgresql+psycopg://...);
+#                       psycopg2 has no server-side prepared statement cache.
+
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+load_dotenv()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_settings():
+    return {
+        "pool_size": _env_int("RSR_POOL_SIZE", 5),
+        "max_overflow": _env_int("RSR_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("RSR_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("RSR_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_bool("RSR_POOL_PRE_PING", True),
+    }
+
+
+# psycopg 3 prepares repeated statements per connection; the heavy_lifts queries are
+# bound-parameter statements, so each one is parsed and planned once per pooled connection
+def connect_args(host_str):
+    if make_url(host_str).get_driver_name() != "psycopg":
+        return {}
+    threshold = os.getenv("RSR_PREPARE_THRESHOLD", "0").strip().lower()
+    return {"prepare_threshold": None if threshold == "none" else int(threshold)}
+
+
+# credentials and string for db connection -- returns the process-wide engine
+def get_rsr_conn():
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            host_str = os.getenv("RSR_CONN")
+            if not host_str:
+                raise ValueError("RSR_CONN environment variable is not set or is empty. Please check your .env file or environment variables.")
+            _engine = create_engine(host_str, connect_args=connect_args(host_str), **pool_settings())
+    return _engine
+
+
+# snapshot of the pool for the sidebar / logs
+def pool_stats():
+    if _engine is None:
+        return {"engine": "not created"}
+    pool = _engine.pool
+    stats = {"status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        attr = getattr(pool, name, None)
+        if callable(attr):
+            stats[name] = attr()
+    return stats
+
+
+# drop every pooled connection (e.g. after a DB failover); the next query reconnects
+def dispose_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
@@ -0,0 +1,181 @@
+# Local Parquet snapshot store for closed collection sets.
+#
+# A comparison CSID (analytic.fn_get_previous_csid) belongs to a finished collection
+# set, so its query results never change.  They are written once to
+# <RSR_SNAPSHOT_DIR>/<function>/<csid>.parquet and served from memory-mapped Parquet
+# afterwards instead of going back to Postgres.  manifest.json records every snapshot
+# (rows, bytes, created, last access); once the store grows past RSR_SNAPSHOT_MAX_MB
+# the least recently used snapshots are evicted.
+#
+# Pre-warm overnight for the markets in tomorrow's queue (their comparison CSIDs are
+# looked up and stored):
+#   python snapshot_store.py warm --csids 12610,12611
+#   python snapshot_store.py warm --closed-csids 12509     # store these CSIDs directly
+#   python snapshot_store.py list
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.getenv("RSR_SNAPSHOT_DIR", os.path.join(".rdaq_data", "snapshots"))
+MAX_BYTES = int(float(os.getenv("RSR_SNAPSHOT_MAX_MB", 2048)) * 1024 * 1024)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine; without it the store is disabled)
+    ENABLED = os.getenv("RSR_SNAPSHOTS", "1") != "0"
+except ImportError:
+    ENABLED = False
+
+_lock = threading.Lock()
+
+
+def _manifest_path():
+    return os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+
+def _key(func_name, csid):
+    return f"{func_name}/{int(csid)}"
+
+
+def load_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(manifest):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, _manifest_path())
+
+
+def _evict(manifest):
+    total = sum(entry["bytes"] for entry in manifest.values())
+    for key in sorted(manifest, key=lambda k: manifest[k]["last_access"]):
+        if total <= MAX_BYTES:
+            break
+        entry = manifest.pop(key)
+        total -= entry["bytes"]
+        try:
+            os.remove(os.path.join(SNAPSHOT_DIR, entry["path"]))
+        except FileNotFoundError:
+            pass
+
+
+# stored frame for (function, csid), memory-mapped; None when there is no snapshot
+def read(func_name, csid):
+    if not ENABLED:
+        return None
+    key = _key(func_name, csid)
+    with _lock:
+        manifest = load_manifest()
+        entry = manifest.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(SNAPSHOT_DIR, entry["path"])
+        if not os.path.exists(path):
+            manifest.pop(key)
+            _save_manifest(manifest)
+            return None
+        entry["last_access"] = time.time()
+        _save_manifest(manifest)
+    return pd.read_parquet(path, memory_map=True)
+
+
+def write(func_name, csid, df):
+    if not ENABLED:
+        return
+    key = _key(func_name, csid)
+    rel_path = key + ".parquet"
+    path = os.path.join(SNAPSHOT_DIR, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    with _lock:
+        manifest = load_manifest()
+        now = time.time()
+        manifest[key] = {"path": rel_path, "function": func_name, "csid": int(csid),
+                         "rows": len(df), "bytes": os.path.getsize(path),
+                         "created": now, "last_access": now}
+        _evict(manifest)
+        _save_manifest(manifest)
+
+
+# result of fetch(csid) for a closed csid: from the store if present, otherwise fetched and stored
+def closed_csid_result(func_name, csid, fetch):
+    df = read(func_name, csid)
+    if df is None:
+        df = fetch(csid)
+        write(func_name, csid, df)
+    return df
+
+
+def invalidate(csid):
+    with _lock:
+        manifest = load_manifest()
+        for key in [k for k, v in manifest.items() if v["csid"] == int(csid)]:
+            entry = manifest.pop(key)
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, entry["path"]))
+            except FileNotFoundError:
+                pass
+        _save_manifest(manifest)
+
+
+def store_stats():
+    manifest = load_manifest()
+    return {"enabled": ENABLED, "snapshots": len(manifest),
+            "mb": round(sum(e["bytes"] for e in manifest.values()) / 1024 / 1024, 1),
+            "max_mb": round(MAX_BYTES / 1024 / 1024)}
+
+
+def _csid_list(value):
+    return [int(c) for c in value.split(",") if c.strip()] if value else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet snapshot store for closed CSIDs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="store closed-CSID results ahead of the morning review")
+    warm.add_argument("--csids", default="", help="comma-separated current CSIDs; their comparison CSIDs are stored")
+    warm.add_argument("--closed-csids", default="", help="comma-separated closed CSIDs to store directly")
+    warm.add_argument("--force", action="store_true", help="re-fetch snapshots that already exist")
+    sub.add_parser("list", help="show the manifest")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for key, entry in sorted(load_manifest().items()):
+            print(f"{key:40} {entry['rows']:>9} rows {entry['bytes'] / 1024:>10.0f} KB")
+        print(store_stats())
+        return
+
+    import heavy_lifts   # deferred: the store itself has no database dependency
+
+    closed = _csid_list(args.closed_csids)
+    for csid in _csid_list(args.csids):
+        comp_csid = heavy_lifts.lookup_comp_csid(csid)
+        if comp_csid is None:
+            print(f"csid {csid}: no comparison csid found, skipped")
+        else:
+            closed.append(comp_csid)
+    for csid in dict.fromkeys(closed):
+        if args.force:
+            invalidate(csid)
+        for func_name, fetch in heavy_lifts.CLOSED_CSID_QUERIES.items():
+            start = time.monotonic()
+            df = closed_csid_result(func_name, csid, fetch)
+            print(f"{func_name}/{csid}: {len(df)} rows in {time.monotonic() - start:.1f}s")
+    print(store_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# Chunked fetch for the large checkpoint results.
+#
+# pd.read_sql on a plain cursor pulls the whole result into the client (as Python
+# tuples) before the DataFrame is built, so a national market spikes the worker by
+# hundreds of MB.  Here rows come through a server-side cursor (stream_results) in
+# chunks of RSR_STREAM_CHUNK_ROWS; each chunk is pruned to the wanted columns and
+# downcast (categoricals for carrier/metric/rank, small ints for test_type_id) before
+# the next one is read.
+#
+# concat_chunks() joins the compact chunks into one frame.  spill() writes them to a
+# Parquet file instead (one row group per chunk) and returns a PagedResult that reads
+# back a single page at a time, so memory stays flat however big the market is.
+#
+# Every spill gets a file of its own (<name>.<pid>.<uuid>.parquet): a refresh, or another
+# session opening the same CSID, never touches the file behind a PagedResult that is still
+# shown.  The file is deleted when its PagedResult is garbage collected; files left behind
+# by processes that are gone are removed at the next spill of the same name.
+
+import glob
+import os
+import uuid
+import weakref
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_ROWS = int(os.getenv("RSR_STREAM_CHUNK_ROWS", 50000))
+SPILL_DIR = os.getenv("RSR_SPILL_DIR", os.path.join(".rdaq_data", "spill"))
+
+CATEGORY_COLUMNS = ('carrier', 'metric', 'rank', 'name', 'collection_set', 'report_set',
+                    'sa_status', 'product_period', 'best_network_type', 'call_network_type')
+SMALL_INT_COLUMNS = {'test_type_id': 'Int16', 'kit_type_id': 'Int8', 'collection_type_id': 'Int16', 'type': 'Int16'}
+
+
+# prune and downcast one chunk
+def downcast(chunk, columns=None):
+    if columns is not None:
+        chunk = chunk[[c for c in columns if c in chunk.columns]]
+    for col in chunk.columns:
+        if col in SMALL_INT_COLUMNS:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype(SMALL_INT_COLUMNS[col])
+        elif col in CATEGORY_COLUMNS and not isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            chunk[col] = chunk[col].astype('category')
+    return chunk
+
+
+# server-side cursor: yields compact chunks, never holds more than one raw chunk
+def iter_chunks(connection, sql, columns=None, chunksize=CHUNK_ROWS):
+    connection = connection.execution_options(stream_results=True, max_row_buffer=chunksize)
+    for chunk in pd.read_sql(sql, con=connection, chunksize=chunksize):
+        yield downcast(chunk, columns)
+
+
+# categories differ chunk to chunk -- align them (sorted) so the concat stays categorical
+def _align_categories(chunks):
+    if len(chunks) < 2:
+        return chunks
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([c[col] for c in chunks], sort_categories=True).categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(categories)
+    return chunks
+
+
+def concat_chunks(chunks):
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(_align_categories(chunks), ignore_index=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class PagedResult:
+    # a spilled result: row count and columns in memory, rows on disk (the file goes with the object)
+    def __init__(self, path, n_rows, columns):
+        self.path = path
+        self.n_rows = n_rows
+        self.columns = columns
+        weakref.finalize(self, _remove, path)
+
+    def __len__(self):
+        return self.n_rows
+
+    def n_pages(self, page_rows):
+        return max(1, -(-self.n_rows // page_rows))
+
+    def page(self, number, page_rows):
+        import pyarrow.parquet as pq
+        start, stop = number * page_rows, min((number + 1) * page_rows, self.n_rows)
+        if self.n_rows == 0:
+            return pd.DataFrame(columns=self.columns)
+        parquet = pq.ParquetFile(self.path, memory_map=True)
+        parts, offset = [], 0
+        for group in range(parquet.num_row_groups):
+            group_rows = parquet.metadata.row_group(group).num_rows
+            if offset + group_rows > start and offset < stop:
+                table = parquet.read_row_group(group)
+                parts.append(table.slice(max(0, start - offset), stop - max(start, offset)).to_pandas())
+            offset += group_rows
+            if offset >= stop:
+                break
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.columns)
+
+    def to_frame(self):
+        return pd.read_parquet(self.path, memory_map=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# spill files of `name` whose process has exited
+def _sweep(name):
+    for path in glob.glob(os.path.join(SPILL_DIR, glob.escape(name) + ".*.parquet")):
+        pid = os.path.basename(path)[len(name) + 1:].split(".")[0]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            _remove(path)
+
+
+# write Arrow tables to a new Parquet file (one row group each) and return a PagedResult
+def _spill_tables(tables, name):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    _sweep(name)
+    path = os.path.join(SPILL_DIR, f"{name}.{os.getpid()}.{uuid.uuid4().hex}.parquet")
+    writer, schema, n_rows, columns = None, None, 0, []
+    try:
+        for table in tables:
+            if writer is None:
+                # an all-NULL column in the first chunk would pin the type to null
+                schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+                columns = list(table.column_names)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(schema))
+            n_rows += table.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        _remove(path)
+        raise
+    if writer is not None:
+        writer.close()
+    return PagedResult(path, n_rows, columns)
+
+
+# categories are per chunk; store them as plain strings so row groups share one schema
+def _chunk_table(chunk):
+    import pyarrow as pa
+    for col in chunk.columns:
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            chunk[col] = chunk[col].astype(object)
+    return pa.Table.from_pandas(chunk, preserve_index=False)
+
+
+# stream the chunks into a Parquet file (one row group per chunk) and return a PagedResult
+def spill(chunks, name):
+    return _spill_tables((_chunk_table(chunk) for chunk in chunks), name)
+
+
+# the same for Arrow record batches (arrow_fetch); dictionary columns are stored as strings
+def spill_batches(batches, name):
+    import pyarrow as pa
+
+    def tables():
+        for batch in batches:
+            table = pa.Table.from_batches([batch])
+            yield table.cast(pa.schema([f.with_type(pa.string()) if pa.types.is_dictionary(f.type) else f
+                                        for f in table.schema]))
+    return _spill_tables(tables(), name)
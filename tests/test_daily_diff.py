@@ -0,0 +1,143 @@
+# The 'daily_diff' rule set (pandas) against daily_diff (SQL): the same flagged rows for the
+# same dq.fn_dq_kit_diff output.
+#
+# sql_reference() reads daily_diff's UNION branches literally (SQL NULL semantics, UNION
+# dropping duplicate rows).  When a Postgres is at hand (initdb/pg_ctl on PATH, or
+# RSR_BENCH_PG -- see benchmarks/pg_fixture) the pushed-down daily_diff_flagged and the
+# UNION daily_diff are both run over the fixture rows and compared row for row.
+#
+#   python -m pytest tests
+
+import math
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+os.environ.setdefault("RSR_CONN", "postgresql://nobody@127.0.0.1:1/none")   # never connected to here
+os.environ.setdefault("RSR_PERF_LOG", os.devnull)
+
+import heavy_lifts  # noqa: E402
+from review_rules import DAILY_DIFF_RULES, FLAG_COLUMN  # noqa: E402
+
+CSID = 12610
+KIT_DIFF_COLUMNS = ['csid', 'carrier', 'emp', 'loc_day', 'test_type_id', 'n_grp', 'acc_delta', 'tsk_delta']
+COLUMNS = ['acc_dif_ab', 'tsk_dif_ab'] + KIT_DIFF_COLUMNS
+NAN = float('nan')
+
+# csid, carrier, emp, loc_day, test_type_id, n_grp, acc_delta, tsk_delta
+ROWS = [
+    (CSID, 'A', 'a', '0501', 27, 20, 0.0, 10.5),       # t27 task
+    (CSID, 'A', 'a', '0501', 27, 20, 0.0, 10.5),       # duplicate row
+    (CSID, 'A', 'b', '0501', 27, 20, -11.0, 0.0),      # t27 access, negative delta
+    (CSID, 'A', 'c', '0501', 27, 20, 10.0, 10.0),      # both exactly at the threshold
+    (CSID, 'A', 'd', '0501', 27, 19, 50.0, 50.0),      # n_grp at the threshold
+    (CSID, 'A', 'e', '0501', 27, None, 50.0, 50.0),    # NULL n_grp
+    (CSID, 'B', 'a', '0502', 19, 25, 5.0, 3.01),       # data task only (access exactly 5)
+    (CSID, 'B', 'b', '0502', 20, 25, -5.5, -3.5),      # data task and data access
+    (CSID, 'B', 'c', '0502', 26, 25, NAN, 4.0),        # NULL acc_delta, task still flags
+    (CSID, 'B', 'd', '0502', 26, 25, NAN, NAN),        # both deltas NULL
+    (CSID, 'B', 'e', '0502', 21, 25, 90.0, 90.0),      # test type without a rule
+    (CSID, 'C', 'a', '0503', 23, 20, 1.0, 1.0),        # m2m at the threshold
+    (CSID, 'C', 'b', '0503', 23, 20, -1.01, 0.0),      # m2m access
+    (CSID, 'C', 'c', '0503', 14, 20, 25.0, 10000.0),   # t14 at both thresholds
+    (CSID, 'C', 'd', '0503', 14, 20, 25.5, -10001.0),  # t14 task and access
+    (CSID, 'C', 'e', '0503', None, 20, 99.0, 99.0),    # NULL test_type_id
+]
+
+
+def fixture_frame():
+    df = pd.DataFrame(ROWS, columns=KIT_DIFF_COLUMNS)
+    df['n_grp'] = df['n_grp'].astype('Int64')
+    df['test_type_id'] = df['test_type_id'].astype('Int64')
+    df.insert(0, 'tsk_dif_ab', df['tsk_delta'].abs())
+    df.insert(0, 'acc_dif_ab', df['acc_delta'].abs())
+    return df
+
+
+def _null(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+
+def plain_rows(df):
+    return sorted((tuple(None if _null(v) else (v if isinstance(v, str) else float(v)) for v in row)
+                   for row in df[COLUMNS].astype(object).itertuples(index=False, name=None)), key=repr)
+
+
+# daily_diff, branch by branch: a comparison with a NULL is never true
+def sql_reference(df):
+    rows = [tuple(None if _null(v) else v for v in row) for row in df[COLUMNS].astype(object).itertuples(index=False, name=None)]
+    col = {name: i for i, name in enumerate(COLUMNS)}
+
+    def v(row, name):
+        return row[col[name]]
+
+    def gt(a, b):
+        return a is not None and a > b
+
+    def branch(types, task, access):
+        def matches(r):
+            if v(r, 'test_type_id') not in types or not gt(v(r, 'n_grp'), 19):
+                return False
+            return gt(v(r, 'tsk_dif_ab'), task) or gt(v(r, 'acc_dif_ab'), access)
+        return matches
+
+    branches = [branch((27,), 10, 10), branch((19, 20, 26), 3, 5), branch((23,), 1, 1), branch((14,), 10000, 25)]
+    result = [r for r in rows if any(b(r) for b in branches)]
+    return pd.DataFrame(list(dict.fromkeys(result)), columns=COLUMNS)   # UNION
+
+
+def test_rule_set_matches_daily_diff():
+    flagged = DAILY_DIFF_RULES.apply(fixture_frame())
+    expected = sql_reference(fixture_frame())
+    assert plain_rows(flagged) == plain_rows(expected)
+    assert len(flagged) == 7                   # the duplicate row collapses
+
+
+def test_rule_set_labels():
+    flagged = DAILY_DIFF_RULES.apply(fixture_frame())
+    labels = dict(zip(zip(flagged['carrier'], flagged['emp']), flagged[FLAG_COLUMN]))
+    assert labels[('B', 'b')] == 'data_task,data_access'
+    assert labels[('B', 'a')] == 'data_task'
+    assert labels[('C', 'd')] == 't14_task,t14_access'
+    assert ('A', 'c') not in labels and ('A', 'e') not in labels and ('C', 'e') not in labels
+
+
+# daily_diff_flagged (pushdown) and daily_diff (UNION) on a Postgres whose dq.fn_dq_kit_diff
+# returns the fixture rows
+def test_pushdown_matches_union_on_postgres():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    pg_fixture = pytest.importorskip("pg_fixture")
+    try:
+        context = pg_fixture.local_postgres()
+        url = context.__enter__()
+    except (RuntimeError, OSError) as e:
+        pytest.skip(f"no Postgres: {e}")
+    try:
+        engine = sqlalchemy.create_engine(url)
+        values = ",\n".join(
+            "(" + ", ".join("NULL" if _null(x) else (f"'{x}'" if isinstance(x, str) else repr(x)) for x in row) + ")"
+            for row in ROWS)
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text("CREATE SCHEMA IF NOT EXISTS dq"))
+            connection.execute(sqlalchemy.text(f"""
+                CREATE OR REPLACE FUNCTION dq.fn_dq_kit_diff(integer)
+                RETURNS TABLE(csid integer, carrier text, emp text, loc_day text, test_type_id smallint,
+                              n_grp bigint, acc_delta numeric, tsk_delta numeric)
+                LANGUAGE sql STABLE AS $$
+                SELECT v.csid, v.carrier, v.emp, v.loc_day, v.test_type_id::smallint, v.n_grp::bigint,
+                       v.acc_delta::numeric, v.tsk_delta::numeric
+                FROM (VALUES {values}) v(csid, carrier, emp, loc_day, test_type_id, n_grp, acc_delta, tsk_delta)
+                WHERE v.csid = $1 $$"""))
+        with engine.connect() as connection:
+            union = pd.read_sql(heavy_lifts.daily_diff(CSID), connection)
+            pushdown = pd.read_sql(heavy_lifts.daily_diff_flagged(CSID, DAILY_DIFF_RULES), connection)
+        engine.dispose()
+    finally:
+        context.__exit__(None, None, None)
+    assert plain_rows(DAILY_DIFF_RULES.apply(pushdown)) == plain_rows(union)
+    assert plain_rows(union) == plain_rows(sql_reference(fixture_frame()))
@@ -0,0 +1,150 @@
+# eom_flags (pandas, the 'eom' rule set) against eom_query (SQL): the same flagged rows,
+# header rows and rank order for the same dq.fn_eom_pl_comp_b output.
+#
+# sql_reference() reads eom_query's UNION branches literally (SQL NULL semantics, UNION
+# dropping duplicate rows, ORDER BY rank with NULLs last).  When a Postgres is at hand
+# (initdb/pg_ctl on PATH, or RSR_BENCH_PG -- see benchmarks/pg_fixture) eom_query itself is
+# run over the same fixture frame as well.
+#
+#   python -m pytest tests
+
+import math
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+os.environ.setdefault("RSR_CONN", "postgresql://nobody@127.0.0.1:1/none")   # never connected to here
+os.environ.setdefault("RSR_PERF_LOG", os.devnull)
+
+import heavy_lifts  # noqa: E402
+
+CSID, COMP = 12610, 12500
+EOM_COLUMNS = heavy_lifts.EOM_COLUMNS
+NAN = float('nan')
+
+# rank, csid, comp, name, carrier, metric, current_rate, past_rate, delta, pct_change, type
+ROWS = [
+    ('13v', CSID, COMP, 'Market', 'A', 'video', 8.0, 5.0, 3.0, 60.0, 1),              # video
+    ('01a', CSID, COMP, 'Market', 'A', 'dl_tput', 50.0, 80.0, -30.0, -37.5, 1),      # throughput
+    ('01a', CSID, COMP, 'Market', 'A', 'dl_tput', 50.0, 80.0, -30.0, -37.5, 1),      # duplicate row
+    ('02v', CSID, COMP, 'Market', 'B', 'm2m_block', 4.0, 1.0, 3.0, 300.0, 1),         # m2m
+    ('02v', CSID, COMP, 'Market', 'C', 'm2m_drop', 1.0, 0.5, 0.5, 100.0, 1),          # m2m under threshold
+    ('03a', CSID, COMP, 'Market', 'A', 'access', 90.0, 95.0, -5.0, -5.26, 1),         # acc_task
+    ('05d', CSID, COMP, 'Market', 'A', 'access', 90.0, 95.0, -5.0, -5.26, 1),         # excluded rank
+    (None, CSID, COMP, 'Market', 'B', 'access', 90.0, 95.0, -5.0, -5.26, 1),          # NULL rank: NOT IN is NULL
+    (None, CSID, COMP, 'Market', 'C', 'ul_tput', 5.0, 10.0, -5.0, -50.0, 1),          # NULL rank, throughput
+    ('12v', CSID, COMP, 'Market', 'B', 'video', 8.0, 5.0, NAN, NAN, 1),               # NULL delta / pct_change
+    ('16v', CSID, COMP, 'Market', 'C', 'video', 40.0, 10.0, 30.0, 300.0, 1),          # video and video_16v
+    ('16v', CSID, COMP, 'Market', 'A', 'video', 12.0, 10.0, 2.0, 20.0, 1),            # not above either threshold
+    ('04t', CSID, COMP, 'Market', 'A', 'task', 99.0, 99.0, 0.0, 0.0, 1),              # nothing flagged
+    ('01a', COMP, COMP, 'Previous', 'A', 'dl_tput', 50.0, 80.0, -30.0, -37.5, 2),     # other csid: no header row
+]
+
+
+def fixture_frame(categorical_rank=False):
+    df = pd.DataFrame(ROWS, columns=EOM_COLUMNS)
+    if categorical_rank:
+        # as the Arrow path returns it: dictionary-encoded, categories in order of appearance
+        pa = pytest.importorskip("pyarrow")
+        df['rank'] = pa.array(df['rank'], type=pa.string(), from_pandas=True).dictionary_encode().to_pandas()
+        assert list(df['rank'].cat.categories) != sorted(df['rank'].cat.categories)
+    return df
+
+
+def _null(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+# eom_query, branch by branch: a comparison with a NULL is never true
+def sql_reference(df, csid):
+    rows = [tuple(None if _null(v) else v for v in row) for row in df[EOM_COLUMNS].astype(object).itertuples(index=False, name=None)]
+    col = {name: i for i, name in enumerate(EOM_COLUMNS)}
+
+    def v(row, name):
+        return row[col[name]]
+
+    def lt(a, b):
+        return a is not None and a < b
+
+    def gt(a, b):
+        return a is not None and a > b
+
+    excluded = ('12v', '13v', '14v', '16v', '05d', '08u', '01m', '02m')
+    branches = [
+        lambda r: lt(v(r, 'pct_change'), -24),
+        lambda r: v(r, 'metric') in ('m2m_block', 'm2m_drop') and gt(v(r, 'delta'), 2),
+        lambda r: v(r, 'rank') is not None and v(r, 'rank') not in excluded and lt(v(r, 'delta'), -2),
+        lambda r: v(r, 'rank') in ('12v', '13v', '14v', '16v') and gt(v(r, 'delta'), 2),
+        lambda r: v(r, 'rank') == '16v' and gt(v(r, 'delta'), 20),
+    ]
+    result = [r for r in rows if any(branch(r) for branch in branches)]
+    result += [(None, v(r, 'csid'), v(r, 'comp'), v(r, 'name'), None, None, None, None, None, None, v(r, 'type'))
+               for r in rows if v(r, 'csid') == csid]
+    result = list(dict.fromkeys(result))                                  # UNION
+    return sorted(result, key=lambda r: (r[0] is None, r[0] or ''))       # ORDER BY rank (NULLS LAST)
+
+
+def plain_rows(df):
+    return [tuple(None if _null(v) else (float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v)
+                  for v in row)
+            for row in df[EOM_COLUMNS].astype(object).itertuples(index=False, name=None)]
+
+
+def assert_same_as_sql(flagged, expected):
+    got = plain_rows(flagged)
+    expected = plain_rows(pd.DataFrame(expected, columns=EOM_COLUMNS))
+    assert sorted(got, key=repr) == sorted(expected, key=repr)
+    ranks = [row[0] for row in got]
+    assert ranks == [row[0] for row in expected]                          # rank order, NULLs last
+
+
+@pytest.mark.parametrize("categorical_rank", [False, True])
+def test_eom_flags_matches_eom_query(categorical_rank):
+    df = fixture_frame(categorical_rank)
+    flagged = heavy_lifts.eom_flags(df, CSID)
+    assert_same_as_sql(flagged, sql_reference(fixture_frame(), CSID))
+
+
+def test_eom_flags_labels_rules_and_one_header_row():
+    flagged = heavy_lifts.eom_flags(fixture_frame(), CSID)
+    header = flagged[flagged['rank'].isna() & flagged['metric'].isna()]
+    assert len(header) == 1 and header.iloc[0]['flagged_by'] == ''
+    assert header.iloc[0]['csid'] == CSID
+    labels = dict(zip(zip(flagged['rank'], flagged['carrier']), flagged['flagged_by']))
+    assert labels[('16v', 'C')] == 'video,video_16v'
+    assert labels[('01a', 'A')] == 'throughput,acc_task'
+    assert ('05d', 'A') not in labels and ('12v', 'B') not in labels
+
+
+# eom_query itself, on a Postgres with dq.fn_eom_pl_comp_b returning the fixture rows
+def test_eom_query_on_postgres():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    pg_fixture = pytest.importorskip("pg_fixture")
+    try:
+        context = pg_fixture.local_postgres()
+        url = context.__enter__()
+    except (RuntimeError, OSError) as e:
+        pytest.skip(f"no Postgres: {e}")
+    try:
+        engine = sqlalchemy.create_engine(url)
+        values = ",\n".join(
+            "(" + ", ".join("NULL" if _null(x) else (f"'{x}'" if isinstance(x, str) else repr(x)) for x in row) + ")"
+            for row in ROWS)
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text("CREATE SCHEMA IF NOT EXISTS dq"))
+            connection.execute(sqlalchemy.text(f"""
+                CREATE OR REPLACE FUNCTION dq.fn_eom_pl_comp_b(integer, integer)
+                RETURNS TABLE(rank text, csid integer, comp integer, name text, carrier text, metric text,
+                              current_rate numeric, past_rate numeric, delta numeric, pct_change numeric, type smallint)
+                LANGUAGE sql STABLE AS $$ SELECT * FROM (VALUES {values}) v $$"""))
+        with engine.connect() as connection:
+            from_sql = pd.read_sql(heavy_lifts.eom_query(CSID, COMP), connection)
+        engine.dispose()
+    finally:
+        context.__exit__(None, None, None)
+    assert_same_as_sql(heavy_lifts.eom_flags(fixture_frame(), CSID), plain_rows(from_sql))
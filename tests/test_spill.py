@@ -0,0 +1,68 @@
+# Spilled (paged) results: a re-spill of the same name, as a Refresh or a second session
+# does for dev_algo_<csid> / layer3_m2m_<csid>, must leave the PagedResults already handed
+# out intact, and each spill file goes once its PagedResult is gone.
+#
+#   python -m pytest tests
+
+import gc
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+pa = pytest.importorskip("pyarrow")
+
+import stream_fetch  # noqa: E402
+
+
+@pytest.fixture
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(stream_fetch, "SPILL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def chunks(n_rows):
+    return [pd.DataFrame({'test_id': range(start, min(start + 4, n_rows)), 'carrier': 'A'})
+            for start in range(0, n_rows, 4)]
+
+
+def batches(n_rows):
+    return iter([pa.record_batch({'test_id': list(range(n_rows)),
+                                  'carrier': pa.array(['A'] * n_rows).dictionary_encode()})])
+
+
+@pytest.mark.parametrize("spill", [
+    lambda n: stream_fetch.spill(chunks(n), "dev_algo_12610"),                   # server-side cursor path
+    lambda n: stream_fetch.spill_batches(batches(n), "layer3_m2m_12610"),        # COPY/Arrow path
+])
+def test_respill_leaves_older_results_intact(spill_dir, spill):
+    first = spill(10)
+    second = spill(3)
+    assert first.path != second.path
+    assert len(first) == 10 and len(first.page(0, 100)) == 10 and first.page(2, 4)['test_id'].tolist() == [8, 9]
+    assert len(second) == 3 and len(second.page(0, 100)) == 3
+    assert second.page(0, 100)['carrier'].tolist() == ['A'] * 3
+
+
+def test_spill_file_removed_with_its_result(spill_dir):
+    first = stream_fetch.spill(chunks(6), "layer3_m2m_12610")
+    second = stream_fetch.spill_batches(batches(2), "layer3_m2m_12610")
+    path = first.path
+    del first
+    gc.collect()
+    assert not os.path.exists(path)
+    assert os.listdir(spill_dir) == [os.path.basename(second.path)]
+
+
+def test_files_of_exited_processes_are_swept(spill_dir):
+    stale = spill_dir / "layer3_m2m_12610.999999999.0123abcd.parquet"    # no such pid
+    stale.write_bytes(b"")
+    other = spill_dir / "layer3_m2m_126100.999999999.0123abcd.parquet"   # another name
+    other.write_bytes(b"")
+    result = stream_fetch.spill_batches(batches(1), "layer3_m2m_12610")
+    assert not stale.exists() and other.exists()
+    assert len(result.page(0, 10)) == 1